@@ -1,56 +1,124 @@
+import time
 import uuid
-from collections.abc import Generator
-from typing import Annotated
+from collections.abc import AsyncGenerator
+from functools import lru_cache
+from typing import Annotated, Optional
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app import repository
-from app.core import auth
+from app import async_repository
+from app.chat.cache import llm_cache
+from app.chat.chat import WeatherAgent
+from app.core import auth, deadline
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import open_session
 from app.models import TokenData, User
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.PATH_API_V1}/login")
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+async def get_db() -> AsyncGenerator[Session | AsyncSession, None]:
+    async with open_session() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[Session | AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET_KEY, algorithms=[auth.ALGORITHM]
-        )
-        token_data = TokenData(**payload)
-    except (InvalidTokenError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
+async def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    user_id = auth.token_cache.get(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(
+                token, settings.JWT_SECRET_KEY, algorithms=[auth.ALGORITHM]
+            )
+            token_data = TokenData(**payload)
+        except (InvalidTokenError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+
+        try:
+            user_id = uuid.UUID(token_data.sub)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid user ID format",
+            )
+
+        # Don't serve the token from the cache after it expires
+        ttl = settings.AUTH_CACHE_TTL
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        auth.token_cache.set(token, user_id, ttl=ttl)
+
+    user = auth.user_cache.get(user_id)
+    if user is None:
+        user = await async_repository.get_user_by_id(session=session, id=user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Cache a copy detached from the session
+        user = User(**user.model_dump())
+        auth.user_cache.set(user_id, user)
+    return user
+
+
+CurrentUser = Annotated[User, Depends(get_current_user)]
+
 
-    try:
-        user_id = uuid.UUID(token_data.sub)
-    except ValueError:
+def get_admin_user(current_user: CurrentUser) -> User:
+    if current_user.email not in settings.ADMIN_EMAILS:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Invalid user ID format",
+            detail="The user doesn't have enough privileges",
         )
+    return current_user
 
-    user = repository.get_user_by_id(session=session, id=user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
 
+AdminUser = Annotated[User, Depends(get_admin_user)]
 
-CurrentUser = Annotated[User, Depends(get_current_user)]
+
+@lru_cache
+def get_weather_agent() -> WeatherAgent:
+    # A single agent (and OpenAI connection pool) shared by every request
+    return WeatherAgent(
+        settings.OPENAI_API_KEY,
+        timeout=settings.OPENAI_TIMEOUT,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        cache=llm_cache,
+        context_token_budget=settings.LLM_CONTEXT_TOKEN_BUDGET,
+        base_url=settings.OPENAI_BASE_URL,
+    )
+
+
+WeatherAgentDep = Annotated[WeatherAgent, Depends(get_weather_agent)]
+
+
+def with_deadline(default: float):
+    """
+    Return a dependency setting the deadline of the request.
+
+    The deadline is `default` seconds from now, or the number of seconds of the
+    X-Request-Timeout header when given (capped by REQUEST_TIMEOUT_MAX). Every call
+    to weather.com or OpenAI made for the request is bounded by it.
+
+    Args:
+        default: Time budget of the request without header, in seconds
+    """
+
+    # Async, to run in the task of the endpoint and set its context
+    async def start_deadline(
+        x_request_timeout: Annotated[Optional[float], Header(gt=0)] = None,
+    ) -> None:
+        timeout = default if x_request_timeout is None else x_request_timeout
+        deadline.start(min(timeout, settings.REQUEST_TIMEOUT_MAX))
+
+    return Depends(start_deadline)
@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 
-from app.api.routes import chat, cities, health, users
+from app.api.routes import admin, chat, cities, health, users
 
 api_router = APIRouter()
 api_router.include_router(health.router)
 api_router.include_router(users.router)
 api_router.include_router(cities.router)
 api_router.include_router(chat.router)
+api_router.include_router(admin.router)
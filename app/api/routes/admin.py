@@ -0,0 +1,32 @@
+from typing import Dict, List
+
+from fastapi import APIRouter, Query
+
+from app.api.deps import AdminUser
+from app.core.tracing import slow_traces
+from app.weather.resilience import weather_breakers
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/traces")
+async def get_slow_traces(
+    admin_user: AdminUser, limit: int = Query(default=20, ge=1)
+) -> List[Dict]:
+    """
+    Retrieve the span trees of the last slow requests, most recent first.
+
+    Requests slower than TRACE_SLOW_REQUEST_THRESHOLD are traced, the last
+    TRACE_BUFFER_SIZE are kept (by each worker process).
+    """
+    return list(reversed(slow_traces))[:limit]
+
+
+@router.get("/breakers")
+async def get_circuit_breakers(admin_user: AdminUser) -> Dict[str, Dict]:
+    """
+    Retrieve the state of the weather.com circuit breakers (of this worker process),
+    by endpoint: "closed", "open" (calls rejected for `retry_after` seconds) or
+    "half_open" (probing).
+    """
+    return weather_breakers.stats()
@@ -1,15 +1,29 @@
-from typing import List
+import json
+from typing import AsyncIterator, Dict, List, Literal
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.api.deps import CurrentUser, SessionDep
-from app.chat.chat import WeatherAgent, WeatherData
+from app.api.deps import CurrentUser, SessionDep, WeatherAgentDep, with_deadline
+from app.chat.chat import WeatherData
+from app.chat.query import answer_weather_query
 from app.core.config import settings
-from app.weather.city import get_city_weathers
+from app.core.deadline import DeadlineExceeded
+from app.models import User
+from app.weather.city import (
+    get_city_weathers,
+    iter_city_weathers,
+    successful_city_weathers,
+)
 from app.weather.scraper import WeatherScraper
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter(
+    prefix="/chat",
+    tags=["chat"],
+    # Leaves time for the model, after the weather of the favorites
+    dependencies=[with_deadline(settings.CHAT_REQUEST_TIMEOUT)],
+)
 
 
 class SummaryResponse(BaseModel):
@@ -21,6 +35,8 @@ class AskResponse(BaseModel):
 
     answer: str
     matching_cities: List[str]
+    # "local" when answered by the structured query engine, "llm" by the model
+    source: Literal["local", "llm"] = "llm"
 
 
 class AskRequest(BaseModel):
@@ -29,32 +45,92 @@ class AskRequest(BaseModel):
     question: str
 
 
+def to_weather_data(favorite_cities: List[Dict]) -> List[WeatherData]:
+    """
+    Convert favorite cities with weather information to WeatherData, skipping cities
+    whose weather could not be fetched.
+    """
+    return [
+        WeatherData(
+            city=city["name"],
+            weather_condition=city["weather_condition"],
+            temperature=city["temperature_celsius"],
+        )
+        for city in successful_city_weathers(favorite_cities)
+    ]
+
+
+async def get_favorite_weather_data(current_user: User) -> List[WeatherData]:
+    """
+    Fetch the weather of the user's favorite cities, skipping cities that failed.
+    """
+    w = WeatherScraper(current_user.weather_id_token)
+    favorite_cities = await w.get_user_favorite_cities()
+    favorite_cities = await get_city_weathers(favorite_cities)
+    return to_weather_data(favorite_cities)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_favorite_weather_data(
+    current_user: User, weather_data: List[WeatherData]
+) -> AsyncIterator[str]:
+    """
+    Fetch the weather of the user's favorite cities into `weather_data`, yielding a
+    "progress" event each time a city's weather arrives.
+    """
+    w = WeatherScraper(current_user.weather_id_token)
+    favorite_cities = await w.get_user_favorite_cities()
+
+    total = len(favorite_cities)
+    yield sse_event("progress", {"phase": "weather", "done": 0, "total": total})
+    done = 0
+    async for city in iter_city_weathers(favorite_cities):
+        done += 1
+        yield sse_event(
+            "progress",
+            {
+                "phase": "weather",
+                "done": done,
+                "total": total,
+                "city": city["name"],
+                "status": city["status"],
+            },
+        )
+
+    # Entries are updated in place: keep the favorites order
+    weather_data.extend(to_weather_data(favorite_cities))
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Build a Server-Sent Events response from an iterator of formatted events."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Prevent proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/summary", response_model=SummaryResponse)
-async def create_summary(session: SessionDep, current_user: CurrentUser):
+async def create_summary(
+    session: SessionDep, current_user: CurrentUser, weather_agent: WeatherAgentDep
+):
     """
     Retrieve weather summary for favorite cities.
     """
     try:
-        # Fetch user favorite cities
-        w = WeatherScraper(current_user.weather_id_token)
-        favorite_cities = await w.get_user_favorite_cities()
-        favorite_cities = await get_city_weathers(favorite_cities)
-
-        # Convert to WeatherData
-        weather_data = [
-            WeatherData(
-                city=city["name"],
-                weather_condition=city["weather_condition"],
-                temperature=city["temperature_celsius"],
-            )
-            for city in favorite_cities
-        ]
+        weather_data = await get_favorite_weather_data(current_user)
 
         # Generate Summary
-        weather_agent = WeatherAgent(settings.OPENAI_API_KEY)
-        summary = weather_agent.summarize(weather_data)
+        summary = await weather_agent.asummarize(weather_data)
 
         return SummaryResponse(summary=summary)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to generate weather summary: {str(e)}"
@@ -62,31 +138,104 @@ async def create_summary(session: SessionDep, current_user: CurrentUser):
 
 
 @router.post("/ask", response_model=AskResponse)
-async def ask(request: AskRequest, session: SessionDep, current_user: CurrentUser):
+async def ask(
+    request: AskRequest,
+    session: SessionDep,
+    current_user: CurrentUser,
+    weather_agent: WeatherAgentDep,
+):
     """
     Answer a weather-related question about favorite cities.
+
+    Questions that are simple filters over the weather ("which cities are
+    raining?", "warmest city?") are answered locally, others by the model; the
+    "source" field reports which one answered.
     """
     try:
-        # Fetch user favorite cities
-        w = WeatherScraper(current_user.weather_id_token)
-        favorite_cities = await w.get_user_favorite_cities()
-        favorite_cities = await get_city_weathers(favorite_cities)
-
-        # Convert to WeatherData
-        weather_data = [
-            WeatherData(
-                city=city["name"],
-                weather_condition=city["weather_condition"],
-                temperature=city["temperature_celsius"],
-            )
-            for city in favorite_cities
-        ]
+        weather_data = await get_favorite_weather_data(current_user)
+
+        # Simple filters are answered locally, without calling the model
+        answer = answer_weather_query(request.question, weather_data)
+        if answer is not None:
+            return AskResponse(**answer.model_dump(), source="local")
 
         # Ask
-        weather_agent = WeatherAgent(settings.OPENAI_API_KEY)
-        return weather_agent.ask(request.question, weather_data)
+        answer = await weather_agent.aask(request.question, weather_data)
+        return AskResponse(**answer.model_dump(), source="llm")
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to answer weather question: {str(e)}"
         )
+
+
+@router.post("/summary/stream", response_class=StreamingResponse)
+async def stream_summary(current_user: CurrentUser, weather_agent: WeatherAgentDep):
+    """
+    Stream the weather summary for favorite cities as Server-Sent Events.
+
+    Events: "progress" while weather is fetched, "token" for each chunk of the
+    summary, then "result" with the SummaryResponse (or "error").
+    """
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            weather_data = []
+            async for event in stream_favorite_weather_data(current_user, weather_data):
+                yield event
+
+            yield sse_event("progress", {"phase": "summary"})
+            chunks = []
+            async for chunk in weather_agent.astream_summary(weather_data):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+
+            summary = SummaryResponse(summary="".join(chunks))
+            yield sse_event("result", summary.model_dump())
+        except Exception as e:
+            detail = f"Failed to generate weather summary: {str(e)}"
+            yield sse_event("error", {"detail": detail})
+
+    return event_stream_response(events())
+
+
+@router.post("/ask/stream", response_class=StreamingResponse)
+async def stream_ask(
+    request: AskRequest, current_user: CurrentUser, weather_agent: WeatherAgentDep
+):
+    """
+    Stream the answer to a weather-related question as Server-Sent Events.
+
+    Events: "progress" while weather is fetched, "token" for each chunk of the
+    model's structured output, then "result" with the AskResponse (or "error").
+    Questions answered locally skip straight to "result".
+    """
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            weather_data = []
+            async for event in stream_favorite_weather_data(current_user, weather_data):
+                yield event
+
+            answer = answer_weather_query(request.question, weather_data)
+            if answer is not None:
+                answer = AskResponse(**answer.model_dump(), source="local")
+                yield sse_event("result", answer.model_dump())
+                return
+
+            yield sse_event("progress", {"phase": "answer"})
+            async for chunk in weather_agent.astream_ask(
+                request.question, weather_data
+            ):
+                if isinstance(chunk, str):
+                    yield sse_event("token", {"text": chunk})
+                else:
+                    answer = AskResponse(**chunk.model_dump(), source="llm")
+                    yield sse_event("result", answer.model_dump())
+        except Exception as e:
+            detail = f"Failed to answer weather question: {str(e)}"
+            yield sse_event("error", {"detail": detail})
+
+    return event_stream_response(events())
@@ -1,32 +1,153 @@
-from typing import Dict, List
+import json
+import time
+from typing import Annotated, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-from app.api.deps import CurrentUser, SessionDep
-from app.repository import create_or_update_cities
-from app.weather.city import get_city_weathers
+from app import async_repository
+from app.api.deps import CurrentUser, SessionDep, with_deadline
+from app.core import deadline
+from app.core.config import settings
+from app.core.db import open_session
+from app.core.responses import etag_matches, make_etag
+from app.models import CityPublic, FavoriteCityWeather
+from app.weather.city import (
+    cached_city_weathers,
+    cached_weather_entries,
+    get_city_weathers,
+    successful_city_weathers,
+    to_weather_columns,
+)
+from app.weather.history import observation_recorder
 from app.weather.scraper import WeatherScraper
 
 router = APIRouter(prefix="/cities", tags=["cities"])
 
+# Deadline of the routes calling weather.com
+Deadline = with_deadline(settings.REQUEST_TIMEOUT)
+
 
 class FavoriteCitiesRequest(BaseModel):
     cities: List[str]
 
 
-@router.get("/favorites")
-async def get_favorites(session: SessionDep, current_user: CurrentUser) -> List[Dict]:
+class CityWeathersRequest(BaseModel):
+    place_ids: List[str] = Field(
+        min_length=1, max_length=settings.BULK_WEATHER_MAX_PLACES
+    )
+
+
+def favorites_content(favorite_cities: List[Dict]) -> List[Dict]:
+    """
+    Body of the favorites response: the `FavoriteCityWeather` fields of each city, in
+    order and None when missing, as the response model would serialize them.
+
+    Projecting the dicts is several times cheaper than validating them through the
+    response model, which FastAPI does for every item of a returned list.
+    """
+    fields = FavoriteCityWeather.model_fields
+    return [{f: city.get(f) for f in fields} for city in favorite_cities]
+
+
+def favorites_etag(
+    favorite_cities: List[Dict],
+    observed_at: List[Optional[int]],
+    errors: Optional[List[Optional[str]]] = None,
+) -> str:
+    """
+    ETag of the favorites response, from the favorite locations and the observation
+    time of their weather instead of the body, so that it is cheap to check.
+
+    Args:
+        favorite_cities: Favorite locations, each dict must have a 'placeID' key
+        observed_at: Observation time of the weather of each location
+        errors: Reason the weather of each location is missing, if any
+    """
+    errors = errors or [None] * len(favorite_cities)
+    return make_etag(
+        [
+            [city["placeID"], city.get("name"), city.get("coordinate")]
+            + [city.get("position"), observed, error]
+            for city, observed, error in zip(favorite_cities, observed_at, errors)
+        ]
+    )
+
+
+def partial_response(response: Response) -> bool:
+    """
+    Turn the response into a 504 when the deadline passed while fetching the weather:
+    its body has the weather that did arrive, the other entries have an error.
+
+    Returns:
+        bool: True if the response is partial
+    """
+    if not deadline.expired():
+        return False
+    response.status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    response.headers["Cache-Control"] = "no-store"
+    return True
+
+
+@router.get(
+    "/favorites",
+    response_model=List[FavoriteCityWeather],
+    response_class=ORJSONResponse,
+    dependencies=[Deadline],
+)
+async def get_favorites(
+    session: SessionDep,
+    current_user: CurrentUser,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> Response:
     """
     Retrieve favorite cities.
+
+    Cities whose weather could not be fetched are returned with status "error".
+    Only the fields of `FavoriteCityWeather` are returned, other location keys
+    from weather.com are dropped.
+
+    The response has an ETag, and clients must revalidate it before each reuse
+    (no-cache), as the favorites can change at any time. A request whose
+    If-None-Match has the current ETag gets a 304 without body: when the favorites
+    and their weather are cached, without any call to weather.com nor building the
+    body. The ETag derives from the favorite locations and the observation time of
+    their weather.
+
+    The request has a deadline (X-Request-Timeout header, in seconds). When it
+    passes, the response is a 504 with the weather fetched so far.
     """
     w = WeatherScraper(current_user.weather_id_token)
-    favorite_cities = await w.get_user_favorite_cities()
-    favorite_cities = await get_city_weathers(favorite_cities)
-    return favorite_cities
+    favorite_cities = await w.get_cached_user_favorite_cities()
+    # Answer from the weather cache alone when every place is fresh. The ETag is then
+    # known before building the body, only built for clients without this version
+    weather_entries = cached_weather_entries(favorite_cities)
+    if weather_entries is not None:
+        city_weathers = None
+        observed_at = [entry.value.get("observed_at") for entry in weather_entries]
+        errors = None
+    else:
+        city_weathers = await get_city_weathers(favorite_cities)
+        if deadline.expired():
+            response = ORJSONResponse(favorites_content(city_weathers))
+            partial_response(response)
+            return response
+        observed_at = [city.get("observed_at") for city in city_weathers]
+        errors = [city.get("error") for city in city_weathers]
+
+    etag = favorites_etag(favorite_cities, observed_at, errors)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    if city_weathers is None:
+        city_weathers = cached_city_weathers(favorite_cities, weather_entries)
+    # Returned as is, the response model documents it
+    return ORJSONResponse(favorites_content(city_weathers), headers=headers)
 
-@router.post("/favorites", status_code=status.HTTP_201_CREATED)
+
+@router.post("/favorites", status_code=status.HTTP_201_CREATED, dependencies=[Deadline])
 async def add_user_favorite_cities(
     request: FavoriteCitiesRequest,
     session: SessionDep,
@@ -36,30 +157,105 @@ async def add_user_favorite_cities(
     Add new favorite cities for the user.
     """
     w = WeatherScraper(current_user.weather_id_token)
-    favorite_cities = await w.add_user_favorite_cities(request.cities)
+    favorite_cities = await w.add_user_favorite_cities(request.cities, session=session)
     return favorite_cities
 
 
-@router.post("/favorites/sync", status_code=status.HTTP_200_OK)
-async def sync_favorite_cities(session: SessionDep, current_user: CurrentUser):
+@router.post(
+    "/favorites/sync",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+    dependencies=[Deadline],
+)
+async def sync_favorite_cities(
+    session: SessionDep, current_user: CurrentUser, response: Response
+) -> List[CityPublic]:
     """
     Sync favorite cities for the user.
+
+    When the deadline passes, the cities whose weather arrived are synced and
+    returned with a 504.
     """
     w = WeatherScraper(current_user.weather_id_token)
     favorite_cities = await w.get_user_favorite_cities()
     favorite_cities = await get_city_weathers(favorite_cities)
+    partial_response(response)
 
-    # Format
-    favorite_cities = [
+    # Format, cities whose weather could not be fetched are not synced
+    weathers = successful_city_weathers(favorite_cities)
+    cities_data = [
         {
+            "place_id": city["placeID"],
             "name": city["name"],
             "temperature": city["temperature_celsius"],
             "weather_condition": city["weather_condition"],
         }
-        for city in favorite_cities
+        for city in weathers
     ]
 
-    cities_synced = create_or_update_cities(
-        session=session, cities_data=favorite_cities
+    cities_synced = await async_repository.create_or_update_cities(
+        session=session, cities_data=cities_data
     )
+    # Keep the history of the weather synced
+    await observation_recorder.record(weathers, session=session)
     return cities_synced
+
+
+@router.post("/weather", response_class=ORJSONResponse, dependencies=[Deadline])
+async def get_weathers(
+    request: CityWeathersRequest, current_user: CurrentUser, response: Response
+) -> Dict[str, List]:
+    """
+    Retrieve the weather of many places at once.
+
+    Duplicate place IDs are fetched and returned once, in the order of their first
+    occurrence. The result is columnar: one array per field (`placeID`, `status`,
+    `temperature_celsius`, `weather_condition`, `observed_at`, `error`), where the
+    i-th elements describe the i-th place. Places whose weather could not be fetched
+    have status "error" and the reason in `error`, and the response is a 504 if
+    some could not be fetched before the deadline.
+    """
+    place_ids = list(dict.fromkeys(request.place_ids))  # Remove duplicates, keep order
+    city_weathers = await get_city_weathers(
+        [{"placeID": place_id} for place_id in place_ids]
+    )
+    partial_response(response)
+    return to_weather_columns(city_weathers)
+
+
+@router.get("/{place_id}/observations", response_class=StreamingResponse)
+async def get_observations(
+    place_id: str,
+    current_user: CurrentUser,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+):
+    """
+    Stream the weather observations of a place in a time range, oldest first, as
+    newline-delimited JSON (one observation per line).
+
+    `start` and `end` are Unix times (`end` excluded), the last 24 hours by default.
+    """
+    end = int(time.time()) + 1 if end is None else end
+    start = end - 24 * 60 * 60 if start is None else start
+
+    async def lines() -> AsyncIterator[str]:
+        # The session lives as long as the response is streamed
+        async with open_session() as session:
+            after = None
+            while True:
+                observations = await async_repository.get_weather_observations(
+                    session=session,
+                    place_id=place_id,
+                    start=start,
+                    end=end,
+                    after=after,
+                    limit=settings.OBSERVATION_PAGE_SIZE,
+                )
+                for observation in observations:
+                    yield json.dumps(observation) + "\n"
+                if len(observations) < settings.OBSERVATION_PAGE_SIZE:
+                    break
+                after = observations[-1]["observed_at"]
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
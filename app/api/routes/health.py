@@ -1,8 +1,28 @@
 from fastapi import APIRouter
 
+from app.api.deps import WeatherAgentDep
+from app.chat.cache import llm_cache
+from app.weather.city import weather_cache, weather_scheduler
+from app.weather.http import http_client
+
 router = APIRouter(tags=["health"])
 
 
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+
+@router.get("/health/stats")
+async def stats(weather_agent: WeatherAgentDep):
+    """
+    Retrieve runtime statistics (e.g. upstream connection pool, cache usage and
+    LLM prompt sizes).
+    """
+    return {
+        "http_pool": http_client.stats(),
+        "weather_cache": weather_cache.stats(),
+        "weather_scheduler": weather_scheduler.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_agent": weather_agent.stats(),
+    }
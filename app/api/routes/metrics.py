@@ -0,0 +1,139 @@
+from typing import List
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.chat.cache import llm_cache
+from app.core.metrics import Snapshot, registry
+from app.weather.city import weather_cache, weather_scheduler
+from app.weather.http import http_client
+from app.weather.resilience import CircuitBreaker, weather_breakers
+from app.weather.scraper import favorites_cache
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(tags=["metrics"])
+
+
+def collect_runtime_stats() -> List[Snapshot]:
+    """Read the counters kept by the caches, the scheduler and the HTTP pool."""
+    caches = {
+        "weather": weather_cache.stats(),
+        "favorites": favorites_cache.stats(),
+        "llm": llm_cache.stats(),
+    }
+    results = {
+        "hit": "hits",
+        "stale_hit": "stale_hits",
+        "miss": "misses",
+        "coalesced": "coalesced",
+    }
+    http_pool = http_client.stats()
+    scheduler = weather_scheduler.stats()
+    breakers = weather_breakers.stats()
+    states = (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+
+    return [
+        Snapshot(
+            "cache_lookups_total",
+            "counter",
+            "Cache lookups by result",
+            ("cache", "result"),
+            {
+                (cache, result): stats[counter]
+                for cache, stats in caches.items()
+                for result, counter in results.items()
+            },
+        ),
+        Snapshot(
+            "cache_evictions_total",
+            "counter",
+            "Entries evicted to respect the cache size",
+            ("cache",),
+            {(cache,): stats["evictions"] for cache, stats in caches.items()},
+        ),
+        Snapshot(
+            "cache_entries",
+            "gauge",
+            "Entries in the cache",
+            ("cache",),
+            {(cache,): stats["size"] for cache, stats in caches.items()},
+        ),
+        Snapshot(
+            "llm_cache_tokens_saved_total",
+            "counter",
+            "Tokens of the LLM responses served from the cache",
+            samples={(): caches["llm"]["tokens_saved"]},
+        ),
+        Snapshot(
+            "http_pool_requests",
+            "gauge",
+            "Requests to weather.com using or waiting for a pooled connection",
+            ("state",),
+            {
+                ("in_flight",): http_pool["in_flight"],
+                ("waiting",): http_pool["waiting"],
+            },
+        ),
+        Snapshot(
+            "http_pool_connections_total",
+            "counter",
+            "Connections to weather.com, new or reused from the pool",
+            ("reused",),
+            {
+                ("false",): http_pool["connections_created"],
+                ("true",): http_pool["connections_reused"],
+            },
+        ),
+        Snapshot(
+            "scraper_scheduler_fetches",
+            "gauge",
+            "Weather page scrapes running or waiting for the scheduler",
+            ("state",),
+            {("running",): scheduler["running"], ("waiting",): scheduler["waiting"]},
+        ),
+        Snapshot(
+            "scraper_scheduler_throttled_seconds_total",
+            "counter",
+            "Time scrapes waited for the rate limit",
+            samples={(): scheduler["throttled_seconds"]},
+        ),
+        Snapshot(
+            "circuit_breaker_state",
+            "gauge",
+            "State of the weather.com circuit breakers (1 for the current state)",
+            ("operation", "state"),
+            {
+                (operation, state): float(stats["state"] == state)
+                for operation, stats in breakers.items()
+                for state in states
+            },
+        ),
+        Snapshot(
+            "circuit_breaker_opened_total",
+            "counter",
+            "Times a weather.com circuit breaker opened",
+            ("operation",),
+            {(operation,): stats["opened"] for operation, stats in breakers.items()},
+        ),
+        Snapshot(
+            "circuit_breaker_rejected_total",
+            "counter",
+            "Calls to weather.com rejected by an open circuit breaker",
+            ("operation",),
+            {(operation,): stats["rejected"] for operation, stats in breakers.items()},
+        ),
+    ]
+
+
+registry.add_collector(collect_runtime_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metrics of this process in the Prometheus text format (with several workers,
+    each scrape is answered by one of them).
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
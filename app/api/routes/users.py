@@ -6,9 +6,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 
-from app import repository
-from app.api.deps import CurrentUser, SessionDep
-from app.core.auth import create_access_token, get_password_hash
+from app import async_repository
+from app.api.deps import CurrentUser, SessionDep, with_deadline
+from app.core.auth import aget_password_hash, create_access_token
 from app.core.config import settings
 from app.models import Token, UserSignup
 from app.repository import UserNotFoundError
@@ -27,25 +27,27 @@ class UserResponse(BaseModel):
 
 
 @router.post("/signup", response_model=UserResponse)
-def register_user(session: SessionDep, user_signup: UserSignup) -> UserResponse:
+async def register_user(session: SessionDep, user_signup: UserSignup) -> UserResponse:
     """
     Create new user without the need to be logged in.
     """
-    user = repository.get_user_by_email(session=session, email=user_signup.email)
+    user = await async_repository.get_user_by_email(
+        session=session, email=user_signup.email
+    )
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user = repository.create_user(
+    user = await async_repository.create_user(
         session=session,
         email=user_signup.email,
-        hashed_password=get_password_hash(user_signup.password),
+        hashed_password=await aget_password_hash(user_signup.password),
     )
     return user
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[with_deadline(settings.REQUEST_TIMEOUT)])
 async def login(
     session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
@@ -57,8 +59,9 @@ async def login(
             - 400: If email/password is incorrect
             - 401: If weather.com login fails
             - 500: If there's an internal server error
+            - 504: If weather.com doesn't answer before the deadline
     """
-    user = repository.authenticate(
+    user = await async_repository.authenticate(
         session=session, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -70,7 +73,7 @@ async def login(
         weather_id_token = await w.user_login(
             email=form_data.username, password=form_data.password
         )
-        repository.update_user_weather_id_token(
+        await async_repository.update_user_weather_id_token(
             session=session, user_id=user.id, weather_id_token=weather_id_token
         )
     except InvalidLoginCredentials:
@@ -0,0 +1,310 @@
+"""Async versions of the functions in `app.repository`, for async request handlers.
+
+Each function takes either an `AsyncSession` (when DATABASE_URL selects an asyncio
+driver) or a blocking `Session`, whose queries then run in a worker thread. Either
+way, database I/O doesn't block the event loop.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import repository
+from app.core.auth import averify_and_update_password, user_cache
+from app.models import City, CityLookup, User
+from app.repository import (
+    UserNotFoundError,
+    build_city_rows,
+    build_observation_rows,
+    compact_observations_statements,
+    conditions_statement,
+    insert_conditions_statement,
+    insert_observations_statement,
+    observations_statement,
+    unchanged_cities_statement,
+    upsert_cities_statement,
+)
+
+AnySession = Session | AsyncSession
+
+
+async def create_user(*, session: AnySession, email: str, hashed_password: str) -> User:
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.create_user,
+            session=session,
+            email=email,
+            hashed_password=hashed_password,
+        )
+
+    user = User.model_validate(User(email=email, hashed_password=hashed_password))
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    return user
+
+
+async def get_user_by_id(*, session: AnySession, id: str) -> User | None:
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.get_user_by_id, session=session, id=id
+        )
+
+    statement = select(User).where(User.id == id)
+    return (await session.exec(statement)).first()
+
+
+async def get_user_by_email(*, session: AnySession, email: str) -> User | None:
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.get_user_by_email, session=session, email=email
+        )
+
+    statement = select(User).where(User.email == email)
+    return (await session.exec(statement)).first()
+
+
+async def update_user_weather_id_token(
+    *, session: AnySession, user_id: str, weather_id_token: str
+) -> User:
+    """Update a user's weather ID token (see `repository.update_user_weather_id_token`)."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.update_user_weather_id_token,
+            session=session,
+            user_id=user_id,
+            weather_id_token=weather_id_token,
+        )
+
+    user = await get_user_by_id(session=session, id=user_id)
+    if not user:
+        raise UserNotFoundError(f"User with ID {user_id} not found")
+
+    user.weather_id_token = weather_id_token
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    # The next authenticated request reloads the user
+    user_cache.invalidate(user_id)
+    return user
+
+
+async def update_user_hashed_password(
+    *, session: AnySession, user: User, hashed_password: str
+) -> User:
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.update_user_hashed_password,
+            session=session,
+            user=user,
+            hashed_password=hashed_password,
+        )
+
+    user.hashed_password = hashed_password
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    user_cache.invalidate(user.id)
+    return user
+
+
+async def authenticate(
+    *, session: AnySession, email: str, password: str
+) -> User | None:
+    """Authenticate a user, with bcrypt run in the password executor."""
+    user = await get_user_by_email(session=session, email=email)
+    if not user:
+        return None
+    valid, new_hash = await averify_and_update_password(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # Rehash passwords stored with outdated settings (e.g. another bcrypt cost)
+        user = await update_user_hashed_password(
+            session=session, user=user, hashed_password=new_hash
+        )
+    return user
+
+
+async def create_or_update_cities(
+    *, session: AnySession, cities_data: list[dict], chunk_size: int = 100
+) -> list[City]:
+    """Bulk upsert cities (see `repository.create_or_update_cities`)."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.create_or_update_cities,
+            session=session,
+            cities_data=cities_data,
+            chunk_size=chunk_size,
+        )
+
+    rows = build_city_rows(cities_data)
+    connection = await session.connection()
+    dialect = connection.dialect.name
+
+    cities: dict[str, City] = {}
+    values = list(rows.values())
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start : start + chunk_size]
+        result = await connection.execute(upsert_cities_statement(dialect, chunk))
+        for row in result:
+            cities[row.place_id] = City(**row._mapping)
+
+        statement = unchanged_cities_statement(chunk, cities)
+        if statement is not None:
+            for row in await connection.execute(statement):
+                cities[row.place_id] = City(**row._mapping)
+
+    await session.commit()
+    return [cities[place_id] for place_id in rows]
+
+
+async def get_city_lookups(
+    *, session: AnySession, queries: list[str]
+) -> dict[str, CityLookup]:
+    """Get the cached location search results for normalized queries, if not expired."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.get_city_lookups, session=session, queries=queries
+        )
+
+    statement = select(CityLookup).where(
+        CityLookup.query.in_(queries),
+        CityLookup.expires_at > datetime.now(timezone.utc),
+    )
+    return {lookup.query: lookup for lookup in await session.exec(statement)}
+
+
+async def save_city_lookups(
+    *,
+    session: AnySession,
+    city_infos: dict[str, dict | None],
+    ttl: timedelta,
+    negative_ttl: timedelta,
+) -> list[CityLookup]:
+    """Cache location search results (see `repository.save_city_lookups`)."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.save_city_lookups,
+            session=session,
+            city_infos=city_infos,
+            ttl=ttl,
+            negative_ttl=negative_ttl,
+        )
+
+    now = datetime.now(timezone.utc)
+    lookups = []
+    for query, city_info in city_infos.items():
+        lookup = CityLookup(
+            query=query,
+            name=city_info["name"] if city_info else None,
+            coordinate=city_info["coordinate"] if city_info else None,
+            place_id=city_info["placeID"] if city_info else None,
+            expires_at=now + (ttl if city_info else negative_ttl),
+        )
+        lookups.append(await session.merge(lookup))
+
+    await session.commit()
+    return lookups
+
+
+async def get_condition_codes(
+    *, session: AnySession, names: list[str]
+) -> dict[str, int]:
+    """Get the codes of weather conditions by name, creating the missing ones."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.get_condition_codes, session=session, names=names
+        )
+
+    connection = await session.connection()
+    result = await connection.execute(conditions_statement(names))
+    codes = {row.name: row.code for row in result}
+    missing = [name for name in names if name not in codes]
+    if missing:
+        dialect = connection.dialect.name
+        await connection.execute(insert_conditions_statement(dialect, missing))
+        result = await connection.execute(conditions_statement(missing))
+        codes.update((row.name, row.code) for row in result)
+    return codes
+
+
+async def save_weather_observations(
+    *, session: AnySession, observations: list[dict], chunk_size: int = 200
+) -> int:
+    """Append weather observations (see `repository.save_weather_observations`)."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.save_weather_observations,
+            session=session,
+            observations=observations,
+            chunk_size=chunk_size,
+        )
+    if not observations:
+        return 0
+
+    names = sorted({observation["weather_condition"] for observation in observations})
+    codes = await get_condition_codes(session=session, names=names)
+
+    rows = build_observation_rows(observations, codes)
+    connection = await session.connection()
+    dialect = connection.dialect.name
+    stored = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        result = await connection.execute(insert_observations_statement(dialect, chunk))
+        stored += result.rowcount
+    await session.commit()
+    return stored
+
+
+async def get_weather_observations(
+    *,
+    session: AnySession,
+    place_id: str,
+    start: int,
+    end: int,
+    after: int | None = None,
+    limit: int = 1_000,
+) -> list[dict]:
+    """Get the observations of a place in a time range, oldest first."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.get_weather_observations,
+            session=session,
+            place_id=place_id,
+            start=start,
+            end=end,
+            after=after,
+            limit=limit,
+        )
+
+    connection = await session.connection()
+    statement = observations_statement(place_id, start, end, after, limit)
+    return [dict(row._mapping) for row in await connection.execute(statement)]
+
+
+async def compact_weather_observations(
+    *, session: AnySession, now: int, raw_retention: int, interval: int, max_age: int
+) -> int:
+    """Apply the retention policy (see `repository.compact_weather_observations`)."""
+    if not isinstance(session, AsyncSession):
+        return await asyncio.to_thread(
+            repository.compact_weather_observations,
+            session=session,
+            now=now,
+            raw_retention=raw_retention,
+            interval=interval,
+            max_age=max_age,
+        )
+
+    connection = await session.connection()
+    deleted = 0
+    for statement in compact_observations_statements(
+        now, raw_retention, interval, max_age
+    ):
+        deleted += (await connection.execute(statement)).rowcount
+    await session.commit()
+    return deleted
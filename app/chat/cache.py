@@ -0,0 +1,108 @@
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so that trivially different spellings share a cache entry."""
+    return " ".join(question.split()).casefold()
+
+
+class LLMResponseCache:
+    """Content-addressed cache of LLM responses.
+
+    Responses are keyed by a hash of everything that determines them (model, prompt
+    template, weather context and question), so identical requests, whichever user
+    makes them, skip the model entirely.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        """
+        Args:
+            ttl: Time to live of a response, in seconds
+            max_size: Maximum number of responses kept
+        """
+        self._cache = TTLCache(ttl=ttl, max_size=max_size)
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def key(
+        model: str,
+        prompt_template: str,
+        weather_context: str,
+        question: Optional[str] = None,
+    ) -> str:
+        """Build the cache key of a request."""
+        parts = [model, prompt_template, weather_context]
+        if question is not None:
+            parts.append(normalize_question(question))
+        return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+    async def get_or_generate(
+        self, key: str, generate: Callable[[], Awaitable[Tuple[Any, int]]]
+    ) -> Any:
+        """
+        Return the cached response for a key, calling the model on a miss.
+
+        Args:
+            key: Cache key (see `key`)
+            generate: Coroutine function calling the model, returning the response
+                and the number of tokens it consumed
+
+        Returns:
+            The cached or freshly generated response
+        """
+        generated = False
+
+        async def fetch() -> Tuple[Any, int]:
+            nonlocal generated
+            generated = True
+            response, tokens = await generate()
+            self.tokens_used += tokens
+            return response, tokens
+
+        response, tokens = await self._cache.get_or_fetch(key, fetch)
+        if not generated:
+            self.tokens_saved += tokens
+        return response
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """Return the cached response for a key, or None (for callers that stream)."""
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+
+        response, tokens = cached
+        self.tokens_saved += tokens
+        return response
+
+    def store(self, key: str, response: Any, tokens: int) -> None:
+        """Cache a response generated outside `get_or_generate` (e.g. streamed)."""
+        self.tokens_used += tokens
+        self._cache.set(key, (response, tokens))
+
+    def clear(self) -> None:
+        """Remove every response and reset counters."""
+        self._cache.clear()
+        self.tokens_used = self.tokens_saved = 0
+
+    def stats(self) -> Dict[str, int | float]:
+        """Return cache usage counters, including the tokens used and saved."""
+        return {
+            **self._cache.stats(),
+            "tokens_used": self.tokens_used,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+llm_cache = LLMResponseCache(
+    ttl=(
+        settings.WEATHER_CACHE_TTL
+        if settings.LLM_CACHE_TTL is None
+        else settings.LLM_CACHE_TTL
+    ),
+    max_size=settings.LLM_CACHE_MAX_SIZE,
+)
@@ -1,12 +1,42 @@
-from typing import List
-
-from openai import OpenAI
+import math
+import re
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import openai
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 
+from app.core import deadline
+from app.core.metrics import llm_tokens, track_upstream
+from app.core.tracing import span
+
+from .cache import LLMResponseCache
+from .conditions import find_conditions, matches_condition
 from .prompts import WEATHER_QUERY_PROMPT, WEATHER_SUMMARY_PROMPT
 
 MODEL = "gpt-4.1-nano"
 
+# Rough number of characters per token, to estimate prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+# Width of the temperature bands cities are grouped by when compacting a context
+TEMPERATURE_BAND = 5
+# Backoff of the retries made under a request deadline, as the OpenAI client's own
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+T = TypeVar("T")
+
 
 class WeatherAgentError(Exception):
     """Custom exception for weather agent related errors."""
@@ -30,11 +60,55 @@ class AskResponse(BaseModel):
 
 
 class WeatherAgent:
-    """Agent responsible for handling weather-related queries and summaries."""
+    """Agent responsible for handling weather-related queries and summaries.
 
-    def __init__(self, openai_api_key: str):
-        """Initialize the WeatherAgent with OpenAI client."""
-        self.client = OpenAI()
+    Both a sync and an async OpenAI client are created: use the `a`-prefixed methods
+    from async code so that LLM calls don't block the event loop. The clients keep
+    a connection pool, so an agent is meant to be created once and shared.
+    """
+
+    def __init__(
+        self,
+        openai_api_key: str,
+        timeout: float = 20.0,
+        max_retries: int = 2,
+        cache: Optional[LLMResponseCache] = None,
+        context_token_budget: Optional[int] = None,
+        base_url: Optional[str] = None,
+    ):
+        """Initialize the WeatherAgent with OpenAI clients.
+
+        Args:
+            openai_api_key: OpenAI API key
+            timeout: Timeout of an OpenAI request, in seconds
+            max_retries: Max retries of a failed OpenAI request
+            cache: Cache of the responses of the async methods, disabled if None
+            context_token_budget: Max estimated tokens of the weather context, None
+                for no limit (see `build_budgeted_weather_context`)
+            base_url: Base URL of the OpenAI API, None for the default
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = cache
+        self.context_token_budget = context_token_budget
+
+        self.calls = 0
+        self.input_tokens = 0
+        self.context_tokens = 0
+        self.compacted_contexts = 0
+        self.compacted_cities = 0
+        self.client = OpenAI(
+            api_key=openai_api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=openai_api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
 
     def summarize(self, cities: List[WeatherData]) -> str:
         """
@@ -50,28 +124,54 @@ class WeatherAgent:
             return "No weather data available to summarize."
 
         try:
-            # Format the prompt
-            weather_context = build_weather_context(cities)
-            prompt = WEATHER_SUMMARY_PROMPT.format(weather_context=weather_context)
-
-            # Call OpenAI API
-            response = self.client.responses.create(
-                model=MODEL,
-                input=[
-                    {
-                        "role": "system",
-                        "content": prompt,
-                    }
-                ],
-                temperature=0.7,  # Add some creativity while keeping it focused
-                max_output_tokens=150,  # Keep summaries concise
-            )
+            weather_context = self._weather_context(cities)
+            with track_upstream("llm_summary"):
+                response = self.client.responses.create(
+                    **self._summary_request(weather_context)
+                )
+            self._record_usage(response)
             return response.output[0].content[0].text
 
         except Exception as e:
             # Raise custom exception with original error details
             raise WeatherAgentError(f"Failed to generate weather summary: {str(e)}")
 
+    async def asummarize(self, cities: List[WeatherData]) -> str:
+        """
+        Async version of `summarize`, which doesn't block the event loop.
+
+        Args:
+            cities: List of WeatherData objects containing weather information for each city
+
+        Returns:
+            str: A natural language summary of the weather
+        """
+        if not cities:
+            return "No weather data available to summarize."
+
+        try:
+            weather_context = self._weather_context(cities)
+
+            async def generate() -> Tuple[str, int]:
+                with track_upstream("llm_summary"):
+                    response = await self._arequest(
+                        lambda client: client.responses.create(
+                            **self._summary_request(weather_context)
+                        )
+                    )
+                self._record_usage(response)
+                return response.output[0].content[0].text, _total_tokens(response)
+
+            return await self._acached(
+                generate, WEATHER_SUMMARY_PROMPT, weather_context
+            )
+
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Raise custom exception with original error details
+            raise WeatherAgentError(f"Failed to generate weather summary: {str(e)}")
+
     def ask(self, question: str, cities: List[WeatherData]) -> AskResponse:
         """
         Answer a freeform question about weather in the specified cities.
@@ -90,34 +190,306 @@ class WeatherAgent:
             )
 
         try:
-            # Format the prompt
-            weather_context = build_weather_context(cities)
-            prompt = WEATHER_QUERY_PROMPT.format(weather_context=weather_context)
-
-            # Call OpenAI API
-            response = self.client.responses.parse(
-                model=MODEL,
-                input=[
-                    {
-                        "role": "system",
-                        "content": prompt,
-                    },
-                    {
-                        "role": "user",
-                        "content": question,
-                    },
-                ],
-                text_format=AskResponse,
-                temperature=0.7,  # Add some creativity while keeping it focused
-                max_output_tokens=150,  # Keep summaries concise
+            weather_context = self._weather_context(cities, question)
+            with track_upstream("llm_ask"):
+                response = self.client.responses.parse(
+                    **self._ask_request(question, weather_context)
+                )
+            self._record_usage(response)
+            return response.output_parsed
+
+        except Exception as e:
+            # Raise custom exception with original error details
+            raise WeatherAgentError(f"Failed to generate weather response: {str(e)}")
+
+    async def aask(self, question: str, cities: List[WeatherData]) -> AskResponse:
+        """
+        Async version of `ask`, which doesn't block the event loop.
+
+        Args:
+            question: Natural language question about the weather
+            cities: List of WeatherData objects containing weather information for each city
+
+        Returns:
+            Dictionary containing the answer to the weather question
+        """
+        if not cities:
+            return AskResponse(
+                answer="No weather data available to answer the question.",
+                matching_cities=[],
             )
 
-            return response.output_parsed
+        try:
+            weather_context = self._weather_context(cities, question)
+
+            async def generate() -> Tuple[AskResponse, int]:
+                with track_upstream("llm_ask"):
+                    response = await self._arequest(
+                        lambda client: client.responses.parse(
+                            **self._ask_request(question, weather_context)
+                        )
+                    )
+                self._record_usage(response)
+                return response.output_parsed, _total_tokens(response)
+
+            response = await self._acached(
+                generate, WEATHER_QUERY_PROMPT, weather_context, question
+            )
+            # Don't let callers mutate the cached response
+            return response.model_copy()
+
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Raise custom exception with original error details
+            raise WeatherAgentError(f"Failed to generate weather response: {str(e)}")
+
+    async def astream_summary(self, cities: List[WeatherData]) -> AsyncIterator[str]:
+        """
+        Streaming version of `asummarize`, yielding the summary as the model writes it.
+
+        Args:
+            cities: List of WeatherData objects containing weather information for each city
 
+        Yields:
+            str: The next chunk of the summary (the whole summary if it was cached)
+        """
+        if not cities:
+            yield "No weather data available to summarize."
+            return
+
+        weather_context = self._weather_context(cities)
+        key = self._cache_key(WEATHER_SUMMARY_PROMPT, weather_context)
+        cached = self.cache.lookup(key) if self.cache else None
+        if cached is not None:
+            yield cached
+            return
+
+        chunks, tokens = [], 0
+        try:
+            # The duration includes the time the caller takes to consume the chunks
+            with track_upstream("llm_summary_stream"):
+                stream = await self._aclient().responses.create(
+                    **self._summary_request(weather_context), stream=True
+                )
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        chunks.append(event.delta)
+                        yield event.delta
+                    elif event.type == "response.completed":
+                        tokens = _total_tokens(event.response)
+                        self._record_usage(event.response)
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Raise custom exception with original error details
+            raise WeatherAgentError(f"Failed to generate weather summary: {str(e)}")
+
+        if self.cache:
+            self.cache.store(key, "".join(chunks), tokens)
+
+    async def astream_ask(
+        self, question: str, cities: List[WeatherData]
+    ) -> AsyncIterator[str | AskResponse]:
+        """
+        Streaming version of `aask`, yielding the raw structured output as the model
+        writes it, then the parsed answer.
+
+        Args:
+            question: Natural language question about the weather
+            cities: List of WeatherData objects containing weather information for each city
+
+        Yields:
+            str | AskResponse: The next chunk of the model output, and finally the answer
+        """
+        if not cities:
+            yield AskResponse(
+                answer="No weather data available to answer the question.",
+                matching_cities=[],
+            )
+            return
+
+        weather_context = self._weather_context(cities, question)
+        key = self._cache_key(WEATHER_QUERY_PROMPT, weather_context, question)
+        cached = self.cache.lookup(key) if self.cache else None
+        if cached is not None:
+            yield cached.model_copy()
+            return
+
+        try:
+            with track_upstream("llm_ask_stream"):
+                async with self._aclient().responses.stream(
+                    **self._ask_request(question, weather_context)
+                ) as stream:
+                    async for event in stream:
+                        if event.type == "response.output_text.delta":
+                            yield event.delta
+                    response = await stream.get_final_response()
+            self._record_usage(response)
+            answer = response.output_parsed
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             # Raise custom exception with original error details
             raise WeatherAgentError(f"Failed to generate weather response: {str(e)}")
 
+        if self.cache:
+            self.cache.store(key, answer, _total_tokens(response))
+        yield answer.model_copy()
+
+    def stats(self) -> Dict[str, int]:
+        """Return prompt size counters: model calls, input tokens and compaction."""
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "context_tokens": self.context_tokens,
+            "compacted_contexts": self.compacted_contexts,
+            "compacted_cities": self.compacted_cities,
+        }
+
+    def _weather_context(
+        self, cities: List[WeatherData], question: Optional[str] = None
+    ) -> str:
+        with span("weather_context"):
+            context = build_budgeted_weather_context(
+                cities, question, self.context_token_budget
+            )
+        self.context_tokens += context.tokens
+        if context.grouped or context.omitted:
+            self.compacted_contexts += 1
+            self.compacted_cities += context.grouped + context.omitted
+        return context.text
+
+    def _record_usage(self, response: Any) -> None:
+        # Tokens of a Responses API call, as reported by the API
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0)
+        output_tokens = getattr(usage, "output_tokens", 0)
+        self.calls += 1
+        if isinstance(input_tokens, int):
+            self.input_tokens += input_tokens
+            llm_tokens.labels("input").inc(input_tokens)
+        if isinstance(output_tokens, int):
+            llm_tokens.labels("output").inc(output_tokens)
+
+    def _aclient(self) -> AsyncOpenAI:
+        """
+        Return the async client, with its timeout bounded by the request deadline.
+
+        Raises:
+            DeadlineExceeded: If the deadline has passed
+        """
+        if deadline.remaining() is None:
+            return self.async_client
+        deadline.check()
+        # The client's own retries would not stop at the deadline
+        return self.async_client.with_options(
+            timeout=deadline.timeout(self.timeout), max_retries=0
+        )
+
+    async def _arequest(self, request: Callable[[AsyncOpenAI], Awaitable[T]]) -> T:
+        """
+        Make an OpenAI request through the async client, within the request deadline.
+
+        Without deadline, the client retries failed requests itself. Under a deadline,
+        they are retried with jittered backoff while the deadline allows.
+
+        Args:
+            request: Function making the request with a client
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before a response
+        """
+        if deadline.remaining() is None:
+            return await request(self.async_client)
+
+        async def attempt() -> T:
+            try:
+                return await request(self._aclient())
+            except openai.APITimeoutError as e:
+                if deadline.expired():
+                    raise deadline.DeadlineExceeded("Deadline exceeded") from e
+                raise
+
+        return await deadline.retry(
+            attempt,
+            retries=self.max_retries,
+            base_delay=RETRY_BASE_DELAY,
+            max_delay=RETRY_MAX_DELAY,
+            is_retryable=_is_retryable,
+        )
+
+    def _cache_key(
+        self, prompt_template: str, weather_context: str, question: Optional[str] = None
+    ) -> str:
+        return LLMResponseCache.key(MODEL, prompt_template, weather_context, question)
+
+    async def _acached(
+        self,
+        generate: Callable[[], Awaitable[Tuple[Any, int]]],
+        prompt_template: str,
+        weather_context: str,
+        question: Optional[str] = None,
+    ) -> Any:
+        # Serve identical requests from the cache, when enabled
+        if self.cache is None:
+            response, _ = await generate()
+            return response
+
+        key = self._cache_key(prompt_template, weather_context, question)
+        return await self.cache.get_or_generate(key, generate)
+
+    def _summary_request(self, weather_context: str) -> dict:
+        # Format the prompt
+        prompt = WEATHER_SUMMARY_PROMPT.format(weather_context=weather_context)
+
+        return dict(
+            model=MODEL,
+            input=[
+                {
+                    "role": "system",
+                    "content": prompt,
+                }
+            ],
+            temperature=0.7,  # Add some creativity while keeping it focused
+            max_output_tokens=150,  # Keep summaries concise
+        )
+
+    def _ask_request(self, question: str, weather_context: str) -> dict:
+        # Format the prompt
+        prompt = WEATHER_QUERY_PROMPT.format(weather_context=weather_context)
+
+        return dict(
+            model=MODEL,
+            input=[
+                {
+                    "role": "system",
+                    "content": prompt,
+                },
+                {
+                    "role": "user",
+                    "content": question,
+                },
+            ],
+            text_format=AskResponse,
+            temperature=0.7,  # Add some creativity while keeping it focused
+            max_output_tokens=150,  # Keep summaries concise
+        )
+
+
+def _total_tokens(response: Any) -> int:
+    # Tokens consumed by a Responses API call (0 if the usage is not reported)
+    total_tokens = getattr(getattr(response, "usage", None), "total_tokens", 0)
+    return total_tokens if isinstance(total_tokens, int) else 0
+
+
+def _is_retryable(error: Exception) -> bool:
+    # Errors the OpenAI client retries itself: connection, timeout, rate limit, 5xx
+    return isinstance(
+        error,
+        (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+    )
+
 
 def build_weather_context(cities: List[WeatherData]) -> str:
     """
@@ -129,9 +501,144 @@ def build_weather_context(cities: List[WeatherData]) -> str:
     Returns:
         str: A weather context string
     """
-    return "\n".join(
-        [
-            f"- {city.city}: {city.weather_condition}, {city.temperature}°C"
-            for city in cities
-        ]
+    return "\n".join([format_weather_line(city) for city in cities])
+
+
+def format_weather_line(city: WeatherData) -> str:
+    return f"- {city.city}: {city.weather_condition}, {city.temperature}°C"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class WeatherContext:
+    """A weather context and how it was built."""
+
+    text: str
+    tokens: int  # Estimated
+    cities: int  # Cities in the weather data
+    listed: int  # Cities listed on their own line
+    grouped: int  # Cities listed in a condition/temperature group
+    omitted: int  # Cities left out to fit the budget
+
+
+def relevant_cities(
+    cities: List[WeatherData], question: Optional[str]
+) -> List[WeatherData]:
+    """
+    Return the cities a question is most likely about: the cities it names, then the
+    cities with the conditions it mentions (e.g. "rain"), in their original order.
+    """
+    if not question:
+        return []
+
+    text = question.lower()
+    named = []
+    for city in cities:
+        # "London, UK" is named by "london"
+        name = city.city.split(",")[0].strip().lower()
+        if name and re.search(rf"\b{re.escape(name)}\b", text):
+            named.append(city)
+    conditions = find_conditions(text)
+    with_conditions = [
+        city
+        for city in cities
+        if any(matches_condition(name, city.weather_condition) for name in conditions)
+    ]
+
+    relevant = {id(city): city for city in named + with_conditions}
+    return list(relevant.values())
+
+
+def group_cities(cities: List[WeatherData]) -> List[Tuple[str, List[str]]]:
+    """
+    Group cities by condition and temperature band.
+
+    Returns:
+        List[Tuple[str, List[str]]]: (group label, sorted city names), largest
+            groups first, ties in label order
+    """
+    groups: Dict[Tuple[str, int], List[str]] = {}
+    for city in cities:
+        band = math.floor(city.temperature / TEMPERATURE_BAND) * TEMPERATURE_BAND
+        key = (city.weather_condition.strip().capitalize(), band)
+        groups.setdefault(key, []).append(city.city)
+
+    ordered = sorted(groups.items(), key=lambda group: (-len(group[1]), group[0]))
+    return [
+        (f"{condition}, {band} to {band + TEMPERATURE_BAND}°C", sorted(names))
+        for (condition, band), names in ordered
+    ]
+
+
+def build_budgeted_weather_context(
+    cities: List[WeatherData],
+    question: Optional[str] = None,
+    token_budget: Optional[int] = None,
+) -> WeatherContext:
+    """
+    Build a weather context fitting in a token budget.
+
+    Contexts within the budget are the same as `build_weather_context`. Larger ones
+    list the cities relevant to the question first, one per line, then group the
+    other cities by condition and temperature band, and finally leave out what
+    doesn't fit. The output only depends on the inputs.
+
+    Args:
+        cities: List of WeatherData objects containing weather information for each city
+        question: Question the context is built for, if any
+        token_budget: Max estimated tokens of the context, None for no limit
+
+    Returns:
+        WeatherContext: The context and how many cities were listed, grouped or omitted
+    """
+    text = build_weather_context(cities)
+    tokens = estimate_tokens(text)
+    if token_budget is None or tokens <= token_budget:
+        return WeatherContext(text, tokens, len(cities), len(cities), 0, 0)
+
+    # Keep room for the line reporting the omitted cities
+    budget = token_budget - estimate_tokens(f"- ... and {len(cities)} more cities")
+    lines: List[str] = []
+    used = 0
+
+    def add(line: str) -> bool:
+        nonlocal used
+        line_tokens = estimate_tokens(line + "\n")
+        if used + line_tokens > budget:
+            return False
+        lines.append(line)
+        used += line_tokens
+        return True
+
+    relevant = relevant_cities(cities, question)
+    listed = [city for city in relevant if add(format_weather_line(city))]
+
+    listed_ids = {id(city) for city in listed}
+    rest = [city for city in cities if id(city) not in listed_ids]
+    grouped = 0
+    for label, names in group_cities(rest):
+        # Add as many names of the group as fit
+        included = 0
+        line = f"- {label}: "
+        for name in names:
+            candidate = line + (", " if included else "") + name
+            if used + estimate_tokens(candidate + "\n") > budget:
+                break
+            line = candidate
+            included += 1
+        if included:
+            add(line)
+            grouped += included
+
+    omitted = len(cities) - len(listed) - grouped
+    if omitted:
+        lines.append(f"- ... and {omitted} more cities")
+
+    text = "\n".join(lines)
+    return WeatherContext(
+        text, estimate_tokens(text), len(cities), len(listed), grouped, omitted
     )
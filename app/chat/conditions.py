@@ -0,0 +1,34 @@
+import re
+from typing import Dict, List
+
+# Condition name -> (words of a question, words found in weather.com conditions
+# such as "Light Rain")
+CONDITIONS = {
+    "raining": (
+        r"rain|raining|rainy|wet|showers?|drizzle|drizzling",
+        ("rain", "drizzle"),
+    ),
+    "sunny": (r"sun|sunny|sunshine|clear", ("sun", "clear", "fair")),
+    "cloudy": (r"clouds?|cloudy|overcast", ("cloud", "overcast")),
+    "snowing": (r"snow|snowing|snowy|sleet", ("snow", "flurr", "sleet")),
+    "stormy": (r"storms?|stormy|thunder|thunderstorms?", ("storm", "thunder")),
+    "foggy": (r"fog|foggy|mist|misty|haze|hazy", ("fog", "mist", "haze")),
+    "windy": (r"wind|windy|breezy", ("wind", "breez")),
+}
+CONDITION_PATTERNS: Dict[str, re.Pattern] = {
+    name: re.compile(rf"\b(?:{words})\b") for name, (words, _) in CONDITIONS.items()
+}
+
+
+def find_conditions(text: str) -> List[str]:
+    """Return the names of the conditions mentioned in a text."""
+    text = text.lower()
+    return [
+        name for name, pattern in CONDITION_PATTERNS.items() if pattern.search(text)
+    ]
+
+
+def matches_condition(name: str, weather_condition: str) -> bool:
+    """Return True if a weather condition (e.g. "Light Rain") is of the named kind."""
+    weather_condition = weather_condition.lower()
+    return any(word in weather_condition for word in CONDITIONS[name][1])
@@ -0,0 +1,215 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from .chat import AskResponse, WeatherData
+from .conditions import find_conditions, matches_condition
+
+TEMPERATURE = r"(-?\d+(?:\.\d+)?)\s*(?:°\s*c?|degrees?(?:\s+celsius)?|c\b)?"
+ABOVE_PATTERN = re.compile(
+    r"(above|over|more than|greater than|higher than|warmer than|hotter than"
+    rf"|at least|>=?)\s*{TEMPERATURE}"
+)
+BELOW_PATTERN = re.compile(
+    r"(below|under|less than|lower than|colder than|cooler than|at most|<=?)\s*"
+    rf"{TEMPERATURE}"
+)
+# Thresholds including their bound
+INCLUSIVE_BOUNDS = {"at least", ">=", "at most", "<="}
+WARMEST_PATTERN = re.compile(r"\b(?:warmest|hottest|highest temperature)\b")
+COLDEST_PATTERN = re.compile(
+    r"\b(?:coldest|coolest|chilliest|lowest temperature|freezing-est)\b"
+)
+
+# Temperatures in other units than Celsius, the weather data is in °C
+OTHER_UNIT_PATTERN = re.compile(r"°\s*[fk]\b|\d\s*[fk]\b|\b(?:fahrenheit|kelvin)\b")
+# Superlatives other than warmest/coldest ("highest wind speed", "sunniest")
+OTHER_SUPERLATIVE_PATTERN = re.compile(r"\b(?:most|least|\w{2,}est)\b")
+# Measurements the weather data doesn't have (wind speed, humidity...)
+MEASUREMENT_PATTERN = re.compile(
+    r"\b(?:speed|humidity|pressure|visibility|uv|precipitation|rainfall|snowfall"
+    r"|mm|km/?h|mph|knots|percent|chance)\b|%"
+)
+
+# A place named in a question ("in Paris", "at Lyon"), to tell unknown cities
+PLACE_PATTERN = re.compile(r"\b(?:in|at|for)\s+[A-Z]")
+
+# Questions we can't answer by filtering: negations, alternatives, comparisons...
+UNSUPPORTED_PATTERN = re.compile(
+    r"\b(?:not|no|none|except|without|or|than|between|why|how|should)\b|n't"
+)
+# Questions about another time than now, the weather data is current
+OTHER_TIME_PATTERN = re.compile(
+    r"\b(?:will|going to|gonna|was|were|did|had|been|forecast|tomorrow|yesterday"
+    r"|tonight|later|soon|next|last|ago|earlier|week|weekend)\b|'ll\b"
+)
+
+
+@dataclass
+class WeatherQuery:
+    """Structured intent parsed from a question."""
+
+    conditions: List[str] = field(default_factory=list)
+    above: Optional[float] = None
+    below: Optional[float] = None
+    inclusive_above: bool = False  # "at least", >= rather than >
+    inclusive_below: bool = False  # "at most", <= rather than <
+    superlative: Optional[str] = None  # "warmest" or "coldest"
+
+    @property
+    def filters(self) -> List[Callable[[WeatherData], bool]]:
+        filters = []
+        for name in self.conditions:
+            filters.append(
+                lambda city, name=name: matches_condition(name, city.weather_condition)
+            )
+        if self.above is not None:
+            if self.inclusive_above:
+                filters.append(lambda city: city.temperature >= self.above)
+            else:
+                filters.append(lambda city: city.temperature > self.above)
+        if self.below is not None:
+            if self.inclusive_below:
+                filters.append(lambda city: city.temperature <= self.below)
+            else:
+                filters.append(lambda city: city.temperature < self.below)
+        return filters
+
+    def describe(self) -> str:
+        criteria = list(self.conditions)
+        if self.above is not None:
+            bound = "at least" if self.inclusive_above else "above"
+            criteria.append(f"{bound} {self.above:g}°C")
+        if self.below is not None:
+            bound = "at most" if self.inclusive_below else "below"
+            criteria.append(f"{bound} {self.below:g}°C")
+        return " and ".join(criteria)
+
+
+def parse_weather_query(question: str) -> Optional[WeatherQuery]:
+    """
+    Parse a question into a structured weather query.
+
+    Recognized intents are condition filters ("which cities are raining?"),
+    temperature thresholds ("where is it above 25°C?") and superlatives
+    ("warmest city?"), possibly combined. Questions the current weather of the
+    cities can't answer are not recognized: other units than Celsius, other times
+    than now, measurements such as the wind speed and other superlatives.
+
+    Args:
+        question: Natural language question about the weather
+
+    Returns:
+        Optional[WeatherQuery]: The parsed query, None if the intent isn't recognized
+    """
+    text = question.lower()
+    query = WeatherQuery()
+
+    if OTHER_UNIT_PATTERN.search(text):
+        return None
+
+    # Temperature thresholds, removed from the text so that "than" is accepted there
+    if match := ABOVE_PATTERN.search(text):
+        query.above = float(match.group(2))
+        query.inclusive_above = match.group(1) in INCLUSIVE_BOUNDS
+        text = text.replace(match.group(0), " ")
+    if match := BELOW_PATTERN.search(text):
+        query.below = float(match.group(2))
+        query.inclusive_below = match.group(1) in INCLUSIVE_BOUNDS
+        text = text.replace(match.group(0), " ")
+
+    if (
+        UNSUPPORTED_PATTERN.search(text)
+        or OTHER_TIME_PATTERN.search(text)
+        or MEASUREMENT_PATTERN.search(text)
+    ):
+        return None
+
+    if match := WARMEST_PATTERN.search(text):
+        query.superlative = "warmest"
+        text = text.replace(match.group(0), " ")
+    elif match := COLDEST_PATTERN.search(text):
+        query.superlative = "coldest"
+        text = text.replace(match.group(0), " ")
+    if OTHER_SUPERLATIVE_PATTERN.search(text):
+        return None
+
+    query.conditions = find_conditions(text)
+
+    if not (query.conditions or query.superlative or query.filters):
+        return None
+    return query
+
+
+def format_city(city: WeatherData) -> str:
+    return f"{city.city} ({city.weather_condition}, {city.temperature:g}°C)"
+
+
+def mentioned_cities(question: str, cities: List[WeatherData]) -> List[WeatherData]:
+    """
+    Return the cities named in a question, by their name or its first part (e.g.
+    "Paris" for "Paris, France").
+    """
+    text = question.lower()
+    mentioned = []
+    for city in cities:
+        names = {city.city.lower(), city.city.split(",")[0].strip().lower()}
+        if any(re.search(rf"\b{re.escape(name)}\b", text) for name in names if name):
+            mentioned.append(city)
+    return mentioned
+
+
+def answer_weather_query(
+    question: str, cities: List[WeatherData]
+) -> Optional[AskResponse]:
+    """
+    Answer a question by evaluating its structured intent over the weather data,
+    without calling the model.
+
+    A question naming some of the cities is answered for them only. A question
+    naming a place that isn't one of the cities is left to the model.
+
+    Args:
+        question: Natural language question about the weather
+        cities: List of WeatherData objects containing weather information for each city
+
+    Returns:
+        Optional[AskResponse]: The answer, None if the question isn't understood
+    """
+    query = parse_weather_query(question)
+    if query is None:
+        return None
+
+    named = mentioned_cities(question, cities)
+    if named:
+        cities = named
+    elif PLACE_PATTERN.search(question):
+        return None
+
+    matching = [city for city in cities if all(check(city) for check in query.filters)]
+
+    if query.superlative and matching:
+        pick = max if query.superlative == "warmest" else min
+        temperature = pick(city.temperature for city in matching)
+        matching = [city for city in matching if city.temperature == temperature]
+
+    description = query.describe()
+    if not matching and named:
+        listed = ", ".join(format_city(city) for city in named)
+        return AskResponse(
+            answer=f"It's not {description} right now in: {listed}.",
+            matching_cities=[],
+        )
+    if not matching:
+        return AskResponse(
+            answer=f"None of your favorite cities are {description} right now.",
+            matching_cities=[],
+        )
+
+    listed = ", ".join(format_city(city) for city in matching)
+    if query.superlative:
+        qualifier = f" {description}" if description else ""
+        answer = f"The {query.superlative}{qualifier} right now: {listed}."
+    else:
+        answer = f"It's {description} in: {listed}."
+    return AskResponse(answer=answer, matching_cities=[city.city for city in matching])
@@ -1,12 +1,36 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import jwt
 from passlib.context import CryptContext
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes whose cost differs from BCRYPT_ROUNDS need an update (see `verify_and_update`)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+# bcrypt releases the GIL: a few threads hash in parallel without starving the loop
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+# Authenticated requests skip the JWT decoding and the user query on the common path:
+# valid tokens map to their user ID (until they expire), user IDs to their User.
+# `update_user_weather_id_token` invalidates the user it updates.
+token_cache = TTLCache(
+    ttl=settings.AUTH_CACHE_TTL, max_size=settings.AUTH_CACHE_MAX_SIZE
+)
+user_cache = TTLCache(
+    ttl=settings.AUTH_CACHE_TTL, max_size=settings.AUTH_CACHE_MAX_SIZE
+)
 
 
 ALGORITHM = "HS256"
@@ -25,3 +49,33 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verify a password and, if its hash uses outdated settings (e.g. another bcrypt
+    cost), hash it again.
+
+    Returns:
+        tuple[bool, str | None]: Whether the password is valid, and its new hash if
+            the stored one should be replaced
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def averify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Async version of `verify_and_update_password`, run in the password executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def aget_password_hash(password: str) -> str:
+    """Async version of `get_password_hash`, run in the password executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+@dataclass
+class CacheEntry:
+    """A cached value and its freshness information (wall-clock timestamps)."""
+
+    value: Any
+    stored_at: float
+    expires_at: float
+    accessed_at: float
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+
+class TTLCache:
+    """In-memory LRU cache with a per-entry TTL and single-flight loading.
+
+    Concurrent misses for the same key share one call to the fetch function instead
+    of each triggering their own upstream request. Expired entries can still be
+    served for `stale_ttl` seconds while they are refreshed in the background
+    (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl: float, max_size: int, stale_ttl: float = 0):
+        """
+        Args:
+            ttl: Time to live of an entry, in seconds (0 disables storing values)
+            max_size: Maximum number of entries kept, least recently used are evicted first
+            stale_ttl: How long an expired entry may still be served, in seconds
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get_entry(key) is not None
+
+    def get_entry(
+        self, key: Hashable, allow_stale: bool = False
+    ) -> Optional[CacheEntry]:
+        """Return the entry for a key, without touching LRU order nor counters.
+
+        Args:
+            key: Cache key
+            allow_stale: Also return expired entries that can still be served stale
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        now = time.time()
+        if entry.is_fresh(now):
+            return entry
+        if allow_stale and now < entry.expires_at + self.stale_ttl:
+            return entry
+        return None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for a key, or None if missing or expired."""
+        entry = self.get_entry(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.record_hit(key, entry)
+        return entry.value
+
+    def record_hit(self, key: Hashable, entry: CacheEntry) -> None:
+        """Count a hit on an entry read with `get_entry`, and mark it as accessed."""
+        self.hits += 1
+        self._touch(key, entry)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries if the cache is full.
+
+        Replacing an existing entry keeps its last access time.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        previous = self._entries.get(key)
+        self._entries[key] = CacheEntry(
+            value=value,
+            stored_at=now,
+            expires_at=now + ttl,
+            accessed_at=previous.accessed_at if previous else now,
+        )
+        if previous is None:
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove a key from the cache."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry and reset counters."""
+        self._entries.clear()
+        self.hits = self.stale_hits = self.misses = self.coalesced = 0
+        self.refreshes = self.evictions = 0
+
+    def items(self) -> List[Tuple[Hashable, CacheEntry]]:
+        """Return a snapshot of every entry, including expired ones."""
+        return list(self._entries.items())
+
+    def is_refreshing(self, key: Hashable) -> bool:
+        """Return True if a fetch is in flight for a key."""
+        return key in self._inflight
+
+    def evict_idle(self, max_idle: float) -> int:
+        """Remove the entries that were not accessed for `max_idle` seconds.
+
+        Also drops expired entries that can't be served stale anymore.
+
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.time()
+        removed = 0
+        for key, entry in list(self._entries.items()):
+            idle = now - entry.accessed_at >= max_idle
+            dead = now >= entry.expires_at + self.stale_ttl
+            if idle or dead:
+                del self._entries[key]
+                removed += 1
+        self.evictions += removed
+        return removed
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached value for a key, calling `fetch` on a miss.
+
+        Concurrent misses for the same key await the same fetch. Errors are not cached
+        and are raised to every waiter. An expired entry still within its stale
+        window is returned immediately while it is refreshed in the background.
+
+        Args:
+            key: Cache key
+            fetch: Coroutine function loading the value
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        entry = self.get_entry(key, allow_stale=True)
+        if entry is not None:
+            self._touch(key, entry)
+            if entry.is_fresh(time.time()):
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self.refresh(key, fetch)
+            return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_fetch(key, fetch)
+
+        # Shield the fetch so that a cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(task)
+
+    def refresh(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        """Reload a key in the background, unless a fetch is already in flight.
+
+        Returns:
+            asyncio.Task: The fetch task
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.refreshes += 1
+            task = self._start_fetch(key, fetch)
+        return task
+
+    def stats(self) -> Dict[str, int | float]:
+        """Return cache usage counters."""
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+            "hit_ratio": (
+                round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            ),
+        }
+
+    def _touch(self, key: Hashable, entry: CacheEntry) -> None:
+        entry.accessed_at = time.time()
+        self._entries.move_to_end(key)
+
+    def _start_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = task
+
+        def on_done(task: asyncio.Task) -> None:
+            self._inflight.pop(key, None)
+            # Retrieving the exception also avoids "exception never retrieved" warnings
+            # for background refreshes nobody awaits
+            if not task.cancelled() and task.exception() is None:
+                self.set(key, task.result())
+
+        task.add_done_callback(on_done)
+        return task
@@ -0,0 +1,148 @@
+import gzip
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip only without it
+    brotli = None
+
+# Encodings this server can produce, by order of preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header value.
+
+    Args:
+        header: Header value (e.g. "gzip;q=0.8, br")
+
+    Returns:
+        Dict[str, float]: Quality of each listed encoding, in lower case
+    """
+    qualities = {}
+    for item in header.split(","):
+        encoding, *params = [part.strip() for part in item.split(";")]
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding.lower()] = quality
+    return qualities
+
+
+def choose_encoding(header: str, available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """
+    Pick the encoding of a response from the Accept-Encoding header of its request.
+
+    Args:
+        header: Accept-Encoding header value
+        available: Encodings that can be produced, preferred first
+
+    Returns:
+        Optional[str]: The accepted encoding with the highest quality (ties go to the
+            preferred one), or None to send the response as is
+    """
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def vary_on_accept_encoding(headers: List) -> List:
+    """Add Accept-Encoding to the Vary header of raw ASGI headers."""
+    for index, (name, value) in enumerate(headers):
+        if name == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[index] = (name, value + b", Accept-Encoding")
+            return headers
+    return [*headers, (b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing large responses with brotli or gzip.
+
+    Only responses sent in one piece are compressed: streamed responses (NDJSON,
+    server-sent events) are passed through so that each chunk reaches the client
+    as soon as it is produced. Brotli is used when the `brotli` package is
+    installed and the client accepts it.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        """
+        Args:
+            app: ASGI application
+            minimum_size: Min size of a body to compress, in bytes
+            gzip_level: gzip compression level (1-9)
+            brotli_quality: brotli quality (0-11, higher is much slower)
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict] = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held until the first body message shows whether it is streamed
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers: List = list(start.get("headers", []))
+            body = message.get("body", b"")
+            if (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and not any(name == b"content-encoding" for name, _ in headers)
+            ):
+                body = self.compress(body, encoding)
+                headers = [(n, v) for n, v in headers if n != b"content-length"]
+                headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ]
+                message = {**message, "body": body}
+            await send({**start, "headers": vary_on_accept_encoding(headers)})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,11 +1,141 @@
+from typing import List, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     PATH_API_V1: str = "/api/v1"
-    DATABASE_URL: str = "sqlite:///db.sqlite3"
     ACCESS_TOKEN_EXPIRE_MIN: int = 60 * 24
 
+    # An asyncio driver (e.g. "sqlite+aiosqlite:///db.sqlite3") selects async sessions
+    DATABASE_URL: str = "sqlite:///db.sqlite3"
+
+    # Database connection pool (not used by in-memory SQLite databases)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # in seconds
+    DB_POOL_RECYCLE: int = -1  # Max age of a connection in seconds, -1 for no limit
+
+    # SQLite pragmas, set on every new connection (several workers share the file)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # Readers don't block the writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # Safe with WAL, fewer fsyncs than FULL
+    SQLITE_BUSY_TIMEOUT: int = 5_000  # Wait for locks instead of failing (in ms)
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # in bytes
+    SQLITE_CACHE_SIZE: int = -64_000  # Negative: in KiB, positive: in pages
+
+    # In-process cache of authenticated users (token -> user ID -> User)
+    AUTH_CACHE_TTL: int = 60  # in seconds, bounds staleness across workers
+    AUTH_CACHE_MAX_SIZE: int = 10_000
+
+    # Password hashing, run in a dedicated thread pool to keep the event loop free
+    BCRYPT_ROUNDS: int = 12  # Stored hashes with another cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Upstream services, overridable to use stand-ins (e.g. in benchmarks)
+    WEATHER_URL: str = "https://weather.com"
+    WEATHER_API_URL: str = "https://upsx.weather.com"  # Login and preferences
+    OPENAI_BASE_URL: Optional[str] = None  # None for the OpenAI API
+
+    # Shared HTTP connection pool used for weather.com
+    HTTP_POOL_LIMIT: int = 100  # Max simultaneous connections (0 for no limit)
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_DNS_CACHE_TTL: int = 300  # in seconds
+    HTTP_KEEPALIVE_TIMEOUT: float = 30  # in seconds
+    HTTP_REQUEST_TIMEOUT: float = 10  # Max duration of a request, in seconds
+
+    # Request deadlines (in seconds): upstream calls, retries and waits of a request
+    # stop at its deadline. Clients may set their own with the X-Request-Timeout header
+    REQUEST_TIMEOUT: float = 15
+    CHAT_REQUEST_TIMEOUT: float = 45  # Chat routes also wait for the LLM
+    REQUEST_TIMEOUT_MAX: float = 60  # Max deadline a client can ask for
+
+    # Retries of failed idempotent upstream calls, with jittered exponential backoff,
+    # made only while the request deadline leaves time for them
+    UPSTREAM_RETRIES: int = 2
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.1  # in seconds, doubled at each retry
+    UPSTREAM_RETRY_MAX_DELAY: float = 2  # in seconds
+
+    # Circuit breakers of the weather.com endpoints (one per endpoint): open when
+    # BREAKER_FAILURE_RATE of the last BREAKER_WINDOW calls failed or were slow
+    BREAKER_FAILURE_RATE: float = 0.5
+    BREAKER_MIN_CALLS: int = 20  # Calls recorded before the breaker may open
+    BREAKER_WINDOW: int = 50
+    BREAKER_SLOW_CALL: float = 5  # Slower calls count as failed (in seconds)
+    BREAKER_OPEN_DURATION: float = 30  # Calls rejected before probing (in seconds)
+    BREAKER_HALF_OPEN_CALLS: int = 3  # Successful probes closing the breaker
+
+    # Hedged weather page scrapes: a second request is sent when the first one is
+    # slower than the WEATHER_HEDGE_PERCENTILE of the recent scrapes
+    WEATHER_HEDGING_ENABLED: bool = False
+    WEATHER_HEDGE_PERCENTILE: float = 95
+    WEATHER_HEDGE_MIN_DELAY: float = 0.1  # in seconds
+    WEATHER_HEDGE_SAMPLES: int = 200  # Recent scrape durations kept
+
+    # Weather data cache (keyed by weather.com placeID)
+    WEATHER_CACHE_TTL: int = 5 * 60  # in seconds
+    WEATHER_CACHE_MAX_SIZE: int = 10_000
+    WEATHER_CACHE_STALE_TTL: int = 10 * 60  # Serve expired data while refreshing
+
+    # Favorite cities of a user, as stored in their weather.com preferences (changes
+    # made through this API invalidate it in the worker handling them only)
+    FAVORITES_CACHE_TTL: int = 60  # in seconds
+    FAVORITES_CACHE_MAX_SIZE: int = 10_000
+
+    # Background refresh of the weather of places requested by users (in seconds)
+    WEATHER_REFRESH_ENABLED: bool = True
+    WEATHER_REFRESH_INTERVAL: float = 30
+    WEATHER_REFRESH_AHEAD: float = 60  # Refresh entries expiring sooner than this
+    WEATHER_REFRESH_MAX_IDLE: int = 60 * 60  # Stop refreshing places not requested
+
+    # Weather page scraping limits
+    SCRAPE_MAX_CONCURRENCY: int = 32
+    SCRAPE_MAX_CONCURRENCY_PER_HOST: int = 8
+    SCRAPE_RATE_LIMIT: float = 20  # Requests per second per host (0 for no limit)
+    SCRAPE_RATE_BURST: int = 20
+
+    # Persistent cache of city name -> weather.com location (in seconds)
+    GEOCODE_CACHE_TTL: int = 30 * 24 * 60 * 60
+    GEOCODE_NEGATIVE_CACHE_TTL: int = 60 * 60  # For names that did not resolve
+    GEOCODE_BATCH_SIZE: int = 25  # Max city names per location search request
+
+    # Max place IDs per bulk weather request
+    BULK_WEATHER_MAX_PLACES: int = 1000
+
+    # Weather observation history (in seconds)
+    OBSERVATION_RAW_RETENTION: int = 7 * 24 * 60 * 60  # Every observation is kept
+    OBSERVATION_DOWNSAMPLE_INTERVAL: int = 60 * 60  # Then one per place per hour
+    OBSERVATION_MAX_AGE: int = 365 * 24 * 60 * 60  # Then they are deleted
+    OBSERVATION_COMPACT_INTERVAL: int = 60 * 60  # Time between two compactions
+    OBSERVATION_PAGE_SIZE: int = 1_000  # Rows read per query when streaming
+
+    # OpenAI requests
+    OPENAI_TIMEOUT: float = 20  # in seconds
+    OPENAI_MAX_RETRIES: int = 2
+    # Max estimated tokens of the weather data in a prompt, larger favorite lists
+    # are compacted
+    LLM_CONTEXT_TOKEN_BUDGET: int = 2_000
+
+    # Cache of LLM responses (summaries and answers)
+    # None for WEATHER_CACHE_TTL: answers are as fresh as the weather
+    LLM_CACHE_TTL: Optional[int] = None
+    LLM_CACHE_MAX_SIZE: int = 1_000
+
+    # Metrics (served in the Prometheus format at /metrics)
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5  # Time between two lag measurements
+
+    # Request tracing (Server-Timing header, slow request traces)
+    TRACE_SLOW_REQUEST_THRESHOLD: float = 2.0  # Keep traces of slower requests (s)
+    TRACE_BUFFER_SIZE: int = 100  # Slow request traces kept, oldest dropped first
+    TRACE_MAX_SPANS: int = 1_000  # Spans recorded per request
+
+    # Response compression (gzip, or brotli when the brotli package is installed)
+    COMPRESSION_MIN_SIZE: int = 1_000  # Smaller bodies are sent as is (in bytes)
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # Up to 11, much slower above ~5
+
+    # Users allowed to use the admin endpoints (e.g. '["admin@example.com"]')
+    ADMIN_EMAILS: List[str] = []
+
     # Secrets (loaded from env var)
     OPENAI_API_KEY: str
     JWT_SECRET_KEY: str
@@ -1,9 +1,144 @@
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import app.models  # noqa: F401  # Import models to register them with SQLModel metadata
 from app.core.config import settings
+from app.core.metrics import db_query_duration
+from app.core.tracing import record_span
+
+# Statements timed separately, others are timed as "other"
+TIMED_STATEMENTS = {"select", "insert", "update", "delete"}
+
+
+def is_async_database_url(url: str) -> bool:
+    """Return True if a database URL uses an asyncio driver (e.g. sqlite+aiosqlite)."""
+    return make_url(url).get_dialect().is_async
+
+
+def sync_database_url(url: str) -> str:
+    """Return a database URL using the default (blocking) driver of its backend."""
+    url = make_url(url)
+    return url.set(drivername=url.get_backend_name()).render_as_string(
+        hide_password=False
+    )
+
+
+def sqlite_pragmas() -> dict[str, Any]:
+    """Return the pragmas set on every SQLite connection."""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def observe_query_duration(conn, cursor, statement, parameters, context, executemany):
+    start, end = conn.info["query_start"].pop(), time.perf_counter()
+    keyword = statement.lstrip()[:6].lower()
+    keyword = keyword if keyword in TIMED_STATEMENTS else "other"
+    db_query_duration.labels(keyword).observe(end - start)
+    record_span(f"db_{keyword}", start, end)
+
+
+def discard_query_timer(exception_context) -> None:
+    # A failed statement is not timed
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def time_queries(engine: Engine) -> None:
+    """Observe the duration of the statements executed by an engine."""
+    event.listen(engine, "before_cursor_execute", start_query_timer)
+    event.listen(engine, "after_cursor_execute", observe_query_duration)
+    event.listen(engine, "handle_error", discard_query_timer)
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """Return the connection pool options of an engine."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # A single connection is kept, no pool to size
+        return {}
+    return dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+
+
+def create_db_engine(url: str) -> Engine:
+    """Create a blocking engine, with the SQLite pragmas set on its connections."""
+    engine = create_engine(url, **engine_options(url))
+    time_queries(engine)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """Create an async engine, with the SQLite pragmas set on its connections."""
+    engine = create_async_engine(url, **engine_options(url))
+    time_queries(engine.sync_engine)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def get_sqlite_pragmas(engine: Engine) -> dict[str, Any]:
+    """Return the effective pragmas of a connection of a SQLite engine."""
+    with engine.connect() as connection:
+        return {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in sqlite_pragmas()
+        }
+
+
+# The blocking engine is always available (table creation, scripts...), requests use
+# the async engine when DATABASE_URL selects an asyncio driver
+engine = create_db_engine(sync_database_url(settings.DATABASE_URL))
+async_engine: AsyncEngine | None = (
+    create_async_db_engine(settings.DATABASE_URL)
+    if is_async_database_url(settings.DATABASE_URL)
+    else None
+)
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[Session | AsyncSession]:
+    """Open a database session for async code (use it through `async_repository`).
 
-engine = create_engine(settings.DATABASE_URL)
+    The session is async when DATABASE_URL selects an asyncio driver.
+    """
+    if async_engine is not None:
+        # Objects stay usable after a commit, reloading them would need an await
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(engine) as session:
+            yield session
 
 
 def init_db(session: Session) -> None:
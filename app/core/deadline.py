@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the time budget of the request is spent."""
+
+    pass
+
+
+# Deadline of the request being served (time.monotonic()), None for no deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def start(timeout: float) -> None:
+    """Set the deadline of the current request, `timeout` seconds from now."""
+    _deadline.set(time.monotonic() + timeout)
+
+
+def remaining() -> Optional[float]:
+    """Return the time left before the deadline in seconds (may be negative), or None."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check() -> None:
+    """
+    Raises:
+        DeadlineExceeded: If the deadline has passed
+    """
+    if expired():
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """
+    Return the timeout of a call: `default`, shortened to the time left if needed.
+
+    Args:
+        default: Timeout of the call without deadline, in seconds (None for no limit)
+    """
+    left = remaining()
+    if left is None:
+        return default
+    left = max(left, 0.001)  # 0 means no timeout for some clients
+    return left if default is None else min(default, left)
+
+
+@contextmanager
+def deadline_errors() -> Iterator[None]:
+    """Turn a timeout of the block into DeadlineExceeded if the deadline caused it."""
+    try:
+        yield
+    except asyncio.TimeoutError as e:
+        if expired():
+            raise DeadlineExceeded("Deadline exceeded") from e
+        raise
+
+
+async def without_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    Await a coroutine outside the deadline of the current request.
+
+    Meant for work shared with other requests (e.g. a cache fill), that should not
+    fail because the request starting it has a short deadline.
+    """
+    token = _deadline.set(None)
+    try:
+        return await awaitable
+    finally:
+        _deadline.reset(token)
+
+
+async def retry(
+    call: Callable[[], Awaitable[T]],
+    retries: int,
+    base_delay: float,
+    max_delay: float,
+    is_retryable: Callable[[Exception], bool],
+) -> T:
+    """
+    Call `call`, retrying failures with jittered exponential backoff.
+
+    The n-th retry waits a random time between 0 and min(max_delay, base_delay * 2^n)
+    ("full jitter", so that clients failing together don't retry together). A retry
+    is only made if it can start before the deadline.
+
+    Args:
+        call: Coroutine function making the call
+        retries: Max retries after the first attempt
+        base_delay: Max wait before the first retry, in seconds
+        max_delay: Max wait before a retry, in seconds
+        is_retryable: Whether an error is worth retrying
+
+    Returns:
+        The result of the first successful attempt
+
+    Raises:
+        The error of the last attempt
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            left = remaining()
+            if left is not None and delay >= left:
+                raise
+            await asyncio.sleep(delay)
@@ -0,0 +1,398 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from starlette.routing import replace_params
+
+from app.core.config import settings
+from app.core.tracing import span
+
+# Latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+Labels = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+@dataclass
+class Snapshot:
+    """Values of a counter or gauge read at scrape time (see `add_collector`)."""
+
+    name: str
+    type: str  # "counter" or "gauge"
+    help: str
+    labelnames: Labels = ()
+    samples: Dict[Labels, float] = field(default_factory=dict)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self.samples.items():
+            sample = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}{sample} {format_value(value)}")
+        return lines
+
+
+class Value:
+    """Value of a counter or gauge for one set of label values."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramValue:
+    """Observations of a histogram for one set of label values."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Not cumulative, last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metric:
+    """A metric family: one value per set of label values.
+
+    Values are updated in place under a per-value lock, so that recording a
+    measurement costs a dict lookup and a few arithmetic operations.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        """
+        Args:
+            name: Metric name, in Prometheus conventions (e.g. "..._seconds")
+            help: Description of the metric
+            labelnames: Names of the labels distinguishing its values
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Value | HistogramValue] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the value for a set of label values (in `labelnames` order)."""
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            with self._lock:
+                value = self._values.setdefault(values, self._new_value())
+        return value
+
+    def _new_value(self) -> Value | HistogramValue:
+        return Value()
+
+    def render(self) -> List[str]:
+        samples = {labels: value.value for labels, value in self._values.items()}
+        return Snapshot(
+            self.name, self.type, self.help, self.labelnames, samples
+        ).render()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bounds = [*self.buckets, float("inf")]
+        for labels, value in list(self._values.items()):
+            with value._lock:
+                counts, total = list(value.counts), value.sum
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                sample = format_labels(
+                    (*self.labelnames, "le"), (*labels, format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{sample} {cumulative}")
+            sample = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{sample} {format_value(total)}")
+            lines.append(f"{self.name}_count{sample} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of the process, rendered in the Prometheus text format.
+
+    Metrics are kept per process: with several workers, each one reports its own.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Snapshot]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Labels = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], Iterable[Snapshot]]) -> None:
+        """Add a function returning metrics read at scrape time (e.g. from `stats()`)."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        for collect in self._collectors:
+            for snapshot in collect():
+                lines += snapshot.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being served"
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request, until its last byte is sent",
+    ("method", "route", "status"),
+)
+upstream_requests_in_flight = registry.gauge(
+    "upstream_requests_in_flight",
+    "Calls to weather.com and OpenAI in progress",
+    ("operation",),
+)
+upstream_request_duration = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Duration of calls to weather.com and OpenAI",
+    ("operation", "outcome"),
+)
+upstream_hedges = registry.counter(
+    "upstream_hedged_requests_total",
+    "Calls sent twice because the first one was slow, by winning call",
+    ("operation", "winner"),
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens consumed by LLM calls", ("type",)
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds",
+    "Duration of database statements",
+    ("statement",),
+    buckets=DB_BUCKETS,
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop in running a scheduled callback",
+    buckets=LAG_BUCKETS,
+)
+
+
+@contextmanager
+def track_upstream(operation: str) -> Iterator[None]:
+    """Count a call to an upstream service as in flight, and observe its duration.
+
+    The call is also a span of the current request trace.
+
+    Args:
+        operation: Name of the call (e.g. "weather_page"), its outcome is "ok" or
+            "error" depending on whether the block raises
+    """
+    in_flight = upstream_requests_in_flight.labels(operation)
+    in_flight.inc()
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        with span(operation):
+            yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        duration = time.perf_counter() - start
+        upstream_request_duration.labels(operation, outcome).observe(duration)
+
+
+def route_template(scope) -> str:
+    """Return the path of the route matched by a request (e.g. "/cities/{place_id}")."""
+    # Set by the router on the scope of matched requests
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if not path_format:
+        return "unmatched"
+    # Since FastAPI 0.130 the route of an included router has a path relative to the
+    # router prefix: the prefix is what precedes the path matched by the route
+    path, _ = replace_params(
+        path_format, route.param_convertors, dict(scope.get("path_params", {}))
+    )
+    prefix = scope["path"][: -len(path)] if scope["path"].endswith(path) else ""
+    return prefix + route.path
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting in-flight requests and observing their duration.
+
+    Requests are labelled with their route template (e.g. "/cities/{place_id}"), not
+    their path, to keep the number of label values bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.labels(
+                scope["method"], route_template(scope), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+class EventLoopMonitor:
+    """Measure how late the event loop runs a callback scheduled every `interval`.
+
+    A lag means that something blocks the loop (CPU-bound work, blocking I/O...).
+    """
+
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval: Time between two measurements, in seconds
+        """
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start measuring on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, loop.time() - start - self.interval))
+
+
+# Started by the app lifespan
+event_loop_monitor = EventLoopMonitor(interval=settings.EVENT_LOOP_LAG_INTERVAL)
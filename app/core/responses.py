@@ -0,0 +1,34 @@
+import hashlib
+from typing import Any, Optional
+
+import orjson
+
+
+def make_etag(data: Any) -> str:
+    """
+    Return a weak ETag identifying JSON-serializable data.
+
+    The tag is weak because the same data is sent with different bytes depending on
+    the content encoding (see `CompressionMiddleware`).
+    """
+    digest = hashlib.blake2b(orjson.dumps(data), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag (weak comparison).
+
+    Args:
+        if_none_match: Header value, a list of tags or "*"
+        etag: Current ETag of the resource
+
+    Returns:
+        bool: True if the client has the current version (answer with a 304)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
@@ -0,0 +1,192 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+@dataclass
+class Span:
+    """A timed operation of a request (perf_counter timestamps, in seconds)."""
+
+    name: str
+    start: float
+    end: Optional[float] = None
+    children: List["Span"] = field(default_factory=list)
+
+    def walk(self) -> Iterator["Span"]:
+        """Yield the descendants of the span, depth first."""
+        for child in self.children:
+            yield child
+            yield from child.walk()
+
+    def to_dict(self, origin: float) -> Dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Trace:
+    """The span tree of a request."""
+
+    def __init__(self, name: str, max_spans: int):
+        """
+        Args:
+            name: Name of the root span (e.g. "GET /api/v1/cities/favorites")
+            max_spans: Max spans recorded, the next ones are only counted
+        """
+        self.root = Span(name, time.perf_counter())
+        self.started_at = time.time()
+        self.max_spans = max_spans
+        self.spans = 0
+        self.dropped = 0
+
+    def add_span(self, parent: Span, span: Span) -> bool:
+        """Add a span under a parent, return False if the trace is full."""
+        if self.spans >= self.max_spans:
+            self.dropped += 1
+            return False
+        self.spans += 1
+        parent.children.append(span)
+        return True
+
+    @property
+    def duration(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return end - self.root.start
+
+    def server_timing(self) -> str:
+        """
+        Format the trace as a Server-Timing header value.
+
+        Spans are grouped by name, each group reporting the wall-clock time from
+        its first start to its last end (so that concurrent calls don't add up) and
+        the number of spans, then the total time of the request.
+        """
+        groups: Dict[str, List[float]] = {}  # name -> [start, end, count]
+        now = time.perf_counter()
+        for span in self.root.walk():
+            end = span.end if span.end is not None else now
+            group = groups.setdefault(span.name, [span.start, end, 0])
+            group[0] = min(group[0], span.start)
+            group[1] = max(group[1], end)
+            group[2] += 1
+
+        metrics = [
+            f'{name};dur={(end - start) * 1000:.1f};desc="{count}x"'
+            for name, (start, end, count) in groups.items()
+        ]
+        metrics.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def to_dict(self, status: int) -> Dict:
+        return {
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "status": status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": self.spans,
+            "dropped_spans": self.dropped,
+            "root": self.root.to_dict(self.root.start),
+        }
+
+
+# Trace of the request being served and its innermost open span
+_current: ContextVar[Optional[Tuple[Trace, Span]]] = ContextVar(
+    "current_span", default=None
+)
+
+# Traces of the last slow requests, oldest are dropped first
+slow_traces: Deque[Dict] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time the block as a span of the current request, nested in the open span.
+
+    Outside a request (e.g. background refreshes), this does nothing.
+
+    Args:
+        name: Name of the span, a token usable in Server-Timing (e.g. "weather_page")
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+
+    trace, parent = current
+    child = Span(name, time.perf_counter())
+    if not trace.add_span(parent, child):
+        yield
+        return
+
+    token = _current.set((trace, child))
+    try:
+        yield
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Add an already finished span (perf_counter timestamps) to the current request."""
+    current = _current.get()
+    if current is not None:
+        trace, parent = current
+        trace.add_span(parent, Span(name, start, end))
+
+
+class TracingMiddleware:
+    """ASGI middleware tracing each request.
+
+    Responses get a Server-Timing header summarizing the spans finished before the
+    response starts. The trace of a request slower than `slow_threshold` is kept in
+    `slow_traces`.
+    """
+
+    def __init__(self, app, slow_threshold: float, max_spans: int):
+        """
+        Args:
+            app: ASGI application
+            slow_threshold: Min duration of a request whose trace is kept, in seconds
+            max_spans: Max spans recorded per request
+        """
+        self.app = app
+        self.slow_threshold = slow_threshold
+        self.max_spans = max_spans
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}", self.max_spans)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    *message.get("headers", []),
+                    (b"server-timing", trace.server_timing().encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set((trace, trace.root))
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            trace.root.end = time.perf_counter()
+            if trace.duration >= self.slow_threshold:
+                slow_traces.append(trace.to_dict(status))
@@ -1,10 +1,47 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api.main import api_router
+from app.api.routes import metrics
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.core.db import engine, get_sqlite_pragmas
+from app.core.metrics import MetricsMiddleware, event_loop_monitor
+from app.core.tracing import TracingMiddleware
+from app.weather.city import weather_refresher
+from app.weather.history import observation_recorder
+from app.weather.http import http_client
+
+# Startup reports go through the logger of uvicorn, the only one configured
+logger = logging.getLogger("uvicorn.error")
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if engine.dialect.name == "sqlite":
+        logger.info("SQLite pragmas: %s", get_sqlite_pragmas(engine))
+    # Share one pooled HTTP client for all weather.com traffic
+    await http_client.start()
+    # Measure how long the event loop is blocked, for /metrics
+    event_loop_monitor.start()
+    # Keep the weather of the places requested by users warm
+    if settings.WEATHER_REFRESH_ENABLED:
+        weather_refresher.start()
+    # Apply the retention policy of the observation history, off the request path
+    observation_recorder.start()
+    yield
+    await observation_recorder.stop()
+    await weather_refresher.stop()
+    await event_loop_monitor.stop()
+    await http_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,6 +50,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    TracingMiddleware,
+    slow_threshold=settings.TRACE_SLOW_REQUEST_THRESHOLD,
+    max_spans=settings.TRACE_MAX_SPANS,
+)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": "The request deadline was exceeded"},
+    )
 
 
 app.include_router(api_router, prefix=settings.PATH_API_V1)
+# Where Prometheus expects it
+app.include_router(metrics.router)
@@ -1,6 +1,8 @@
 import uuid
+from datetime import datetime
 
 from pydantic import BaseModel, EmailStr
+from sqlalchemy import SmallInteger
 from sqlmodel import Field, SQLModel
 
 
@@ -18,11 +20,64 @@ class User(SQLModel, table=True):
 
 class City(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    place_id: str = Field(unique=True, index=True, max_length=255)  # weather.com ID
     name: str = Field(index=True, max_length=255)
     temperature: int
     weather_condition: str = Field(max_length=100)
 
 
+# City synced to the database, as returned by the API
+class CityPublic(SQLModel):
+    id: uuid.UUID
+    place_id: str
+    name: str
+    temperature: int
+    weather_condition: str
+
+
+# Favorite city of a user (from weather.com) with its weather. Status is "ok" or
+# "error", the weather fields are None when it could not be fetched. Location keys
+# of weather.com not listed here are not returned by the API
+class FavoriteCityWeather(BaseModel):
+    placeID: str
+    name: str | None = None
+    coordinate: str | None = None
+    position: int | None = None
+    status: str
+    temperature_celsius: int | None = None
+    weather_condition: str | None = None
+    observed_at: int | None = None  # Unix time
+    error: str | None = None
+
+
+# Cached result of a weather.com location search (geocoding)
+class CityLookup(SQLModel, table=True):
+    query: str = Field(primary_key=True, max_length=255)  # Normalized city name
+    # Location found for the query, all None when the query did not resolve
+    name: str | None = Field(default=None, max_length=255)
+    coordinate: str | None = Field(default=None, max_length=64)
+    place_id: str | None = Field(default=None, max_length=255)
+    expires_at: datetime
+
+
+# Weather conditions seen (e.g. "light rain"), observations store their code
+class WeatherCondition(SQLModel, table=True):
+    code: int | None = Field(default=None, primary_key=True)
+    name: str = Field(unique=True, max_length=100)
+
+
+# Append-only weather history, clustered on (place, time) for range queries
+class WeatherObservation(SQLModel, table=True):
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    place_id: str = Field(primary_key=True, max_length=255)  # weather.com ID
+    observed_at: int = Field(primary_key=True)  # Unix time, in seconds
+    temperature: int = Field(sa_type=SmallInteger)  # in Celsius
+    condition_code: int = Field(
+        sa_type=SmallInteger, foreign_key="weathercondition.code"
+    )
+
+
 # JSON payload containing access token
 class Token(BaseModel):
     access_token: str
@@ -1,7 +1,18 @@
-from sqlmodel import Session, select
+import uuid
+from datetime import datetime, timedelta, timezone
 
-from app.core.auth import verify_password
-from app.models import City, User
+from sqlalchemy import Executable, or_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, func, select
+
+from app.core.auth import user_cache, verify_and_update_password
+from app.models import (
+    City,
+    CityLookup,
+    User,
+    WeatherCondition,
+    WeatherObservation,
+)
 
 
 class RepositoryError(Exception):
@@ -58,6 +69,19 @@ def update_user_weather_id_token(
     session.add(user)
     session.commit()
     session.refresh(user)
+    # The next authenticated request reloads the user
+    user_cache.invalidate(user_id)
+    return user
+
+
+def update_user_hashed_password(
+    *, session: Session, user: User, hashed_password: str
+) -> User:
+    user.hashed_password = hashed_password
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    user_cache.invalidate(user.id)
     return user
 
 
@@ -65,57 +89,352 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     user = get_user_by_email(session=session, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # Rehash passwords stored with outdated settings (e.g. another bcrypt cost)
+        user = update_user_hashed_password(
+            session=session, user=user, hashed_password=new_hash
+        )
     return user
 
 
-def create_or_update_cities(*, session: Session, cities_data: list[dict]) -> list[City]:
+# INSERT statements supporting ON CONFLICT DO UPDATE, by database dialect
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def create_or_update_cities(
+    *, session: Session, cities_data: list[dict], chunk_size: int = 100
+) -> list[City]:
     """
     Creates new cities or updates existing ones in the database from a list of city data.
 
+    Cities are matched on their weather.com place ID and written with one
+    INSERT ... ON CONFLICT DO UPDATE statement per chunk of cities. Rows whose values
+    didn't change are not rewritten.
+
     Args:
         session: The database session.
         cities_data: A list of dictionaries, where each dictionary represents
                      city data. Each dictionary should contain:
+                     - 'place_id': str
                      - 'name': str
                      - 'temperature': int
                      - 'weather_condition': str
-                     - 'city_id': Optional[uuid.UUID] (for updates)
+        chunk_size: Max number of cities per statement (bounds the number of
+                    parameters of a statement).
 
     Returns:
-        A list of the created or updated City objects.
+        A list of the created or updated City objects, in the order of cities_data
+        (one per place ID).
     """
-    processed_cities = []
+    rows = build_city_rows(cities_data)
+    dialect = session.get_bind().dialect.name
+
+    # Core statements: the returned cities are plain objects, not session instances
+    # that would each be reloaded on access once the commit expires them
+    connection = session.connection()
+    cities: dict[str, City] = {}
+    values = list(rows.values())
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start : start + chunk_size]
+        for row in connection.execute(upsert_cities_statement(dialect, chunk)):
+            cities[row.place_id] = City(**row._mapping)
+
+        statement = unchanged_cities_statement(chunk, cities)
+        if statement is not None:
+            for row in connection.execute(statement):
+                cities[row.place_id] = City(**row._mapping)
+
+    session.commit()
+    return [cities[place_id] for place_id in rows]
+
+
+def build_city_rows(cities_data: list[dict]) -> dict[str, dict]:
+    """Validate city data and build the rows to upsert, keyed by place ID."""
+    rows: dict[str, dict] = {}
     for city_data in cities_data:
+        place_id = city_data.get("place_id")
         name = city_data.get("name")
         temperature = city_data.get("temperature")
         weather_condition = city_data.get("weather_condition")
 
-        if not all([name, temperature, weather_condition]):
+        if not place_id or not name or temperature is None or not weather_condition:
             raise ValueError("Missing required fields")
 
-        # Find city by name
-        statement = select(City).where(City.name == name)
-        city = session.exec(statement).first()
-
-        if city:
-            # Update existing city
-            city.temperature = temperature
-            city.weather_condition = weather_condition
-        else:
-            # Create new city
-            city = City(
-                name=name,
-                temperature=temperature,
-                weather_condition=weather_condition,
-            )
-
-        session.add(city)
-        processed_cities.append(city)
+        # A statement can't update the same row twice: the last value wins
+        rows[place_id] = {
+            "id": uuid.uuid4(),
+            "place_id": place_id,
+            "name": name,
+            "temperature": temperature,
+            "weather_condition": weather_condition,
+        }
+    return rows
+
+
+def upsert_cities_statement(dialect: str, rows: list[dict]) -> Executable:
+    """Build the INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement of rows."""
+    insert = UPSERT_INSERTS.get(dialect)
+    if insert is None:
+        raise RepositoryError(f"Bulk upsert is not supported on {dialect}")
+
+    table = City.__table__
+    statement = insert(table).values(rows)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.place_id],
+        set_={
+            "name": excluded.name,
+            "temperature": excluded.temperature,
+            "weather_condition": excluded.weather_condition,
+        },
+        # Skip the write when nothing changed (no RETURNING row either)
+        where=or_(
+            table.c.name != excluded.name,
+            table.c.temperature != excluded.temperature,
+            table.c.weather_condition != excluded.weather_condition,
+        ),
+    ).returning(*table.c)
+
+
+def unchanged_cities_statement(
+    rows: list[dict], cities: dict[str, City]
+) -> Executable | None:
+    """Build the statement reading the upserted rows that were not returned."""
+    unchanged = [row["place_id"] for row in rows if row["place_id"] not in cities]
+    if not unchanged:
+        return None
+    table = City.__table__
+    return table.select().where(table.c.place_id.in_(unchanged))
+
+
+def get_city_lookups(*, session: Session, queries: list[str]) -> dict[str, CityLookup]:
+    """Get the cached location search results for normalized queries, if not expired."""
+    statement = select(CityLookup).where(
+        CityLookup.query.in_(queries),
+        CityLookup.expires_at > datetime.now(timezone.utc),
+    )
+    return {lookup.query: lookup for lookup in session.exec(statement)}
+
+
+def save_city_lookups(
+    *,
+    session: Session,
+    city_infos: dict[str, dict | None],
+    ttl: timedelta,
+    negative_ttl: timedelta,
+) -> list[CityLookup]:
+    """
+    Creates or replaces the cached location search results of normalized queries.
+
+    Args:
+        session: The database session.
+        city_infos: A dictionary mapping each normalized city name that was searched
+                    to the location found ('name', 'coordinate', 'placeID'), or to
+                    None to remember that the query did not resolve.
+        ttl: How long entries of resolved queries are valid.
+        negative_ttl: How long entries of queries that did not resolve are valid.
+
+    Returns:
+        A list of the stored CityLookup objects.
+    """
+    now = datetime.now(timezone.utc)
+    lookups = []
+    for query, city_info in city_infos.items():
+        lookup = CityLookup(
+            query=query,
+            name=city_info["name"] if city_info else None,
+            coordinate=city_info["coordinate"] if city_info else None,
+            place_id=city_info["placeID"] if city_info else None,
+            expires_at=now + (ttl if city_info else negative_ttl),
+        )
+        lookups.append(session.merge(lookup))
+
+    session.commit()
+    return lookups
+
+
+def get_condition_codes(*, session: Session, names: list[str]) -> dict[str, int]:
+    """Get the codes of weather conditions by name, creating the missing ones."""
+    dialect = session.get_bind().dialect.name
+    connection = session.connection()
+    codes = {
+        row.name: row.code for row in connection.execute(conditions_statement(names))
+    }
+    missing = [name for name in names if name not in codes]
+    if missing:
+        connection.execute(insert_conditions_statement(dialect, missing))
+        statement = conditions_statement(missing)
+        codes.update((row.name, row.code) for row in connection.execute(statement))
+    return codes
 
+
+def save_weather_observations(
+    *, session: Session, observations: list[dict], chunk_size: int = 200
+) -> int:
+    """
+    Appends weather observations, ignoring the ones already stored.
+
+    Args:
+        session: The database session.
+        observations: A list of dictionaries, where each dictionary should contain:
+                      - 'place_id': str
+                      - 'observed_at': int (Unix time)
+                      - 'temperature': int
+                      - 'weather_condition': str
+        chunk_size: Max number of observations per statement.
+
+    Returns:
+        The number of observations stored.
+    """
+    if not observations:
+        return 0
+
+    dialect = session.get_bind().dialect.name
+    names = sorted({observation["weather_condition"] for observation in observations})
+    codes = get_condition_codes(session=session, names=names)
+
+    rows = build_observation_rows(observations, codes)
+    connection = session.connection()
+    stored = 0
+    for start in range(0, len(rows), chunk_size):
+        statement = insert_observations_statement(
+            dialect, rows[start : start + chunk_size]
+        )
+        stored += connection.execute(statement).rowcount
+    session.commit()
+    return stored
+
+
+def get_weather_observations(
+    *,
+    session: Session,
+    place_id: str,
+    start: int,
+    end: int,
+    after: int | None = None,
+    limit: int = 1_000,
+) -> list[dict]:
+    """
+    Get the observations of a place in a time range, oldest first.
+
+    Args:
+        session: The database session.
+        place_id: weather.com ID of the place.
+        start: Start of the range (Unix time, included).
+        end: End of the range (Unix time, excluded).
+        after: Only return observations after this time (to read the next page).
+        limit: Max number of observations returned.
+
+    Returns:
+        A list of dictionaries with 'observed_at', 'temperature' and 'weather_condition'.
+    """
+    statement = observations_statement(place_id, start, end, after, limit)
+    return [dict(row._mapping) for row in session.connection().execute(statement)]
+
+
+def compact_weather_observations(
+    *, session: Session, now: int, raw_retention: int, interval: int, max_age: int
+) -> int:
+    """
+    Applies the retention policy of observations: the ones older than `raw_retention`
+    seconds are downsampled to the first one per place per `interval` seconds, and
+    the ones older than `max_age` seconds are deleted.
+
+    Returns:
+        The number of observations deleted.
+    """
+    connection = session.connection()
+    deleted = sum(
+        connection.execute(statement).rowcount
+        for statement in compact_observations_statements(
+            now, raw_retention, interval, max_age
+        )
+    )
     session.commit()
-    for city in processed_cities:
-        session.refresh(city)
+    return deleted
+
+
+def conditions_statement(names: list[str]) -> Executable:
+    table = WeatherCondition.__table__
+    return table.select().where(table.c.name.in_(names))
+
+
+def insert_conditions_statement(dialect: str, names: list[str]) -> Executable:
+    insert = UPSERT_INSERTS.get(dialect)
+    if insert is None:
+        raise RepositoryError(f"Bulk insert is not supported on {dialect}")
+    statement = insert(WeatherCondition.__table__).values([{"name": n} for n in names])
+    return statement.on_conflict_do_nothing(index_elements=["name"])
+
+
+def build_observation_rows(
+    observations: list[dict], codes: dict[str, int]
+) -> list[dict]:
+    """Build the rows of observations, one per place and time."""
+    rows = {}
+    for observation in observations:
+        key = (observation["place_id"], observation["observed_at"])
+        rows[key] = {
+            "place_id": observation["place_id"],
+            "observed_at": observation["observed_at"],
+            "temperature": observation["temperature"],
+            "condition_code": codes[observation["weather_condition"]],
+        }
+    return list(rows.values())
+
+
+def insert_observations_statement(dialect: str, rows: list[dict]) -> Executable:
+    insert = UPSERT_INSERTS.get(dialect)
+    if insert is None:
+        raise RepositoryError(f"Bulk insert is not supported on {dialect}")
+    statement = insert(WeatherObservation.__table__).values(rows)
+    return statement.on_conflict_do_nothing(index_elements=["place_id", "observed_at"])
+
+
+def observations_statement(
+    place_id: str, start: int, end: int, after: int | None, limit: int
+) -> Executable:
+    observation = WeatherObservation.__table__
+    condition = WeatherCondition.__table__
+    statement = (
+        select(
+            observation.c.observed_at,
+            observation.c.temperature,
+            condition.c.name.label("weather_condition"),
+        )
+        .join(condition, condition.c.code == observation.c.condition_code)
+        .where(
+            observation.c.place_id == place_id,
+            observation.c.observed_at >= start,
+            observation.c.observed_at < end,
+        )
+        .order_by(observation.c.observed_at)
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(observation.c.observed_at > after)
+    return statement
+
+
+def compact_observations_statements(
+    now: int, raw_retention: int, interval: int, max_age: int
+) -> list[Executable]:
+    table = WeatherObservation.__table__
+    downsample_before = now - raw_retention
 
-    return processed_cities
+    # First observation of each place in each interval, among the old ones
+    kept = (
+        select(table.c.place_id, func.min(table.c.observed_at))
+        .where(table.c.observed_at < downsample_before)
+        .group_by(table.c.place_id, table.c.observed_at // interval)
+    )
+    return [
+        table.delete().where(table.c.observed_at < now - max_age),
+        table.delete().where(
+            table.c.observed_at < downsample_before,
+            tuple_(table.c.place_id, table.c.observed_at).not_in(kept),
+        ),
+    ]
@@ -1,10 +1,164 @@
 import asyncio
-from typing import Dict, List, Optional
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
 
-import aiohttp  # Add this import at the top with other imports
-from requests_html import AsyncHTMLSession
+from requests_html import HTML
+
+from app.core import deadline
+from app.core.cache import CacheEntry, TTLCache
+from app.core.config import settings
+from app.core.tracing import span
 
 from .exceptions import WeatherScraperRequestError
+from .history import observation_recorder
+from .http import get_session, request_timeout
+from .refresher import WeatherRefresher
+from .resilience import LatencyTracker, hedged, retry_weather_call, weather_call
+from .scheduler import FetchScheduler
+
+WEATHER_URL = settings.WEATHER_URL.rstrip("/")
+WEATHER_HOST = urlsplit(WEATHER_URL).netloc
+LOCATION_SEARCH_URL = f"{WEATHER_URL}/api/v1/p/redux-dal"
+
+PAGE_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "accept-language": "en-US,en;q=0.9",
+    "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
+}
+
+# Weather data per placeID, shared by every user having the same favorite
+weather_cache = TTLCache(
+    ttl=settings.WEATHER_CACHE_TTL,
+    max_size=settings.WEATHER_CACHE_MAX_SIZE,
+    stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+)
+
+# Bounds the weather page scrapes made concurrently and their rate
+weather_scheduler = FetchScheduler(
+    max_concurrency=settings.SCRAPE_MAX_CONCURRENCY,
+    max_concurrency_per_host=settings.SCRAPE_MAX_CONCURRENCY_PER_HOST,
+    rate=settings.SCRAPE_RATE_LIMIT,
+    burst=settings.SCRAPE_RATE_BURST,
+)
+
+# Duration of the recent weather page scrapes, to know when to hedge one
+weather_page_latency = LatencyTracker(
+    size=settings.WEATHER_HEDGE_SAMPLES, min_samples=20
+)
+
+# Keeps the weather of the places requested by users warm, and records it
+weather_refresher = WeatherRefresher(
+    cache=weather_cache,
+    fetch=lambda place_id: fetch_city_weather(place_id),
+    interval=settings.WEATHER_REFRESH_INTERVAL,
+    refresh_ahead=settings.WEATHER_REFRESH_AHEAD,
+    max_idle=settings.WEATHER_REFRESH_MAX_IDLE,
+    record=observation_recorder.record,
+)
+
+
+@dataclass
+class CitySearchResult:
+    """Outcome of a batched location search, keyed by the searched names."""
+
+    found: Dict[str, dict] = field(default_factory=dict)
+    not_found: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # name -> error message
+
+
+def _location_search_key(name: str) -> str:
+    # Key of a query's result in the redux-dal response
+    return f"language:en-US;locationType:locale;query:{name}"
+
+
+async def _search_city_infos_chunk(names: List[str], result: CitySearchResult) -> None:
+    payload = [
+        {
+            "name": "getSunV3LocationSearchUrlConfig",
+            "params": {"query": name, "language": "en-US", "locationType": "locale"},
+        }
+        for name in names
+    ]
+
+    async def search():
+        with weather_call("weather_location_search"):
+            async with get_session().post(
+                LOCATION_SEARCH_URL, json=payload, timeout=request_timeout()
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    try:
+        data = await retry_weather_call(search)
+        results = data["dal"]["getSunV3LocationSearchUrlConfig"]
+    except Exception as e:
+        for name in names:
+            result.failed[name] = f"Error searching city {name}: {e}"
+        return
+
+    for name in names:
+        try:
+            location = results[_location_search_key(name)]["data"]["location"]
+            result.found[name] = {
+                "name": location["address"][0],
+                "coordinate": f"{location['latitude'][0]},{location['longitude'][0]}",
+                "placeID": location["placeId"][0],
+            }
+        except (KeyError, IndexError, TypeError):
+            result.not_found.append(name)
+
+
+async def search_city_infos(
+    names: List[str], batch_size: Optional[int] = None
+) -> CitySearchResult:
+    """
+    Search weather.com for the locations matching many city names.
+
+    The queries are packed into as few redux-dal requests as possible (at most
+    `batch_size` queries per request, sent concurrently) and the response is
+    demultiplexed by query.
+
+    Args:
+        names (List[str]): Names of the cities to search for
+        batch_size (Optional[int]): Max queries per request, defaults to GEOCODE_BATCH_SIZE
+
+    Returns:
+        CitySearchResult: City information (see `get_city_info`) of the names found,
+            names without location, and names whose request failed.
+    """
+    batch_size = batch_size or settings.GEOCODE_BATCH_SIZE
+    names = list(dict.fromkeys(names))  # Remove duplicates, keep order
+
+    result = CitySearchResult()
+    await asyncio.gather(
+        *[
+            _search_city_infos_chunk(names[i : i + batch_size], result)
+            for i in range(0, len(names), batch_size)
+        ]
+    )
+    return result
+
+
+async def search_city_info(name: str) -> Optional[dict]:
+    """
+    Search weather.com for the location matching a city name.
+
+    Args:
+        name (str): Name of the city to search for
+
+    Returns:
+        Optional[dict]: The city information (see `get_city_info`), or None if the
+            search returned no location for this name.
+
+    Raises:
+        WeatherScraperRequestError: If the request to weather.com fails
+    """
+    result = await search_city_infos([name])
+    if name in result.failed:
+        raise WeatherScraperRequestError(result.failed[name])
+    return result.found.get(name)
 
 
 async def get_city_info(name: str) -> Optional[dict]:
@@ -23,30 +177,8 @@ async def get_city_info(name: str) -> Optional[dict]:
                 "placeID": str    # Unique identifier for the location
             }
     """
-    url = "https://weather.com/api/v1/p/redux-dal"
-    payload = [
-        {
-            "name": "getSunV3LocationSearchUrlConfig",
-            "params": {"query": name, "language": "en-US", "locationType": "locale"},
-        }
-    ]
-
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                response.raise_for_status()
-                data = await response.json()
-
-                location = data["dal"]["getSunV3LocationSearchUrlConfig"][
-                    f"language:en-US;locationType:locale;query:{name}"
-                ]["data"]["location"]
-
-                return {
-                    "name": location["address"][0],
-                    "coordinate": f"{location['latitude'][0]},{location['longitude'][0]}",
-                    "placeID": location["placeId"][0],
-                }
-
+        return await search_city_info(name)
     except Exception as e:
         print(f"Error fetching city ID: {e}")
         return None
@@ -63,36 +195,124 @@ async def get_city_weather(place_id: str) -> Optional[Dict[str, str | int]]:
         Optional[Dict[str, str | int]]: Dictionary containing weather information or None if city not found
     """
     # Fetch weather data
-    asession = AsyncHTMLSession()
-    url = f"https://weather.com/weather/today/l/{place_id}?unit=m"  # unit in celsius
+    url = f"{WEATHER_URL}/weather/today/l/{place_id}?unit=m"  # in celsius
+
+    async def fetch_page():
+        start = time.perf_counter()
+        with weather_call("weather_page"):
+            async with get_session().get(
+                url, headers=PAGE_HEADERS, timeout=request_timeout()
+            ) as response:
+                response.raise_for_status()
+                text = await response.text()
+        weather_page_latency.observe(time.perf_counter() - start)
+        return text
 
     try:
-        r = await asession.get(url)
+        text = await retry_weather_call(fetch_page)
+        html = HTML(html=text, url=url)
 
         # Find temperature
-        temp_str = r.html.find("span[data-testid='TemperatureValue']", first=True).text
+        temp_str = html.find("span[data-testid='TemperatureValue']", first=True).text
         temp_int = int(temp_str.strip("°"))
 
         # Find weather phrase
-        weather_condition = r.html.find("div[data-testid='wxPhrase']", first=True).text
+        weather_condition = html.find("div[data-testid='wxPhrase']", first=True).text
 
         return {
             "placeID": place_id,
             "temperature_celsius": temp_int,
             "weather_condition": weather_condition.lower(),
+            "observed_at": int(time.time()),  # Unix time
         }
     except Exception as e:
         raise WeatherScraperRequestError(
             f"Error fetching weather data for {place_id}: {e}"
         )
-    finally:
-        await asession.close()
+
+
+async def get_cached_city_weather(place_id: str) -> Dict[str, str | int]:
+    """
+    Get weather information for a given city, served from the weather cache when fresh.
+
+    Concurrent calls for the same place ID share a single upstream fetch, which goes
+    through the weather scheduler. Stale data is served while it is being refreshed.
+    The fetch is not bound by the deadline of the request starting it, as its result
+    is shared: a request giving up on it doesn't cancel it (see `get_city_weathers`).
+
+    Args:
+        place_id (str): Unique identifier of the location
+
+    Returns:
+        Dict[str, str | int]: Dictionary containing weather information
+
+    Raises:
+        WeatherScraperRequestError: If the weather data could not be fetched
+    """
+    weather = await weather_cache.get_or_fetch(
+        place_id, lambda: deadline.without_deadline(fetch_city_weather(place_id))
+    )
+    return dict(weather)
+
+
+async def fetch_city_weather(place_id: str) -> Dict[str, str | int]:
+    """
+    Get weather information for a given city, through the weather scheduler.
+
+    Args:
+        place_id (str): Unique identifier of the location
+
+    Returns:
+        Dict[str, str | int]: Dictionary containing weather information
+
+    Raises:
+        WeatherScraperRequestError: If the weather data could not be fetched
+    """
+    # Includes the wait for the scheduler, unlike the weather_page span
+    with span("fetch_city_weather"):
+        return await weather_scheduler.run(
+            WEATHER_HOST, lambda: get_hedged_city_weather(place_id)
+        )
+
+
+async def get_hedged_city_weather(place_id: str) -> Dict[str, str | int]:
+    """
+    Same as `get_city_weather`, with a second request when hedging is enabled and
+    the first one is slower than most recent scrapes.
+
+    The second request shares the scheduler slot of the first one.
+
+    Args:
+        place_id (str): Unique identifier of the location
+
+    Returns:
+        Dict[str, str | int]: Dictionary containing weather information
+
+    Raises:
+        WeatherScraperRequestError: If the weather data could not be fetched
+    """
+    delay = None
+    if settings.WEATHER_HEDGING_ENABLED:
+        delay = weather_page_latency.percentile(settings.WEATHER_HEDGE_PERCENTILE)
+    if delay is None:
+        return await get_city_weather(place_id)
+
+    return await hedged(
+        lambda: get_city_weather(place_id),
+        max(delay, settings.WEATHER_HEDGE_MIN_DELAY),
+        operation="weather_page",
+    )
 
 
 async def get_city_weathers(city_entries: List[Dict]) -> List[Dict]:
     """
     Get weather information for multiple cities asynchronously and add it to each entry.
 
+    A failure for one city doesn't fail the others: each entry gets a 'status' key,
+    "ok" when weather information was added, or "error" with the reason in 'error'.
+    When the request deadline passes, the entries still waiting for their weather are
+    returned with an error (check `deadline.expired()` to tell a partial result).
+
     Args:
         city_entries (List[Dict]): List of dictionaries containing city information,
             each dict must have a 'placeID' key
@@ -103,13 +323,162 @@ async def get_city_weathers(city_entries: List[Dict]) -> List[Dict]:
     # Create a copy of the input list. Be aware that this is a shallow copy...
     results = city_entries.copy()
 
-    # Create tasks for fetching weather data
-    tasks = [get_city_weather(entry["placeID"]) for entry in city_entries]
-    weather_data = await asyncio.gather(*tasks)
+    # Fetch weather data concurrently, the scheduler bounds the actual scrapes
+    with span("get_city_weathers"):
+        tasks = [asyncio.ensure_future(add_city_weather(entry)) for entry in results]
+        try:
+            if tasks:
+                await asyncio.wait(tasks, timeout=deadline.remaining())
+        finally:
+            _expire_unfinished(tasks, results)
+    return results
 
-    # Add weather data to each entry
-    for entry, weather in zip(results, weather_data):
-        if weather is not None:
-            entry.update(weather)
 
-    return results
+def cached_weather_entries(city_entries: List[Dict]) -> Optional[List[CacheEntry]]:
+    """
+    Return the weather cache entry of every entry's place, when they are all fresh.
+
+    Never fetches: returns None as soon as one place would need a fetch (or a stale
+    entry a refresh). Each entry is read once, and counted as a hit only when all of
+    them are fresh.
+
+    Args:
+        city_entries (List[Dict]): List of dictionaries containing city information,
+            each dict must have a 'placeID' key
+
+    Returns:
+        Optional[List[CacheEntry]]: Cache entries in the order of `city_entries`, or None
+    """
+    weather_entries = []
+    for entry in city_entries:
+        weather_entry = weather_cache.get_entry(entry["placeID"])
+        if weather_entry is None:
+            return None
+        weather_entries.append(weather_entry)
+
+    # Count the hits, and keep the places requested for the weather refresher
+    for entry, weather_entry in zip(city_entries, weather_entries):
+        weather_cache.record_hit(entry["placeID"], weather_entry)
+    return weather_entries
+
+
+def cached_city_weathers(
+    city_entries: List[Dict], weather_entries: Optional[List[CacheEntry]] = None
+) -> Optional[List[Dict]]:
+    """
+    Same as `get_city_weathers`, when the weather of every entry is cached and fresh.
+
+    Never fetches: returns None as soon as one place would need a fetch, so that the
+    caller can fall back to `get_city_weathers`.
+
+    Args:
+        city_entries (List[Dict]): List of dictionaries containing city information,
+            each dict must have a 'placeID' key
+        weather_entries (Optional[List[CacheEntry]]): Entries already returned by
+            `cached_weather_entries` for `city_entries`, read from the cache if None
+
+    Returns:
+        Optional[List[Dict]]: New dictionaries with added weather information, or None
+    """
+    if weather_entries is None:
+        weather_entries = cached_weather_entries(city_entries)
+        if weather_entries is None:
+            return None
+    return [
+        {**entry, **weather_entry.value, "status": "ok"}
+        for entry, weather_entry in zip(city_entries, weather_entries)
+    ]
+
+
+async def iter_city_weathers(city_entries: List[Dict]) -> AsyncIterator[Dict]:
+    """
+    Same as `get_city_weathers`, but yield each entry as soon as its weather arrives.
+
+    Entries are yielded in completion order, and are updated in place. When the
+    request deadline passes, the entries still waiting are yielded with an error.
+
+    Args:
+        city_entries (List[Dict]): List of dictionaries containing city information,
+            each dict must have a 'placeID' key
+
+    Yields:
+        Dict: Entry with added weather information
+    """
+    tasks = [asyncio.ensure_future(add_city_weather(e)) for e in city_entries]
+    try:
+        for task in asyncio.as_completed(tasks, timeout=deadline.remaining()):
+            try:
+                entry = await task
+            except asyncio.TimeoutError:
+                break
+            yield entry
+    finally:
+        unfinished = _expire_unfinished(tasks, city_entries)
+    for entry in unfinished:
+        yield entry
+
+
+def _expire_unfinished(
+    tasks: List[asyncio.Future], city_entries: List[Dict]
+) -> List[Dict]:
+    """Cancel the weather tasks still running, and return their entries with an error."""
+    unfinished = []
+    for task, entry in zip(tasks, city_entries):
+        if not task.done():
+            task.cancel()
+            entry.update({"status": "error", "error": "Deadline exceeded"})
+            unfinished.append(entry)
+    return unfinished
+
+
+async def add_city_weather(entry: Dict) -> Dict:
+    """
+    Add weather information (and a 'status') to a city entry in place.
+
+    Args:
+        entry (Dict): City information, must have a 'placeID' key
+
+    Returns:
+        Dict: The updated entry
+    """
+    try:
+        weather = await get_cached_city_weather(entry["placeID"])
+        entry.update({**weather, "status": "ok"})
+    except Exception as e:
+        entry.update({"status": "error", "error": str(e)})
+    return entry
+
+
+# Columns of the weather returned in columnar form (see `to_weather_columns`)
+WEATHER_COLUMNS = (
+    "placeID",
+    "status",
+    "temperature_celsius",
+    "weather_condition",
+    "observed_at",
+    "error",
+)
+
+
+def to_weather_columns(city_entries: List[Dict]) -> Dict[str, List]:
+    """
+    Convert the entries returned by `get_city_weathers` to parallel arrays.
+
+    The i-th element of each column belongs to the i-th entry, None where the entry
+    has no such value (e.g. no temperature for an error).
+
+    Args:
+        city_entries (List[Dict]): Entries with weather information and a 'status'
+
+    Returns:
+        Dict[str, List]: One list per column of WEATHER_COLUMNS
+    """
+    return {
+        column: [entry.get(column) for entry in city_entries]
+        for column in WEATHER_COLUMNS
+    }
+
+
+def successful_city_weathers(city_entries: List[Dict]) -> List[Dict]:
+    """Keep the entries returned by `get_city_weathers` that have weather information."""
+    return [entry for entry in city_entries if entry.get("status") == "ok"]
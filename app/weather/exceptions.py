@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class WeatherScraperException(Exception):
     """Base exception class for weather scraper errors."""
 
@@ -13,4 +16,17 @@ class InvalidLoginCredentials(WeatherScraperException):
 class WeatherScraperRequestError(WeatherScraperException):
     """Raised when there is an error with the weather.com API request."""
 
+    def __init__(self, message: str, status: Optional[int] = None):
+        """
+        Args:
+            message: Error message
+            status: HTTP status of the weather.com response, if it answered
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(WeatherScraperRequestError):
+    """Raised when a weather.com endpoint is not called because it is failing."""
+
     pass
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_repository
+from app.core.config import settings
+
+from .city import CitySearchResult, search_city_infos
+
+
+def normalize_city_query(name: str) -> str:
+    """Normalize a city name so that equivalent spellings share a cache entry."""
+    return " ".join(name.split()).casefold()
+
+
+async def resolve_city_infos(
+    names: List[str], session: Optional[Session | AsyncSession] = None
+) -> CitySearchResult:
+    """
+    Get the city information of many city names, using the persistent geocoding cache.
+
+    The cache is consulted before weather.com and the remaining names are resolved
+    with batched location searches. Names that did not resolve are cached too (with
+    a shorter TTL) so that bad input doesn't hit weather.com again. Request errors
+    are not cached.
+
+    Args:
+        names (List[str]): Names of the cities to search for
+        session (Optional[Session | AsyncSession]): Database session, the cache is skipped if None
+
+    Returns:
+        CitySearchResult: Search outcome keyed by the names given
+    """
+    # Search weather.com with the cleaned-up spelling, cache with the normalized one
+    cleaned_names = {name: " ".join(name.split()) for name in names}
+    queries = {name: normalize_city_query(name) for name in names}
+
+    result = CitySearchResult()
+    lookups = {}
+    if session is not None:
+        lookups = await async_repository.get_city_lookups(
+            session=session, queries=list(set(queries.values()))
+        )
+
+    # Names cached as found or not found
+    missing_names = []
+    for name in names:
+        lookup = lookups.get(queries[name])
+        if lookup is None:
+            missing_names.append(name)
+        elif lookup.place_id is None:
+            result.not_found.append(name)
+        else:
+            result.found[name] = {
+                "name": lookup.name,
+                "coordinate": lookup.coordinate,
+                "placeID": lookup.place_id,
+            }
+
+    if not missing_names:
+        return result
+
+    # Remaining names are searched on weather.com
+    search = await search_city_infos([cleaned_names[name] for name in missing_names])
+    city_infos = {}
+    for name in missing_names:
+        cleaned_name = cleaned_names[name]
+        if cleaned_name in search.failed:
+            result.failed[name] = search.failed[cleaned_name]
+        elif cleaned_name in search.found:
+            result.found[name] = city_infos[queries[name]] = search.found[cleaned_name]
+        else:
+            result.not_found.append(name)
+            city_infos[queries[name]] = None
+
+    if session is not None and city_infos:
+        await async_repository.save_city_lookups(
+            session=session,
+            city_infos=city_infos,
+            ttl=timedelta(seconds=settings.GEOCODE_CACHE_TTL),
+            negative_ttl=timedelta(seconds=settings.GEOCODE_NEGATIVE_CACHE_TTL),
+        )
+    return result
+
+
+async def resolve_city_info(
+    name: str, session: Optional[Session | AsyncSession] = None
+) -> Optional[dict]:
+    """
+    Get the city information for a city name, using the persistent geocoding cache.
+
+    Args:
+        name (str): Name of the city to search for
+        session (Optional[Session | AsyncSession]): Database session, the cache is skipped if None
+
+    Returns:
+        Optional[dict]: The city information (see `get_city_info`), None if not found
+            or if the search failed
+    """
+    result = await resolve_city_infos([name], session=session)
+    if name in result.failed:
+        print(f"Error fetching city ID: {result.failed[name]}")
+    return result.found.get(name)
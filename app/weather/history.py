@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_repository
+from app.core.config import settings
+from app.core.db import open_session
+
+
+def to_observation(weather: Dict) -> Dict:
+    """Convert weather information (see `get_city_weather`) to an observation."""
+    return {
+        "place_id": weather["placeID"],
+        "observed_at": weather.get("observed_at") or int(time.time()),
+        "temperature": weather["temperature_celsius"],
+        "weather_condition": weather["weather_condition"],
+    }
+
+
+class ObservationRecorder:
+    """Append the weather fetched to the observation history.
+
+    Recording the same observation twice (e.g. cached weather synced again) stores it
+    once. The retention policy is applied by a background worker every
+    `compact_interval` seconds, not by the requests recording: old observations are
+    downsampled, then deleted.
+    """
+
+    def __init__(
+        self,
+        raw_retention: int,
+        downsample_interval: int,
+        max_age: int,
+        compact_interval: float,
+    ):
+        """
+        Args:
+            raw_retention: Every observation is kept for this long, in seconds
+            downsample_interval: Older observations are downsampled to one per place
+                per interval, in seconds
+            max_age: Observations are deleted after this long, in seconds
+            compact_interval: Time between two compactions, in seconds
+        """
+        self.raw_retention = raw_retention
+        self.downsample_interval = downsample_interval
+        self.max_age = max_age
+        self.compact_interval = compact_interval
+
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start compacting the history periodically, on the running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background compaction."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def record(
+        self, weathers: List[Dict], session: Optional[Session | AsyncSession] = None
+    ) -> int:
+        """
+        Record weather information as observations.
+
+        Args:
+            weathers: Weather information (see `get_city_weather`)
+            session: Database session, a new one is opened if None
+
+        Returns:
+            int: Number of observations stored
+        """
+        if session is None:
+            async with open_session() as session:
+                return await self.record(weathers, session=session)
+
+        observations = [to_observation(weather) for weather in weathers]
+        return await async_repository.save_weather_observations(
+            session=session, observations=observations
+        )
+
+    async def compact(self, session: Optional[Session | AsyncSession] = None) -> None:
+        """
+        Apply the retention policy: downsample, then delete old observations.
+
+        Args:
+            session: Database session, a new one is opened if None
+        """
+        if session is None:
+            async with open_session() as session:
+                return await self.compact(session=session)
+
+        await async_repository.compact_weather_observations(
+            session=session,
+            now=int(time.time()),
+            raw_retention=self.raw_retention,
+            interval=self.downsample_interval,
+            max_age=self.max_age,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Error compacting weather observations: {e}")
+            await asyncio.sleep(self.compact_interval)
+
+
+observation_recorder = ObservationRecorder(
+    raw_retention=settings.OBSERVATION_RAW_RETENTION,
+    downsample_interval=settings.OBSERVATION_DOWNSAMPLE_INTERVAL,
+    max_age=settings.OBSERVATION_MAX_AGE,
+    compact_interval=settings.OBSERVATION_COMPACT_INTERVAL,
+)
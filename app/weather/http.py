@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import ssl
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import aiohttp
+
+from app.core import deadline
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherHTTPClient:
+    """Pooled aiohttp client shared by every call to weather.com.
+
+    A single `aiohttp.ClientSession` is kept for the lifetime of the application so
+    that DNS lookups, TCP connections and TLS contexts are reused across requests
+    instead of being rebuilt for every call.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        limit_per_host: int,
+        dns_cache_ttl: int,
+        keepalive_timeout: float,
+        request_timeout: Optional[float] = None,
+    ):
+        """Initialize the client configuration. The session itself is created lazily."""
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        # Fail slow requests instead of waiting for aiohttp's 5 minutes default
+        self.request_timeout = request_timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+        # Pool usage counters, fed by aiohttp tracing hooks
+        self._in_flight = 0
+        self._waiting = 0
+        self._queued_total = 0
+        self._queue_wait_seconds = 0.0
+        self._connections_created = 0
+        self._connections_reused = 0
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use.
+
+        The session is bound to the event loop it was created on, so a new one is
+        created if the previous session was closed or belongs to another loop. An
+        open session of another loop is closed on that loop when it still runs,
+        otherwise its sockets can no longer be released and it is dropped with a
+        warning: `close()` should be awaited on a loop before it stops.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed:
+            if self._loop is loop:
+                return self._session
+            self._discard_session()
+        self._session = self._create_session()
+        self._loop = loop
+        return self._session
+
+    async def start(self) -> None:
+        """Eagerly create the shared session (called from the app lifespan)."""
+        self.get_session()
+
+    async def close(self) -> None:
+        """Close the shared session and release every pooled connection."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    def stats(self) -> Dict[str, int | float]:
+        """Return pool usage counters, useful to detect pool saturation.
+
+        `waiting` is the number of requests currently queued for a free connection
+        and `queue_wait_seconds` the total time spent waiting for one.
+        """
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "queued_total": self._queued_total,
+            "queue_wait_seconds": round(self._queue_wait_seconds, 6),
+            "connections_created": self._connections_created,
+            "connections_reused": self._connections_reused,
+        }
+
+    def _discard_session(self) -> None:
+        # Transports can only be closed by the loop they belong to
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop)
+        else:
+            logger.warning(
+                "Dropping the weather.com session of an event loop which is not "
+                "running, its connections were not closed"
+            )
+        self._session = None
+        self._loop = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        if self._ssl_context is None:
+            # Loading the CA bundle is expensive, build the TLS context only once
+            self._ssl_context = ssl.create_default_context()
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=self._ssl_context,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            # The session is shared between users: never keep cookies from one
+            # response around for the next request. Auth cookies are passed explicitly.
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            trace_configs=[self._trace_config()],
+        )
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx: SimpleNamespace, params):
+            self._in_flight += 1
+
+        async def on_request_done(session, ctx: SimpleNamespace, params):
+            self._in_flight -= 1
+
+        async def on_connection_queued_start(session, ctx: SimpleNamespace, params):
+            self._waiting += 1
+            self._queued_total += 1
+            ctx.queued_at = time.perf_counter()
+
+        async def on_connection_queued_end(session, ctx: SimpleNamespace, params):
+            self._waiting -= 1
+            self._queue_wait_seconds += time.perf_counter() - ctx.queued_at
+
+        async def on_connection_create_end(session, ctx: SimpleNamespace, params):
+            self._connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx: SimpleNamespace, params):
+            self._connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_done)
+        trace_config.on_request_exception.append(on_request_done)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(on_connection_queued_end)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+
+http_client = WeatherHTTPClient(
+    limit=settings.HTTP_POOL_LIMIT,
+    limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+    dns_cache_ttl=settings.HTTP_DNS_CACHE_TTL,
+    keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+    request_timeout=settings.HTTP_REQUEST_TIMEOUT,
+)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the application-wide aiohttp session used for weather.com."""
+    return http_client.get_session()
+
+
+def request_timeout() -> aiohttp.ClientTimeout:
+    """Return the timeout of a weather.com request, shortened by the request deadline."""
+    return aiohttp.ClientTimeout(total=deadline.timeout(http_client.request_timeout))
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.core.cache import TTLCache
+
+
+class WeatherRefresher:
+    """Background worker keeping the weather of every known place warm.
+
+    The places known are the ones in the weather cache, i.e. requested by any user.
+    On each pass, entries about to expire (or already stale) are refreshed before a
+    user has to wait for them, and places nobody requested for a while are evicted
+    so they are not refreshed forever.
+    """
+
+    def __init__(
+        self,
+        cache: TTLCache,
+        fetch: Callable[[str], Awaitable[Any]],
+        interval: float,
+        refresh_ahead: float,
+        max_idle: float,
+        record: Optional[Callable[[List[Any]], Awaitable[Any]]] = None,
+    ):
+        """
+        Args:
+            cache: Weather cache, keyed by place ID
+            fetch: Coroutine function fetching the weather of a place ID
+            interval: Time between two passes, in seconds
+            refresh_ahead: Refresh entries expiring in less than this, in seconds
+            max_idle: Evict entries not requested for this long, in seconds
+            record: Coroutine function called with the weather refreshed by each pass
+        """
+        self.cache = cache
+        self.fetch = fetch
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.max_idle = max_idle
+        self.record = record
+
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the background worker on the running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background worker."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def refresh_once(self) -> int:
+        """Run one pass: evict idle places and start refreshing the expiring ones.
+
+        Refreshes run in the background, through the cache so that user requests
+        for the same place share them.
+
+        Returns:
+            int: Number of refreshes started
+        """
+        return len(self._start_refreshes())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                tasks = self._start_refreshes()
+                if self.record is not None and tasks:
+                    # Shielded: stopping the worker doesn't cancel fetches users await
+                    results = await asyncio.gather(
+                        *[asyncio.shield(task) for task in tasks],
+                        return_exceptions=True,
+                    )
+                    weathers = [r for r in results if not isinstance(r, BaseException)]
+                    await self.record(weathers)
+            except Exception as e:
+                print(f"Error refreshing weather data: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _start_refreshes(self) -> List[asyncio.Task]:
+        self.cache.evict_idle(self.max_idle)
+
+        refresh_before = time.time() + self.refresh_ahead
+        tasks = []
+        for place_id, entry in self.cache.items():
+            if entry.expires_at > refresh_before or self.cache.is_refreshing(place_id):
+                continue
+            tasks.append(
+                self.cache.refresh(
+                    place_id, lambda place_id=place_id: self.fetch(place_id)
+                )
+            )
+        return tasks
@@ -0,0 +1,332 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.metrics import track_upstream, upstream_hedges
+
+from .exceptions import CircuitOpenError, InvalidLoginCredentials
+
+T = TypeVar("T")
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Whether an error means that weather.com is unhealthy, not that the request was bad.
+
+    Errors with a 4xx status (unknown place, expired token...) and invalid credentials
+    are the caller's fault and don't count against the circuit breaker, except 429.
+    Neither do calls cut short by the request deadline.
+    """
+    if isinstance(error, (InvalidLoginCredentials, deadline.DeadlineExceeded)):
+        return False
+    status = getattr(error, "status", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+class CircuitBreaker:
+    """Fail fast when an upstream endpoint is failing or slow.
+
+    The breaker is closed at first: calls go through and their outcome is recorded.
+    When at least `failure_rate` of the last `window` calls failed or were slower
+    than `slow_call` (and at least `min_calls` were made), it opens: calls are
+    rejected with `CircuitOpenError` for `open_duration` seconds. It then becomes
+    half-open and lets `half_open_calls` probe calls through: it closes when they
+    all succeed, and opens again as soon as one fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float,
+        min_calls: int,
+        window: int,
+        slow_call: float,
+        open_duration: float,
+        half_open_calls: int,
+        is_failure: Callable[[BaseException], bool] = is_upstream_failure,
+    ):
+        """
+        Args:
+            name: Name of the protected endpoint (e.g. "weather_page")
+            failure_rate: Share of failed or slow calls opening the breaker (0-1)
+            min_calls: Min calls recorded before the breaker may open
+            window: Number of recent calls considered
+            slow_call: Duration from which a successful call counts as failed, in seconds
+            open_duration: Time calls are rejected before probing, in seconds
+            half_open_calls: Probe calls needed to close the breaker
+            is_failure: Whether an error raised by a call counts as a failure
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_duration = open_duration
+        self.half_open_calls = max(half_open_calls, 1)
+        self.is_failure = is_failure
+
+        self._state = self.CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True for a failure
+        self._opened_at = 0.0
+        self._probing = 0  # Probe calls in flight
+        self._probe_successes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self.open_duration
+        ):
+            self._state = self.HALF_OPEN
+            self._probing = self._probe_successes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Return the time left before the breaker probes again, in seconds."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_duration - time.monotonic())
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Run the block as a call protected by the breaker, and record its outcome.
+
+        A cancelled block (e.g. the losing request of a hedge) is not recorded.
+
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+        """
+        state = self.state
+        if state == self.OPEN or (
+            state == self.HALF_OPEN and self._probing >= self.half_open_calls
+        ):
+            self.rejected += 1
+            raise CircuitOpenError(
+                f"weather.com {self.name} is unavailable, "
+                f"retry in {self.retry_after():.0f}s"
+            )
+
+        probe = state == self.HALF_OPEN
+        if probe:
+            self._probing += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record(probe, failed=self.is_failure(e))
+            raise
+        except BaseException:
+            if probe:
+                self._probing -= 1
+            raise
+        else:
+            self._record(probe, failed=time.monotonic() - start >= self.slow_call)
+
+    def stats(self) -> Dict[str, int | float | str]:
+        """Return the breaker state and counters."""
+        outcomes = list(self._outcomes)
+        return {
+            "state": self.state,
+            "recent_calls": len(outcomes),
+            "recent_failures": sum(outcomes),
+            "retry_after": round(self.retry_after(), 3),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+    def _record(self, probe: bool, failed: bool) -> None:
+        if probe:
+            self._probing -= 1
+            if self._state != self.HALF_OPEN:
+                return  # Another probe already decided
+            if failed:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+            return
+
+        self._outcomes.append(failed)
+        if (
+            self._state == self.CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) >= self.failure_rate * len(self._outcomes)
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+
+class CircuitBreakers:
+    """One circuit breaker per upstream endpoint, created on first use."""
+
+    def __init__(self, **config):
+        """
+        Args:
+            **config: Arguments of every `CircuitBreaker` (but its name)
+        """
+        self.config = config
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def __getitem__(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **self.config)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return the stats of each breaker, by endpoint."""
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
+
+    def clear(self) -> None:
+        self._breakers.clear()
+
+
+# Breakers of the weather.com endpoints, shared by every user
+weather_breakers = CircuitBreakers(
+    failure_rate=settings.BREAKER_FAILURE_RATE,
+    min_calls=settings.BREAKER_MIN_CALLS,
+    window=settings.BREAKER_WINDOW,
+    slow_call=settings.BREAKER_SLOW_CALL,
+    open_duration=settings.BREAKER_OPEN_DURATION,
+    half_open_calls=settings.BREAKER_HALF_OPEN_CALLS,
+)
+
+
+@contextmanager
+def weather_call(operation: str) -> Iterator[None]:
+    """
+    Run a call to weather.com through the circuit breaker of its endpoint.
+
+    The call is also tracked as an upstream call (see `track_upstream`), unless it
+    is rejected by the breaker. Its timeout should be `request_timeout()`, so that a
+    timeout caused by the request deadline is raised as DeadlineExceeded.
+
+    Args:
+        operation: Name of the endpoint called (e.g. "weather_page")
+
+    Raises:
+        CircuitOpenError: If the breaker of the endpoint is open
+        DeadlineExceeded: If the request deadline has passed
+    """
+    deadline.check()
+    with (
+        weather_breakers[operation].guard(),
+        track_upstream(operation),
+        deadline.deadline_errors(),
+    ):
+        yield
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call to weather.com may succeed if made again."""
+    return is_upstream_failure(error) and not isinstance(error, CircuitOpenError)
+
+
+async def retry_weather_call(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Make an idempotent call to weather.com, retried on upstream failures while the
+    request deadline allows (see `deadline.retry`).
+
+    Args:
+        call: Coroutine function making the call through `weather_call`
+
+    Returns:
+        The result of the first successful attempt
+    """
+    return await deadline.retry(
+        call,
+        retries=settings.UPSTREAM_RETRIES,
+        base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+        max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+        is_retryable=is_retryable,
+    )
+
+
+class LatencyTracker:
+    """Durations of the recent calls to an endpoint, to derive percentiles."""
+
+    def __init__(self, size: int, min_samples: int):
+        """
+        Args:
+            size: Number of recent durations kept
+            min_samples: Min durations recorded before percentiles are given
+        """
+        self.min_samples = min_samples
+        self._durations: Deque[float] = deque(maxlen=size)
+        self._sorted: Optional[List[float]] = None
+
+    def observe(self, duration: float) -> None:
+        self._durations.append(duration)
+        self._sorted = None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the p-th percentile (nearest rank) of the durations, None if too few."""
+        if len(self._durations) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._durations)
+        rank = max(1, round(p / 100 * len(self._sorted)))
+        return self._sorted[min(rank, len(self._sorted)) - 1]
+
+    def clear(self) -> None:
+        self._durations.clear()
+        self._sorted = None
+
+
+async def hedged(
+    fetch: Callable[[], Awaitable[T]], delay: float, operation: str = ""
+) -> T:
+    """
+    Run `fetch`, and again if it has not completed after `delay` seconds.
+
+    The first call to succeed wins and the other is cancelled. If both fail, the
+    error of the first call is raised.
+
+    Args:
+        fetch: Coroutine function making the call
+        delay: Time to wait for the first call before hedging, in seconds
+        operation: Name of the call, for the hedge metrics
+
+    Returns:
+        The result of the first successful call
+    """
+    first = asyncio.ensure_future(fetch())
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(fetch())
+        pending.add(second)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    winner = "primary" if task is first else "hedge"
+                    upstream_hedges.labels(operation, winner).inc()
+                    return task.result()
+        upstream_hedges.labels(operation, "failed").inc()
+        raise first.exception()
+    finally:
+        for task in pending:
+            task.cancel()
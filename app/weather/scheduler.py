@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: allows `rate` calls per second with bursts of `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Wait for a token (in FIFO order).
+
+        Returns:
+            float: Time spent waiting, in seconds
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class FetchScheduler:
+    """Bound the upstream calls made concurrently and their rate.
+
+    Every call goes through a global concurrency cap, a per-host concurrency cap and
+    a per-host token bucket, so a burst of requests is smoothed out instead of
+    hammering the upstream host.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_concurrency_per_host: int,
+        rate: float,
+        burst: int,
+    ):
+        """
+        Args:
+            max_concurrency: Max calls running at the same time, all hosts included
+            max_concurrency_per_host: Max calls running at the same time per host
+            rate: Max calls started per second per host (0 for no limit)
+            burst: Number of calls that can be started at once before rate limiting
+        """
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_host = max_concurrency_per_host
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(max_concurrency_per_host)
+        )
+        self._buckets: Dict[str, TokenBucket] = defaultdict(
+            lambda: TokenBucket(rate, burst)
+        )
+
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+        self._throttled_seconds = 0.0
+
+    async def run(self, host: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run an upstream call once a slot and a token are available for its host.
+
+        Args:
+            host: Host the call is sent to
+            fetch: Coroutine function making the call
+
+        Returns:
+            The result of the call
+        """
+        self._waiting += 1
+        started = False
+        try:
+            async with self._semaphore, self._host_semaphores[host]:
+                self._throttled_seconds += await self._buckets[host].acquire()
+                self._waiting -= 1
+                started = True
+
+                self._running += 1
+                try:
+                    result = await fetch()
+                except Exception:
+                    self._failed += 1
+                    raise
+                finally:
+                    self._running -= 1
+                self._completed += 1
+                return result
+        finally:
+            if not started:
+                # Cancelled before the call could start
+                self._waiting -= 1
+
+    def stats(self) -> Dict[str, int | float]:
+        """Return scheduler usage counters."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_concurrency_per_host": self.max_concurrency_per_host,
+            "running": self._running,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "failed": self._failed,
+            "throttled_seconds": round(self._throttled_seconds, 6),
+        }
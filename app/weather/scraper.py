@@ -1,10 +1,16 @@
-import asyncio
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-import aiohttp
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import deadline
+from app.core.cache import TTLCache
+from app.core.config import settings
 
-from .city import get_city_info
 from .exceptions import InvalidLoginCredentials, WeatherScraperRequestError
+from .geocoding import resolve_city_infos
+from .http import get_session, request_timeout
+from .resilience import retry_weather_call, weather_call
 
 HEADERS = {
     "accept": "*/*",
@@ -23,11 +29,16 @@ HEADERS = {
     "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
 }
 
-WEATHER_API_URL = "https://upsx.weather.com"
+WEATHER_API_URL = settings.WEATHER_API_URL.rstrip("/")
 LOGIN_URL = f"{WEATHER_API_URL}/login"
 PREFERENCE_URL = f"{WEATHER_API_URL}/preference"
 LOGIN_INVALID_MESSAGE = "use a valid user ID and password"
 
+# Favorite cities per ID token, so that polling clients don't reach weather.com
+favorites_cache = TTLCache(
+    ttl=settings.FAVORITES_CACHE_TTL, max_size=settings.FAVORITES_CACHE_MAX_SIZE
+)
+
 
 class WeatherScraper:
     """A class to interact with the Weather.com API with authentication management."""
@@ -66,8 +77,10 @@ class WeatherScraper:
         """
         data = f'{{"email":"{email}","password":"{password}"}}'
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(LOGIN_URL, headers=HEADERS, data=data) as resp:
+        with weather_call("weather_login"):
+            async with get_session().post(
+                LOGIN_URL, headers=HEADERS, data=data, timeout=request_timeout()
+            ) as resp:
                 if resp.status != 200:
                     text = await resp.text()
                     if resp.status == 400 and LOGIN_INVALID_MESSAGE in text:
@@ -75,7 +88,8 @@ class WeatherScraper:
                             "Invalid email or password provided"
                         )
                     raise WeatherScraperRequestError(
-                        f"Request failed with status code {resp.status}: {text}"
+                        f"Request failed with status code {resp.status}: {text}",
+                        status=resp.status,
                     )
 
                 cookies = resp.cookies
@@ -161,22 +175,29 @@ class WeatherScraper:
             "id_token": self.id_token,
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                PREFERENCE_URL, cookies=cookies, headers=HEADERS
-            ) as resp:
-                if resp.status != 200:
-                    text = await resp.text()
-                    raise WeatherScraperRequestError(
-                        f"Failed to retrieve favorite cities. Status code: {resp.status}, Response: {text}"
-                    )
+        async def fetch_preferences():
+            with weather_call("weather_preferences_get"):
+                async with get_session().get(
+                    PREFERENCE_URL,
+                    cookies=cookies,
+                    headers=HEADERS,
+                    timeout=request_timeout(),
+                ) as resp:
+                    if resp.status != 200:
+                        text = await resp.text()
+                        raise WeatherScraperRequestError(
+                            f"Failed to retrieve favorite cities. Status code: {resp.status}, Response: {text}",
+                            status=resp.status,
+                        )
 
-                try:
-                    return await resp.json()
-                except (KeyError, ValueError) as e:
-                    raise WeatherScraperRequestError(
-                        f"Failed to parse preferences response: {str(e)}"
-                    )
+                    try:
+                        return await resp.json()
+                    except (KeyError, ValueError) as e:
+                        raise WeatherScraperRequestError(
+                            f"Failed to parse preferences response: {str(e)}"
+                        )
+
+        return await retry_weather_call(fetch_preferences)
 
     async def get_user_favorite_cities(self):
         """Retrieve the authenticated user's favorite cities from Weather.com.
@@ -214,11 +235,35 @@ class WeatherScraper:
         user_preferences = await self.get_user_preferences()
         return user_preferences.get("locations", [])
 
-    async def add_user_favorite_cities(self, city_names: List[str]) -> dict:
+    async def get_cached_user_favorite_cities(self) -> List[Dict]:
+        """Same as `get_user_favorite_cities`, served from the favorites cache when fresh.
+
+        Concurrent calls for the same user share a single preferences request, not
+        bound by the deadline of the request starting it. The cache is per worker: `add_user_favorite_cities` invalidates it in the worker
+        handling the change only, the others serve the previous favorites for up to
+        FAVORITES_CACHE_TTL (as they do after a change made on weather.com).
+
+        Returns:
+            List[Dict]: Copies of the cached locations, safe to update in place
+
+        Raises:
+            WeatherScraperRequestError: If the request fails or returns invalid data
+        """
+        self._check_authentication()
+        locations = await favorites_cache.get_or_fetch(
+            self.id_token,
+            lambda: deadline.without_deadline(self.get_user_favorite_cities()),
+        )
+        return [dict(location) for location in locations]
+
+    async def add_user_favorite_cities(
+        self, city_names: List[str], session: Optional[Session | AsyncSession] = None
+    ) -> dict:
         """Add multiple favorite cities to the user's preferences.
 
         Args:
             city_names (List[str]): List of city names to add
+            session (Optional[Session | AsyncSession]): Database session used to cache city lookups
 
         Returns:
             dict: The updated user preferences after adding the new cities
@@ -230,25 +275,16 @@ class WeatherScraper:
         preferences = await self.get_user_preferences()
         locations = preferences.get("locations", [])
 
-        # Get city infos in parallel
-        city_infos = await asyncio.gather(
-            *[get_city_info(city_name) for city_name in city_names],
-            return_exceptions=True,
-        )
-
-        # Filter out any failed city lookups and raise error if any failed
-        failed_cities = []
-        valid_city_infos = []
-        for city_name, city_info in zip(city_names, city_infos):
-            if isinstance(city_info, Exception) or not city_info:
-                failed_cities.append(city_name)
-            else:
-                valid_city_infos.append(city_info)
+        # Get city infos, with as few location searches as possible
+        search = await resolve_city_infos(city_names, session=session)
 
+        # Raise error if any lookup failed
+        failed_cities = [name for name in city_names if name not in search.found]
         if failed_cities:
             raise WeatherScraperRequestError(
                 f"Failed to find city info for: {', '.join(failed_cities)}"
             )
+        valid_city_infos = [search.found[name] for name in city_names]
 
         # Remove duplicates based on placeID
         existing_place_ids = {loc["placeID"] for loc in locations}
@@ -274,14 +310,20 @@ class WeatherScraper:
             "id_token": self.id_token,
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                PREFERENCE_URL, cookies=cookies, headers=HEADERS, json=preferences
+        with weather_call("weather_preferences_put"):
+            async with get_session().put(
+                PREFERENCE_URL,
+                cookies=cookies,
+                headers=HEADERS,
+                json=preferences,
+                timeout=request_timeout(),
             ) as resp:
                 if resp.status != 200:
                     text = await resp.text()
                     raise WeatherScraperRequestError(
-                        f"Failed to update favorite cities. Status code: {resp.status}, Response: {text}"
+                        f"Failed to update favorite cities. Status code: {resp.status}, Response: {text}",
+                        status=resp.status,
                     )
+        favorites_cache.invalidate(self.id_token)
 
         return locations
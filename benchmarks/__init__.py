@@ -0,0 +1 @@
+"""Load benchmarks of the API against local stand-ins of its upstream services."""
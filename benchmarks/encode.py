@@ -0,0 +1,169 @@
+"""
+Micro-benchmark of the response encoding of the list-heavy endpoints.
+
+Serves the same favorites and synced cities through small FastAPI apps declared
+like the routes before and after typed response models and orjson, and reports the
+time to encode a response per 1k cities, with the size of the body once compressed:
+
+    python -m benchmarks.encode --cities 1000 --repeat 50
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from app.api.routes.cities import favorites_content
+from app.core.compression import ENCODINGS, CompressionMiddleware
+from app.models import City, CityPublic, FavoriteCityWeather
+
+from .upstream import place_id, place_location, place_weather
+
+
+def favorites(cities: int) -> List[Dict]:
+    """Favorite cities with their weather, as returned by `get_city_weathers`."""
+    entries = []
+    for i in range(cities):
+        temperature, condition = place_weather(place_id(i))
+        entries.append(
+            {
+                **place_location(i),
+                "position": i,
+                "temperature_celsius": temperature,
+                "weather_condition": condition,
+                "observed_at": 1_700_000_000,
+                "status": "ok",
+            }
+        )
+    return entries
+
+
+def synced_cities(cities: int) -> List[City]:
+    return [
+        City(
+            id=uuid.uuid4(),
+            place_id=entry["placeID"],
+            name=entry["name"],
+            temperature=entry["temperature_celsius"],
+            weather_condition=entry["weather_condition"],
+        )
+        for entry in favorites(cities)
+    ]
+
+
+def before_app(favorite_cities: List[Dict], cities: List[City]) -> FastAPI:
+    """Routes declared as before: loose return types, default JSON response."""
+    app = FastAPI()
+
+    @app.get("/favorites")
+    async def get_favorites() -> List[Dict]:
+        return favorite_cities
+
+    @app.get("/sync")
+    async def sync():
+        return cities
+
+    return app
+
+
+def after_app(favorite_cities: List[Dict], cities: List[City]) -> FastAPI:
+    """Routes declared as in app.api.routes.cities."""
+    app = FastAPI()
+
+    @app.get(
+        "/favorites",
+        response_model=List[FavoriteCityWeather],
+        response_class=ORJSONResponse,
+    )
+    async def get_favorites():
+        return ORJSONResponse(favorites_content(favorite_cities))
+
+    @app.get("/sync", response_class=ORJSONResponse)
+    async def sync() -> List[CityPublic]:
+        return cities
+
+    return app
+
+
+async def call(app: Callable, path: str, accept_encoding: str = "") -> bytes:
+    """Send a GET request to an ASGI app and return the response body."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 1),
+        "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app: Callable, path: str, repeat: int, encoding: str = "") -> Dict:
+    body = await call(app, path, encoding)  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await call(app, path, encoding)
+    return {"ms": (time.perf_counter() - start) / repeat * 1000, "bytes": len(body)}
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    favorite_cities = favorites(args.cities)
+    cities = synced_cities(args.cities)
+    apps = {
+        "before": before_app(favorite_cities, cities),
+        "after": after_app(favorite_cities, cities),
+    }
+    per_1k = 1000 / args.cities
+
+    print(f"Encoding {args.cities} cities, {args.repeat} times (per 1k cities):")
+    for path in ("/favorites", "/sync"):
+        results = {
+            name: await measure(app, path, args.repeat) for name, app in apps.items()
+        }
+        before, after = results["before"], results["after"]
+        print(
+            f"{path:<11} before {before['ms'] * per_1k:>7.2f} ms"
+            f"  after {after['ms'] * per_1k:>7.2f} ms"
+            f"  ({before['ms'] / after['ms']:.1f}x faster)"
+            f"  {after['bytes'] * per_1k / 1024:.0f} KiB"
+        )
+
+    print("\nCompressed (after, including encoding):")
+    compressed = CompressionMiddleware(apps["after"], minimum_size=0)
+    for path in ("/favorites", "/sync"):
+        for encoding in ENCODINGS:
+            result = await measure(compressed, path, args.repeat, encoding)
+            print(
+                f"{path:<11} {encoding:<5} {result['ms'] * per_1k:>7.2f} ms"
+                f"  {result['bytes'] * per_1k / 1024:.0f} KiB"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cities", type=int, default=1000, help="Cities per response")
+    parser.add_argument("--repeat", type=int, default=50, help="Responses encoded")
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
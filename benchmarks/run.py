@@ -0,0 +1,369 @@
+"""
+End-to-end load benchmark of the API.
+
+Starts the fake weather.com/OpenAI upstream (see `benchmarks.upstream`) and the app
+on a fresh database, signs users up, then drives each endpoint with concurrent
+users for a fixed duration. Reports the latency percentiles, requests per second
+and upstream calls of each endpoint, and writes them as JSON to compare runs:
+
+    python -m benchmarks.run --users 50 --concurrency 50 --duration 10 \\
+        --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .upstream import (
+    FakeUpstream,
+    add_behavior_arguments,
+    place_id,
+    upstream_from_arguments,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+API = "/api/v1"
+PASSWORD = "benchmark-password"
+
+# (method, path, request keyword arguments) of a request made by a user
+Request = Tuple[str, str, Dict]
+
+
+class User:
+    def __init__(self, email: str):
+        self.email = email
+        self.token: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def bulk_weather_request(places: int, size: int) -> Callable[[User], Request]:
+    def request(user: User) -> Request:
+        indexes = random.sample(range(places), min(size, places))
+        return (
+            "POST",
+            "/cities/weather",
+            {"json": {"place_ids": list(map(place_id, indexes))}},
+        )
+
+    return request
+
+
+def endpoints(args: argparse.Namespace) -> Dict[str, Callable[[User], Request]]:
+    """Return the benchmarked endpoints, by name."""
+    question = {"question": "Is it a good day for a picnic?"}
+    return {
+        "favorites": lambda user: ("GET", "/cities/favorites", {}),
+        "sync": lambda user: ("POST", "/cities/favorites/sync", {}),
+        "weather": bulk_weather_request(args.places, args.bulk_size),
+        "summary": lambda user: ("POST", "/chat/summary", {}),
+        "summary_stream": lambda user: ("POST", "/chat/summary/stream", {}),
+        "ask": lambda user: ("POST", "/chat/ask", {"json": question}),
+        "ask_stream": lambda user: ("POST", "/chat/ask/stream", {"json": question}),
+        "ask_local": lambda user: (
+            "POST",
+            "/chat/ask",
+            {"json": {"question": "Which cities are sunny?"}},
+        ),
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Return the p-th percentile (nearest rank) of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_environment(
+    args: argparse.Namespace, upstream_url: str, database: Path
+) -> Dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "DATABASE_URL": f"sqlite:///{database}",
+        "WEATHER_URL": upstream_url,
+        "WEATHER_API_URL": upstream_url,
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "JWT_SECRET_KEY": "benchmark-secret-key-not-for-production",
+        # Background refreshes would add upstream calls to every endpoint
+        "WEATHER_REFRESH_ENABLED": "false",
+    }
+    for variable in args.env:
+        name, _, value = variable.partition("=")
+        env[name] = value
+    return env
+
+
+async def start_app(
+    args: argparse.Namespace, env: Dict
+) -> Tuple[subprocess.Popen, str]:
+    """Create the database, start the app and wait until it is healthy."""
+    subprocess.run(
+        [sys.executable, "scripts/init-db.py"],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 30
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}{API}/health") as response:
+                    if response.status == 200:
+                        return process, url
+            except aiohttp.ClientError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError("The app did not start")
+            await asyncio.sleep(0.2)
+
+
+async def sign_up(session: aiohttp.ClientSession, url: str, users: int) -> List[User]:
+    async def sign_up_user(index: int) -> User:
+        user = User(f"user{index}@benchmark.example.com")
+        credentials = {"email": user.email, "password": PASSWORD}
+        async with session.post(
+            f"{url}{API}/users/signup", json=credentials
+        ) as response:
+            response.raise_for_status()
+        form = {"username": user.email, "password": PASSWORD}
+        async with session.post(f"{url}{API}/users/login", data=form) as response:
+            response.raise_for_status()
+            user.token = (await response.json())["access_token"]
+        return user
+
+    return list(await asyncio.gather(*[sign_up_user(i) for i in range(users)]))
+
+
+async def run_endpoint(
+    session: aiohttp.ClientSession,
+    url: str,
+    request: Callable[[User], Request],
+    users: List[User],
+    concurrency: int,
+    duration: float,
+) -> Dict:
+    """Send requests from `concurrency` workers for `duration` seconds."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int) -> None:
+        while time.perf_counter() < deadline:
+            user = users[index % len(users)]
+            index += concurrency
+            method, path, kwargs = request(user)
+            start = time.perf_counter()
+            try:
+                async with session.request(
+                    method, f"{url}{API}{path}", headers=user.headers, **kwargs
+                ) as response:
+                    await response.read()
+                    statuses[str(response.status)] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    errors = sum(
+        count for status, count in statuses.items() if not status.startswith("2")
+    )
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": dict(statuses),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> Dict:
+    available = endpoints(args)
+    unknown = set(args.endpoints) - set(available)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    upstream: FakeUpstream = upstream_from_arguments(args)
+    upstream_url = await upstream.start()
+    process = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = app_environment(args, upstream_url, Path(directory) / "db.sqlite3")
+            process, url = await start_app(args, env)
+
+            connector = aiohttp.TCPConnector(limit=args.concurrency)
+            timeout = aiohttp.ClientTimeout(total=args.timeout)
+            async with aiohttp.ClientSession(
+                connector=connector, timeout=timeout
+            ) as session:
+                users = await sign_up(session, url, args.users)
+
+                results = {}
+                for name in args.endpoints:
+                    upstream.reset_stats()
+                    result = await run_endpoint(
+                        session,
+                        url,
+                        available[name],
+                        users,
+                        args.concurrency,
+                        args.duration,
+                    )
+                    results[name] = {**result, "upstream": upstream.stats()}
+                    print_result(name, results[name])
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        await upstream.stop()
+
+    config = {
+        name: value
+        for name, value in sorted(vars(args).items())
+        if name not in ("output", "baseline")
+    }
+    return {"config": config, "endpoints": results}
+
+
+def print_result(name: str, result: Dict) -> None:
+    latency = result["latency_ms"]
+    calls = ", ".join(
+        f"{k}={v}" for k, v in sorted(result["upstream"]["calls"].items())
+    )
+    print(
+        f"{name:<10} {result['requests']:>7} req {result['requests_per_second']:>9.2f} req/s"
+        f"  p50 {latency['p50']:>8.2f}  p95 {latency['p95']:>8.2f}"
+        f"  p99 {latency['p99']:>8.2f} ms  errors {result['errors']:>5}"
+        f"  upstream: {calls or '-'}"
+    )
+
+
+def print_comparison(baseline: Dict, report: Dict) -> None:
+    """Print the change of each endpoint's throughput and latency from a baseline."""
+    print("\nChange from baseline:")
+    for name, result in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            continue
+        metrics = [
+            ("req/s", before["requests_per_second"], result["requests_per_second"])
+        ]
+        metrics += [
+            (p, before["latency_ms"][p], result["latency_ms"][p])
+            for p in ("p50", "p95", "p99")
+        ]
+        changes = "  ".join(
+            f"{metric} {old:g} -> {new:g} ({(new - old) / old * 100:+.1f}%)"
+            if old
+            else f"{metric} {old:g} -> {new:g}"
+            for metric, old, new in metrics
+        )
+        print(f"{name:<10} {changes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="Users signed up")
+    parser.add_argument(
+        "--concurrency", type=int, default=20, help="Concurrent requests"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds per endpoint"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="Request timeout, seconds"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="App worker processes")
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        default=["favorites", "weather", "summary", "ask"],
+        help="Endpoints to benchmark, in order (favorites, sync, weather, summary, "
+        "summary_stream, ask, ask_stream, ask_local)",
+    )
+    parser.add_argument(
+        "--bulk-size", type=int, default=50, help="Places per bulk request"
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="App setting, e.g. --env SCRAPE_RATE_LIMIT=0 (repeatable)",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the report to this JSON file"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, help="Report of a previous run to compare"
+    )
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    if args.baseline:
+        print_comparison(json.loads(args.baseline.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Local stand-in for weather.com and the OpenAI Responses API.
+
+It serves the few endpoints the app calls, with deterministic data, a configurable
+latency and error rate, and counts the calls per endpoint. Run it on its own with:
+
+    python -m benchmarks.upstream --port 9000
+
+and point the app at it (WEATHER_URL, WEATHER_API_URL and OPENAI_BASE_URL).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+CONDITIONS = ["Sunny", "Partly Cloudy", "Cloudy", "Rain", "Light Rain", "Snow", "Fog"]
+
+LOCATION_SEARCH = "getSunV3LocationSearchUrlConfig"
+
+
+@dataclass
+class Behavior:
+    """How a fake service responds."""
+
+    latency: float = 0.0  # Base response time, in seconds
+    jitter: float = 0.0  # Random extra response time, up to this, in seconds
+    error_rate: float = 0.0  # Share of requests answered with a 503
+
+    async def delay(self) -> None:
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def place_id(index: int) -> str:
+    """Return the place ID of the index-th fake place."""
+    return hashlib.sha256(f"place-{index}".encode()).hexdigest()
+
+
+def place_location(index: int) -> Dict:
+    """Return the location of the index-th fake place, as weather.com stores it."""
+    return {
+        "name": f"City {index}, Region, Country",
+        "coordinate": f"{index % 90}.00,{index % 180}.00",
+        "placeID": place_id(index),
+    }
+
+
+def place_weather(place_id: str) -> tuple[int, str]:
+    """Return the (temperature, condition) of a place, stable for a given ID."""
+    digest = hashlib.sha256(place_id.encode()).digest()
+    return digest[0] % 40 - 5, CONDITIONS[digest[1] % len(CONDITIONS)]
+
+
+class FakeUpstream:
+    """Emulates the weather.com and OpenAI endpoints used by the app."""
+
+    def __init__(
+        self,
+        places: int = 200,
+        favorites: int = 10,
+        weather: Optional[Behavior] = None,
+        llm: Optional[Behavior] = None,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            places: Number of distinct places known to the location search
+            favorites: Number of favorite places of each user
+            weather: Behavior of the weather.com endpoints
+            llm: Behavior of the Responses API
+            seed: Seed of the favorites drawn for each user
+        """
+        self.places = places
+        self.favorites = min(favorites, places)
+        self.weather = weather or Behavior()
+        self.llm = llm or Behavior()
+        self.seed = seed
+
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._preferences: Dict[str, Dict] = {}  # id_token -> preferences
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes(
+            [
+                web.post("/login", self.login),
+                web.get("/preference", self.get_preference),
+                web.put("/preference", self.put_preference),
+                web.post("/api/v1/p/redux-dal", self.location_search),
+                web.get("/weather/today/l/{place_id}", self.weather_page),
+                web.post("/v1/responses", self.responses),
+                web.get("/_stats", self.get_stats),
+            ]
+        )
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving, return the base URL (a free port is picked if 0)."""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the calls and errors per endpoint."""
+        return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+    def reset_stats(self) -> None:
+        self.calls.clear()
+        self.errors.clear()
+
+    async def _respond(self, name: str, behavior: Behavior) -> Optional[web.Response]:
+        # Count the call, wait, and return an error response if the call fails
+        self.calls[name] += 1
+        await behavior.delay()
+        if behavior.fails():
+            self.errors[name] += 1
+            return web.Response(status=503, text="Service Unavailable")
+        return None
+
+    # weather.com
+
+    async def login(self, request: web.Request) -> web.Response:
+        if error := await self._respond("login", self.weather):
+            return error
+
+        credentials = json.loads(await request.text())
+        id_token = hashlib.sha256(credentials["email"].encode()).hexdigest()
+        response = web.json_response({"status": "ok"})
+        for name in ("access_token", "id_token", "refresh_token"):
+            response.set_cookie(name, f"{name}-{id_token}")
+        return response
+
+    def _user_preferences(self, id_token: str) -> Dict:
+        if id_token not in self._preferences:
+            rng = random.Random(f"{self.seed}-{id_token}")
+            indexes = rng.sample(range(self.places), self.favorites)
+            locations = [
+                {**place_location(index), "position": position}
+                for position, index in enumerate(indexes, start=1)
+            ]
+            self._preferences[id_token] = {
+                "userID": id_token[:32],
+                "locations": locations,
+                "locale": "en-US",
+                "unit": "Metric",
+                "dashboard": [],
+            }
+        return self._preferences[id_token]
+
+    async def get_preference(self, request: web.Request) -> web.Response:
+        if error := await self._respond("preference_get", self.weather):
+            return error
+        id_token = request.cookies.get("id_token")
+        if not id_token:
+            return web.Response(status=401, text="Unauthorized")
+        return web.json_response(self._user_preferences(id_token))
+
+    async def put_preference(self, request: web.Request) -> web.Response:
+        if error := await self._respond("preference_put", self.weather):
+            return error
+        id_token = request.cookies.get("id_token")
+        if not id_token:
+            return web.Response(status=401, text="Unauthorized")
+        self._preferences[id_token] = await request.json()
+        return web.json_response(self._preferences[id_token])
+
+    async def location_search(self, request: web.Request) -> web.Response:
+        if error := await self._respond("location_search", self.weather):
+            return error
+
+        results = {}
+        for query in await request.json():
+            params = query["params"]
+            # "City 12" and "City 12, Region, Country" both find the 12th place
+            digits = "".join(c for c in params["query"].split(",")[0] if c.isdigit())
+            key = (
+                f"language:{params['language']};locationType:{params['locationType']};"
+                f"query:{params['query']}"
+            )
+            if not digits or int(digits) >= self.places:
+                results[key] = {"data": None}
+                continue
+            location = place_location(int(digits))
+            latitude, longitude = location["coordinate"].split(",")
+            results[key] = {
+                "data": {
+                    "location": {
+                        "address": [location["name"]],
+                        "latitude": [float(latitude)],
+                        "longitude": [float(longitude)],
+                        "placeId": [location["placeID"]],
+                    }
+                }
+            }
+        return web.json_response({"dal": {LOCATION_SEARCH: results}})
+
+    async def weather_page(self, request: web.Request) -> web.Response:
+        if error := await self._respond("weather_page", self.weather):
+            return error
+
+        temperature, condition = place_weather(request.match_info["place_id"])
+        html = (
+            "<html><body>"
+            f"<span data-testid='TemperatureValue'>{temperature}°</span>"
+            f"<div data-testid='wxPhrase'>{condition}</div>"
+            "</body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    # OpenAI Responses API
+
+    async def responses(self, request: web.Request) -> web.StreamResponse:
+        if error := await self._respond("responses", self.llm):
+            return error
+
+        body = await request.json()
+        input_tokens = len(json.dumps(body["input"])) // 4
+        # Structured outputs (`responses.parse`) expect JSON matching the schema
+        if body.get("text", {}).get("format", {}).get("type") == "json_schema":
+            text = json.dumps({"answer": "It is sunny.", "matching_cities": []})
+        else:
+            text = "The weather is mostly pleasant across your favorite cities."
+        response = build_response(text, input_tokens)
+
+        if body.get("stream"):
+            return await stream_response(request, response, text)
+        return web.json_response(response)
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+
+def build_response(text: str, input_tokens: int) -> Dict:
+    """Build a completed Responses API response whose output is a text message."""
+    output_tokens = len(text) // 4
+    return {
+        "id": f"resp_{time.time_ns()}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "gpt-4o-mini",
+        "status": "completed",
+        "output": [
+            {
+                "id": "msg_0",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def stream_events(response: Dict, text: str) -> List[Dict]:
+    """Return the Server-Sent Events of a streamed Responses API response."""
+    message = response["output"][0]
+    part = {"type": "output_text", "text": "", "annotations": []}
+    ids = {"item_id": message["id"], "output_index": 0}
+
+    events = [
+        {"type": "response.created", "response": {**response, "output": []}},
+        {
+            "type": "response.output_item.added",
+            "output_index": 0,
+            "item": {**message, "status": "in_progress", "content": []},
+        },
+        {
+            "type": "response.content_part.added",
+            **ids,
+            "content_index": 0,
+            "part": part,
+        },
+    ]
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        delta = word if i == len(words) - 1 else f"{word} "
+        events.append(
+            {
+                "type": "response.output_text.delta",
+                **ids,
+                "content_index": 0,
+                "delta": delta,
+                "logprobs": [],
+            }
+        )
+    events += [
+        {
+            "type": "response.output_text.done",
+            **ids,
+            "content_index": 0,
+            "text": text,
+            "logprobs": [],
+        },
+        {
+            "type": "response.content_part.done",
+            **ids,
+            "content_index": 0,
+            "part": {**part, "text": text},
+        },
+        {"type": "response.output_item.done", "output_index": 0, "item": message},
+        {"type": "response.completed", "response": response},
+    ]
+    for sequence_number, event in enumerate(events):
+        event["sequence_number"] = sequence_number
+    return events
+
+
+async def stream_response(
+    request: web.Request, response: Dict, text: str
+) -> web.StreamResponse:
+    stream = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await stream.prepare(request)
+    for event in stream_events(response, text):
+        await stream.write(
+            f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+        )
+    await stream.write_eof()
+    return stream
+
+
+def add_behavior_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments configuring the fake upstream to a parser."""
+    parser.add_argument("--places", type=int, default=200, help="Distinct places")
+    parser.add_argument("--favorites", type=int, default=10, help="Favorites per user")
+    parser.add_argument("--weather-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--weather-jitter", type=float, default=0.05, help="seconds")
+    parser.add_argument("--weather-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="seconds")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def upstream_from_arguments(args: argparse.Namespace) -> FakeUpstream:
+    return FakeUpstream(
+        places=args.places,
+        favorites=args.favorites,
+        weather=Behavior(
+            args.weather_latency, args.weather_jitter, args.weather_error_rate
+        ),
+        llm=Behavior(args.llm_latency, args.llm_jitter, args.llm_error_rate),
+        seed=args.seed,
+    )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    upstream = upstream_from_arguments(args)
+    url = await upstream.start(args.host, args.port)
+    print(f"Fake upstream listening on {url} (call counts at {url}/_stats)")
+    print(f"  WEATHER_URL={url} WEATHER_API_URL={url} OPENAI_BASE_URL={url}/v1")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstream.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    add_behavior_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
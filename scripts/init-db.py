@@ -2,6 +2,7 @@ import logging
 import os
 from pathlib import Path
 
+from sqlalchemy.engine import make_url
 from sqlmodel import Session
 
 # Set up test environment variables BEFORE any app imports
@@ -25,8 +26,8 @@ logger = logging.getLogger(__name__)
 
 
 def drop_db() -> None:
-    # Extract the database path from the URL (remove sqlite:/// prefix)
-    db_path = Path(settings.DATABASE_URL.replace("sqlite:///", ""))
+    # Extract the database path from the URL (sqlite:///, sqlite+aiosqlite:///...)
+    db_path = Path(make_url(settings.DATABASE_URL).database)
     if db_path.exists():
         logger.info(f"Dropping database at {db_path}")
         os.remove(db_path)
@@ -48,3 +48,7 @@ curl -X POST $BASE_URL/chat/summary -H "Authorization: Bearer $TOKEN"
 # Step 9: Ask a specific weather-related question
 step "9" "Asking Weather Question"
 curl -X POST $BASE_URL/chat/ask -H "Authorization: Bearer $TOKEN" -H "Content-Type: application/json" -d '{"question": "Which cities have sunny weather now so that I can go sunbathing?"}'
+
+# Step 10: Stream the weather summary as Server-Sent Events (progress, tokens, result)
+step "10" "Streaming Weather Summary"
+curl -N -X POST $BASE_URL/chat/summary/stream -H "Authorization: Bearer $TOKEN"
@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.tracing import slow_traces
+from app.main import app
+from app.models import User
+from app.weather.resilience import weather_breakers
+
+
+@pytest.fixture(autouse=True)
+def override_dependencies(client: TestClient, monkeypatch):
+    app.dependency_overrides[get_current_user] = lambda: User(
+        email="admin@example.com", hashed_password="hashed"
+    )
+    monkeypatch.setattr(settings, "ADMIN_EMAILS", ["admin@example.com"])
+    slow_traces.clear()
+    yield
+    slow_traces.clear()
+
+
+def test_get_slow_traces(client: TestClient):
+    slow_traces.extend([{"name": "GET /a"}, {"name": "GET /b"}])
+
+    response = client.get("/api/v1/admin/traces", params={"limit": 1})
+
+    assert response.status_code == 200
+    assert response.json() == [{"name": "GET /b"}]
+
+
+def test_get_slow_traces_not_admin(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_EMAILS", [])
+
+    response = client.get("/api/v1/admin/traces")
+
+    assert response.status_code == 403
+
+
+def test_server_timing_header(client: TestClient):
+    response = client.get("/api/v1/health")
+
+    assert "total;dur=" in response.headers["server-timing"]
+
+
+def test_get_circuit_breakers(client: TestClient):
+    with weather_breakers["weather_page"].guard():
+        pass
+
+    response = client.get("/api/v1/admin/breakers")
+
+    assert response.status_code == 200
+    assert response.json()["weather_page"]["state"] == "closed"
+    assert response.json()["weather_page"]["recent_calls"] == 1
@@ -0,0 +1,140 @@
+import json
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user, get_weather_agent
+from app.chat.chat import AskResponse
+from app.main import app
+from app.models import User
+
+FAVORITE_CITIES = [
+    {"name": "London, UK", "placeID": "london-uk"},
+    {"name": "Paris, France", "placeID": "paris-fr"},
+]
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    """Parse a Server-Sent Events body into (event, data) tuples."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def weather_agent():
+    return Mock()
+
+
+@pytest.fixture(autouse=True)
+def override_dependencies(client: TestClient, weather_agent):
+    app.dependency_overrides[get_current_user] = lambda: User(
+        email="test@example.com", hashed_password="hashed", weather_id_token="token"
+    )
+    app.dependency_overrides[get_weather_agent] = lambda: weather_agent
+    with (
+        patch("app.api.routes.chat.WeatherScraper") as mock_scraper,
+        patch("app.weather.city.get_city_weather") as mock_get_city_weather,
+    ):
+        mock_scraper.return_value.get_user_favorite_cities = AsyncMock(
+            side_effect=lambda: [dict(city) for city in FAVORITE_CITIES]
+        )
+        mock_get_city_weather.side_effect = lambda place_id: {
+            "placeID": place_id,
+            "temperature_celsius": 20,
+            "weather_condition": "sunny",
+        }
+        yield
+
+
+def test_stream_summary(client: TestClient, weather_agent):
+    async def astream_summary(weather_data):
+        assert [city.city for city in weather_data] == ["London, UK", "Paris, France"]
+        yield "Sunny "
+        yield "everywhere."
+
+    weather_agent.astream_summary = astream_summary
+
+    response = client.post("/api/v1/chat/summary/stream")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    progress = [data for event, data in events if event == "progress"]
+    assert progress[0] == {"phase": "weather", "done": 0, "total": 2}
+    assert {"done": 2, "total": 2}.items() <= progress[2].items()
+    assert [data["text"] for event, data in events if event == "token"] == [
+        "Sunny ",
+        "everywhere.",
+    ]
+    assert events[-1] == ("result", {"summary": "Sunny everywhere."})
+
+
+def test_stream_ask(client: TestClient, weather_agent):
+    async def astream_ask(question, weather_data):
+        yield '{"answer": "'
+        yield AskResponse(answer="Sunny in London.", matching_cities=["London, UK"])
+
+    weather_agent.astream_ask = astream_ask
+
+    response = client.post(
+        "/api/v1/chat/ask/stream",
+        json={"question": "Is it a good day for a picnic in London?"},
+    )
+
+    events = parse_events(response.text)
+    assert ("token", {"text": '{"answer": "'}) in events
+    assert events[-1] == (
+        "result",
+        {
+            "answer": "Sunny in London.",
+            "matching_cities": ["London, UK"],
+            "source": "llm",
+        },
+    )
+
+
+def test_ask_answered_locally(client: TestClient, weather_agent):
+    weather_agent.aask = AsyncMock()
+
+    response = client.post("/api/v1/chat/ask", json={"question": "Where is it sunny?"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["matching_cities"] == ["London, UK", "Paris, France"]
+    assert data["source"] == "local"
+    weather_agent.aask.assert_not_called()
+
+
+def test_ask_falls_back_to_llm(client: TestClient, weather_agent):
+    weather_agent.aask = AsyncMock(
+        return_value=AskResponse(answer="Yes.", matching_cities=["London, UK"])
+    )
+
+    response = client.post(
+        "/api/v1/chat/ask", json={"question": "Should I take an umbrella?"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "answer": "Yes.",
+        "matching_cities": ["London, UK"],
+        "source": "llm",
+    }
+
+
+def test_stream_summary_error(client: TestClient, weather_agent):
+    async def astream_summary(weather_data):
+        raise Exception("API Error")
+        yield
+
+    weather_agent.astream_summary = astream_summary
+
+    response = client.post("/api/v1/chat/summary/stream")
+
+    event, data = parse_events(response.text)[-1]
+    assert event == "error"
+    assert "API Error" in data["detail"]
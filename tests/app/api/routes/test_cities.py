@@ -0,0 +1,248 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.deps import get_current_user
+from app.api.routes.cities import favorites_content
+from app.core.config import settings
+from app.main import app
+from app.models import User
+from app.repository import save_weather_observations
+from app.weather.city import weather_cache
+from app.weather.exceptions import WeatherScraperRequestError
+
+
+@pytest.fixture(autouse=True)
+def override_dependencies(client: TestClient, db_session: Session, monkeypatch):
+    app.dependency_overrides[get_current_user] = lambda: User(
+        email="test@example.com", hashed_password="hashed", weather_id_token="token"
+    )
+
+    @asynccontextmanager
+    async def open_session():
+        yield db_session
+
+    monkeypatch.setattr("app.api.routes.cities.open_session", open_session)
+    yield
+
+
+def test_get_observations_streams_range(
+    client: TestClient, db_session: Session, monkeypatch
+):
+    monkeypatch.setattr(settings, "OBSERVATION_PAGE_SIZE", 2)
+    save_weather_observations(
+        session=db_session,
+        observations=[
+            {
+                "place_id": "london-uk",
+                "observed_at": observed_at,
+                "temperature": 12,
+                "weather_condition": "rain",
+            }
+            for observed_at in range(1000, 1600, 100)
+        ],
+    )
+
+    response = client.get(
+        "/api/v1/cities/london-uk/observations", params={"start": 1100, "end": 1500}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["observed_at"] for line in lines] == [1100, 1200, 1300, 1400]
+    assert lines[0] == {
+        "observed_at": 1100,
+        "temperature": 12,
+        "weather_condition": "rain",
+    }
+
+
+def test_get_observations_empty(client: TestClient):
+    response = client.get("/api/v1/cities/atlantis/observations")
+
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+def test_get_weathers_columnar(client: TestClient):
+    async def get_city_weather(place_id):
+        if place_id == "atlantis":
+            raise WeatherScraperRequestError("Not found")
+        return {
+            "placeID": place_id,
+            "temperature_celsius": 20,
+            "weather_condition": "sunny",
+            "observed_at": 1000,
+        }
+
+    with patch(
+        "app.weather.city.get_city_weather", AsyncMock(side_effect=get_city_weather)
+    ) as mock_get_city_weather:
+        response = client.post(
+            "/api/v1/cities/weather",
+            json={"place_ids": ["london-uk", "atlantis", "paris-fr", "london-uk"]},
+        )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "placeID": ["london-uk", "atlantis", "paris-fr"],
+        "status": ["ok", "error", "ok"],
+        "temperature_celsius": [20, None, 20],
+        "weather_condition": ["sunny", None, "sunny"],
+        "observed_at": [1000, None, 1000],
+        "error": [None, "Not found", None],
+    }
+    # Duplicates are fetched once
+    assert mock_get_city_weather.await_count == 3
+
+
+def test_get_weathers_deadline(client: TestClient):
+    async def get_city_weather(place_id):
+        if place_id == "atlantis":
+            await asyncio.sleep(0.2)
+        return {"placeID": place_id, "temperature_celsius": 20}
+
+    with patch(
+        "app.weather.city.get_city_weather", AsyncMock(side_effect=get_city_weather)
+    ):
+        response = client.post(
+            "/api/v1/cities/weather",
+            json={"place_ids": ["london-uk", "atlantis"]},
+            headers={"X-Request-Timeout": "0.05"},
+        )
+
+    # The weather that arrived in time
+    assert response.status_code == 504
+    assert response.headers["cache-control"] == "no-store"
+    assert response.json()["status"] == ["ok", "error"]
+    assert response.json()["error"] == [None, "Deadline exceeded"]
+
+    response = client.post(
+        "/api/v1/cities/weather",
+        json={"place_ids": ["london-uk"]},
+        headers={"X-Request-Timeout": "0"},
+    )
+    assert response.status_code == 422
+
+
+def test_get_weathers_empty(client: TestClient):
+    response = client.post("/api/v1/cities/weather", json={"place_ids": []})
+
+    assert response.status_code == 422
+
+
+def test_get_favorites_typed(client: TestClient):
+    locations = [
+        {"name": "London", "coordinate": "51.51,-0.13", "placeID": "london-uk"},
+        {"name": "Atlantis", "placeID": "atlantis", "position": 2, "extra": "x"},
+    ]
+
+    async def get_city_weather(place_id):
+        if place_id == "atlantis":
+            raise WeatherScraperRequestError("Not found")
+        return {
+            "placeID": place_id,
+            "temperature_celsius": 20,
+            "weather_condition": "sunny",
+            "observed_at": 1000,
+        }
+
+    with (
+        patch(
+            "app.api.routes.cities.WeatherScraper.get_user_favorite_cities",
+            AsyncMock(return_value=locations),
+        ),
+        patch(
+            "app.weather.city.get_city_weather",
+            AsyncMock(side_effect=get_city_weather),
+        ),
+    ):
+        response = client.get("/api/v1/cities/favorites")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == [
+        {
+            "placeID": "london-uk",
+            "name": "London",
+            "coordinate": "51.51,-0.13",
+            "position": None,
+            "status": "ok",
+            "temperature_celsius": 20,
+            "weather_condition": "sunny",
+            "observed_at": 1000,
+            "error": None,
+        },
+        {
+            "placeID": "atlantis",
+            "name": "Atlantis",
+            "coordinate": None,
+            "position": 2,
+            "status": "error",
+            "temperature_celsius": None,
+            "weather_condition": None,
+            "observed_at": None,
+            "error": "Not found",
+        },
+    ]
+    # Extra location keys are dropped, the response model documents the body
+    schema = client.get("/openapi.json").json()["paths"]["/api/v1/cities/favorites"]
+    response_schema = schema["get"]["responses"]["200"]["content"]["application/json"]
+    assert response_schema["schema"]["items"]["$ref"].endswith("/FavoriteCityWeather")
+
+
+def test_get_favorites_not_modified(client: TestClient):
+    locations = [{"name": "London", "placeID": "london-uk", "position": 1}]
+    weather = {
+        "placeID": "london-uk",
+        "temperature_celsius": 20,
+        "weather_condition": "sunny",
+        "observed_at": 1000,
+    }
+
+    with (
+        patch(
+            "app.api.routes.cities.WeatherScraper.get_user_favorite_cities",
+            AsyncMock(return_value=locations),
+        ) as mock_get_favorites,
+        patch(
+            "app.weather.city.get_city_weather", AsyncMock(return_value=weather)
+        ) as mock_get_city_weather,
+    ):
+        response = client.get("/api/v1/cities/favorites")
+        etag = response.headers["etag"]
+        assert response.status_code == 200
+        assert etag.startswith('W/"')
+        # Revalidated at each use, the favorites may change
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        with patch(
+            "app.api.routes.cities.favorites_content", wraps=favorites_content
+        ) as mock_favorites_content:
+            response = client.get(
+                "/api/v1/cities/favorites",
+                headers={"If-None-Match": f'"other", {etag}'},
+            )
+        assert response.status_code == 304
+        # The body is not built for a client having the current version
+        mock_favorites_content.assert_not_called()
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+        # The favorites and the weather were served from the caches
+        assert mock_get_favorites.await_count == 1
+        assert mock_get_city_weather.await_count == 1
+
+        # A new observation changes the version
+        weather_cache.set("london-uk", {**weather, "observed_at": 2000})
+        response = client.get(
+            "/api/v1/cities/favorites", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[0]["observed_at"] == 2000
@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+
+
+def test_metrics(client: TestClient):
+    client.get("/api/v1/health")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    # Requests are labelled with their route template
+    assert any(
+        line.startswith(
+            'http_request_duration_seconds_count{method="GET",route="/api/v1/health",'
+            'status="200"}'
+        )
+        for line in lines
+    )
+    assert "# TYPE cache_lookups_total counter" in lines
+    assert any(
+        line.startswith('cache_lookups_total{cache="weather",result="miss"}')
+        for line in lines
+    )
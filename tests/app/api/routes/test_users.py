@@ -1,9 +1,19 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app import async_repository
+from app.core.auth import create_access_token, pwd_context
 from app.models import User, UserSignup
-from app.repository import get_user_by_email
+from app.repository import (
+    create_user,
+    get_user_by_email,
+    update_user_weather_id_token,
+)
 
 
 def test_register_user_success(client: TestClient, db_session: Session):
@@ -26,6 +36,24 @@ def test_register_user_success(client: TestClient, db_session: Session):
     assert user.email == user_data.email
 
 
+def test_register_user_hashes_off_event_loop(client: TestClient):
+    """bcrypt must not block the event loop serving the requests."""
+    threads = []
+
+    def get_password_hash(password):
+        threads.append(threading.current_thread().name)
+        return pwd_context.hash(password)
+
+    with patch("app.core.auth.get_password_hash", get_password_hash):
+        response = client.post(
+            "/api/v1/users/signup",
+            json={"email": "test@example.com", "password": "testpassword123"},
+        )
+
+    assert response.status_code == 200
+    assert threads[0].startswith("password-hash")
+
+
 def test_register_user_duplicate_email(client: TestClient, db_session: Session):
     """Test registration with an email that already exists."""
     # Arrange
@@ -57,6 +85,39 @@ def test_register_user_invalid_email(client: TestClient, db_session: Session):
     assert response.status_code == 422  # Validation error
 
 
+def test_current_user_is_cached(client: TestClient, db_session: Session):
+    """Test authenticated requests don't query the user again until it changes."""
+    user = create_user(
+        session=db_session, email="test@example.com", hashed_password="x"
+    )
+    token = create_access_token(user.id, expires_delta=timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with patch(
+        "app.api.deps.async_repository.get_user_by_id",
+        wraps=async_repository.get_user_by_id,
+    ) as mock_get_user:
+        assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+        assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+        assert mock_get_user.await_count == 1
+
+        # Updating the user invalidates its cache entry
+        update_user_weather_id_token(
+            session=db_session, user_id=user.id, weather_id_token="token"
+        )
+        assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+        assert mock_get_user.await_count == 2
+
+
+def test_invalid_token_not_cached(client: TestClient):
+    """Test invalid tokens are rejected every time."""
+    headers = {"Authorization": "Bearer invalid"}
+
+    for _ in range(2):
+        response = client.get("/api/v1/users/me", headers=headers)
+        assert response.status_code == 403
+
+
 @pytest.fixture(autouse=True)
 def cleanup_database(db_session: Session):
     """Clean up the database after each test."""
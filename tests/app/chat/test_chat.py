@@ -1,15 +1,21 @@
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
+import httpx
+import openai
 import pytest
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
+from app.chat.cache import LLMResponseCache
 from app.chat.chat import (
     AskResponse,
     WeatherAgent,
     WeatherAgentError,
     WeatherData,
+    build_budgeted_weather_context,
     build_weather_context,
+    estimate_tokens,
 )
+from app.core import deadline
 
 # Test data
 SAMPLE_WEATHER_DATA = [
@@ -29,15 +35,29 @@ def mock_openai_client():
 
 
 @pytest.fixture
-def weather_agent(mock_openai_client):
+def mock_async_openai_client():
+    """Create a mock AsyncOpenAI client for testing."""
+    with patch("app.chat.chat.AsyncOpenAI") as mock_client:
+        mock_instance = Mock(spec=AsyncOpenAI)
+        mock_instance.responses = Mock()
+        mock_instance.responses.create = AsyncMock()
+        mock_instance.responses.parse = AsyncMock()
+        mock_client.return_value = mock_instance
+        yield mock_instance
+
+
+@pytest.fixture
+def weather_agent(mock_openai_client, mock_async_openai_client):
     """Create a WeatherAgent instance with mocked OpenAI client."""
     return WeatherAgent(openai_api_key="test-key")
 
 
 def test_weather_agent_initialization():
     """Test WeatherAgent initialization."""
-    agent = WeatherAgent(openai_api_key="test-key")
+    agent = WeatherAgent(openai_api_key="test-key", timeout=5)
     assert isinstance(agent.client, OpenAI)
+    assert isinstance(agent.async_client, AsyncOpenAI)
+    assert agent.async_client.timeout == 5
 
 
 def test_build_weather_context():
@@ -54,6 +74,69 @@ def test_build_weather_context_empty_list():
     assert build_weather_context([]) == ""
 
 
+def many_cities(count: int) -> list[WeatherData]:
+    conditions = ["Sunny", "Cloudy", "Light Rain"]
+    return [
+        WeatherData(
+            city=f"City {i:03d}",
+            weather_condition=conditions[i % 3],
+            temperature=float(i % 30),
+        )
+        for i in range(count)
+    ]
+
+
+def test_build_budgeted_weather_context_within_budget():
+    """Small contexts are not compacted."""
+    context = build_budgeted_weather_context(SAMPLE_WEATHER_DATA, token_budget=1000)
+
+    assert context.text == build_weather_context(SAMPLE_WEATHER_DATA)
+    assert (context.listed, context.grouped, context.omitted) == (3, 0, 0)
+
+
+def test_build_budgeted_weather_context_groups_cities():
+    """Large contexts are grouped by condition and temperature band."""
+    cities = many_cities(300)
+    assert estimate_tokens(build_weather_context(cities)) > 2000
+
+    context = build_budgeted_weather_context(cities, token_budget=2000)
+
+    assert context.tokens <= 2000
+    assert context.listed == 0
+    assert context.grouped + context.omitted == 300
+    assert "- Sunny, 0 to 5°C: City 000, City 003" in context.text
+    # Deterministic whatever the input order
+    shuffled = cities[1::2] + cities[::2]
+    assert build_budgeted_weather_context(shuffled, token_budget=2000) == context
+
+
+def test_build_budgeted_weather_context_truncates():
+    """Cities that don't fit the budget are omitted and counted."""
+    context = build_budgeted_weather_context(many_cities(300), token_budget=100)
+
+    assert context.tokens <= 100
+    assert context.omitted > 0
+    assert context.text.endswith(f"- ... and {context.omitted} more cities")
+
+
+def test_build_budgeted_weather_context_lists_relevant_cities():
+    """Cities named by the question or with the conditions it asks about come first."""
+    cities = many_cities(300) + [
+        WeatherData(city="Oslo, Norway", weather_condition="Snow", temperature=-3)
+    ]
+
+    context = build_budgeted_weather_context(
+        cities, question="Is it snowing in Oslo or City 005?", token_budget=500
+    )
+
+    lines = context.text.split("\n")
+    assert lines[:2] == [
+        "- City 005: Light Rain, 5.0°C",
+        "- Oslo, Norway: Snow, -3.0°C",
+    ]
+    assert context.listed == 2
+
+
 def test_summarize_success(weather_agent, mock_openai_client):
     """Test successful weather summary generation."""
     mock_response = Mock()
@@ -119,3 +202,142 @@ def test_ask_api_error(weather_agent, mock_openai_client):
         weather_agent.ask("What's the weather like?", SAMPLE_WEATHER_DATA)
 
     assert "Failed to generate weather response" in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+async def test_asummarize_success(weather_agent, mock_async_openai_client):
+    """Test successful async weather summary generation."""
+    mock_response = Mock()
+    mock_response.output = [
+        Mock(content=[Mock(text="It's a mixed bag of weather across Europe.")])
+    ]
+    mock_async_openai_client.responses.create.return_value = mock_response
+
+    result = await weather_agent.asummarize(SAMPLE_WEATHER_DATA)
+
+    assert result == "It's a mixed bag of weather across Europe."
+    mock_async_openai_client.responses.create.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_asummarize_api_error(weather_agent, mock_async_openai_client):
+    """Test async summarize when API call fails."""
+    mock_async_openai_client.responses.create.side_effect = Exception("API Error")
+
+    with pytest.raises(WeatherAgentError) as exc_info:
+        await weather_agent.asummarize(SAMPLE_WEATHER_DATA)
+
+    assert "Failed to generate weather summary" in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+async def test_asummarize_deadline(weather_agent, mock_async_openai_client):
+    """Under a deadline, requests time out with it and are retried by the agent."""
+    mock_async_openai_client.with_options.return_value = mock_async_openai_client
+    mock_response = Mock()
+    mock_response.output = [Mock(content=[Mock(text="Sunny.")])]
+    mock_async_openai_client.responses.create.side_effect = [
+        openai.APIConnectionError(request=httpx.Request("POST", "http://test")),
+        mock_response,
+    ]
+
+    deadline.start(10)
+    with patch("app.core.deadline.asyncio.sleep", AsyncMock()):
+        result = await weather_agent.asummarize(SAMPLE_WEATHER_DATA)
+
+    assert result == "Sunny."
+    assert mock_async_openai_client.responses.create.await_count == 2
+    options = mock_async_openai_client.with_options.call_args.kwargs
+    assert options["max_retries"] == 0
+    assert options["timeout"] <= 10
+
+    # No request once the deadline has passed
+    deadline.start(-1)
+    with pytest.raises(deadline.DeadlineExceeded):
+        await weather_agent.aask("Is it sunny?", SAMPLE_WEATHER_DATA)
+    mock_async_openai_client.responses.parse.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_aask_success(weather_agent, mock_async_openai_client):
+    """Test successful async weather question answering."""
+    mock_response = Mock()
+    mock_response.output_parsed = AskResponse(
+        answer="London is rainy at 15.5°C", matching_cities=["London"]
+    )
+    mock_async_openai_client.responses.parse.return_value = mock_response
+
+    result = await weather_agent.aask(
+        "What's the weather like in London?", SAMPLE_WEATHER_DATA
+    )
+
+    assert result.matching_cities == ["London"]
+    mock_async_openai_client.responses.parse.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_asummarize_uses_cache(mock_openai_client, mock_async_openai_client):
+    """Test identical summary requests call the model only once."""
+    agent = WeatherAgent(
+        openai_api_key="test-key", cache=LLMResponseCache(ttl=60, max_size=10)
+    )
+    mock_response = Mock()
+    mock_response.output = [Mock(content=[Mock(text="Sunny in Paris.")])]
+    mock_response.usage.total_tokens = 100
+    mock_async_openai_client.responses.create.return_value = mock_response
+
+    assert await agent.asummarize(SAMPLE_WEATHER_DATA) == "Sunny in Paris."
+    assert await agent.asummarize(SAMPLE_WEATHER_DATA) == "Sunny in Paris."
+
+    mock_async_openai_client.responses.create.assert_awaited_once()
+    assert agent.cache.stats()["tokens_saved"] == 100
+
+    # Different weather means a different context, so the model is called again
+    await agent.asummarize(SAMPLE_WEATHER_DATA[:1])
+    assert mock_async_openai_client.responses.create.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_astream_summary(mock_openai_client, mock_async_openai_client):
+    """Test summary streaming yields text deltas and caches the full summary."""
+    agent = WeatherAgent(
+        openai_api_key="test-key", cache=LLMResponseCache(ttl=60, max_size=10)
+    )
+
+    async def stream():
+        yield Mock(type="response.output_text.delta", delta="Sunny ")
+        yield Mock(type="response.output_text.delta", delta="in Paris.")
+        yield Mock(
+            type="response.completed", response=Mock(usage=Mock(total_tokens=50))
+        )
+
+    mock_async_openai_client.responses.create.return_value = stream()
+
+    chunks = [chunk async for chunk in agent.astream_summary(SAMPLE_WEATHER_DATA)]
+    assert chunks == ["Sunny ", "in Paris."]
+
+    # The full summary is now served from the cache
+    chunks = [chunk async for chunk in agent.astream_summary(SAMPLE_WEATHER_DATA)]
+    assert chunks == ["Sunny in Paris."]
+    mock_async_openai_client.responses.create.assert_awaited_once()
+    assert agent.cache.stats()["tokens_saved"] == 50
+
+
+@pytest.mark.asyncio
+async def test_aask_compacts_context(mock_openai_client, mock_async_openai_client):
+    """Test the prompt of large favorite lists fits the token budget."""
+    mock_response = Mock()
+    mock_response.output_parsed = AskResponse(answer="Yes.", matching_cities=[])
+    mock_response.usage.input_tokens = 420
+    mock_async_openai_client.responses.parse.return_value = mock_response
+    agent = WeatherAgent(openai_api_key="test-key", context_token_budget=200)
+
+    await agent.aask("Where is it raining?", many_cities(300))
+
+    prompt = mock_async_openai_client.responses.parse.call_args.kwargs["input"][0]
+    assert "more cities" in prompt["content"]
+    stats = agent.stats()
+    assert stats["calls"] == 1
+    assert stats["input_tokens"] == 420
+    assert 0 < stats["context_tokens"] <= 200
+    assert stats["compacted_contexts"] == 1
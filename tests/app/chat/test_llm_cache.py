@@ -0,0 +1,42 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.chat.cache import LLMResponseCache
+
+
+def test_key():
+    key = LLMResponseCache.key("model", "prompt {weather_context}", "- Paris: sunny")
+
+    assert key == LLMResponseCache.key(
+        "model", "prompt {weather_context}", "- Paris: sunny"
+    )
+    assert key != LLMResponseCache.key(
+        "model", "prompt {weather_context}", "- Paris: rainy"
+    )
+    assert key != LLMResponseCache.key(
+        "other-model", "prompt {weather_context}", "- Paris: sunny"
+    )
+
+
+def test_key_normalizes_question():
+    assert LLMResponseCache.key(
+        "model", "prompt", "context", "Where is it  sunny?"
+    ) == LLMResponseCache.key("model", "prompt", "context", " where is it sunny? ")
+
+
+@pytest.mark.asyncio
+async def test_get_or_generate_counts_tokens_saved():
+    cache = LLMResponseCache(ttl=60, max_size=10)
+    generate = AsyncMock(return_value=("Sunny everywhere.", 120))
+
+    results = await asyncio.gather(
+        *[cache.get_or_generate("key", generate) for _ in range(3)]
+    )
+
+    assert results == ["Sunny everywhere."] * 3
+    generate.assert_awaited_once()
+    stats = cache.stats()
+    assert stats["tokens_used"] == 120
+    assert stats["tokens_saved"] == 240
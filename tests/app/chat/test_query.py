@@ -0,0 +1,130 @@
+import pytest
+
+from app.chat.chat import WeatherData
+from app.chat.query import answer_weather_query, parse_weather_query
+
+CITIES = [
+    WeatherData(city="London", weather_condition="Light Rain", temperature=12),
+    WeatherData(city="Paris", weather_condition="Sunny", temperature=26),
+    WeatherData(city="Madrid", weather_condition="Clear", temperature=31),
+    WeatherData(city="Oslo", weather_condition="Snow Showers", temperature=-2),
+]
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("Which cities are raining?", ["London"]),
+        ("Where is it sunny?", ["Paris", "Madrid"]),
+        ("Is it snowing anywhere?", ["Oslo"]),
+        ("Where is it above 25°C?", ["Paris", "Madrid"]),
+        ("Which cities are colder than 0 degrees?", ["Oslo"]),
+        ("Where is it between... below 15 and above 10?", None),
+        ("Warmest city?", ["Madrid"]),
+        ("What is the coldest city right now?", ["Oslo"]),
+        ("Which sunny city is the coolest?", ["Paris"]),
+        ("Sunny cities above 30°C", ["Madrid"]),
+    ],
+)
+def test_answer_weather_query(question, expected):
+    answer = answer_weather_query(question, CITIES)
+
+    if expected is None:
+        assert answer is None
+    else:
+        assert answer.matching_cities == expected
+
+
+def test_answer_weather_query_no_match():
+    answer = answer_weather_query("Where is it foggy?", CITIES)
+
+    assert answer.matching_cities == []
+    assert "None of your favorite cities" in answer.answer
+
+
+def test_answer_weather_query_answer_text():
+    answer = answer_weather_query("Warmest city?", CITIES)
+
+    assert answer.answer == "The warmest right now: Madrid (Clear, 31°C)."
+
+
+def test_answer_weather_query_named_city():
+    cities = [
+        WeatherData(city="London", weather_condition="Rain", temperature=12),
+        WeatherData(city="Paris", weather_condition="Cloudy", temperature=18),
+        WeatherData(city="Rome", weather_condition="Sunny", temperature=25),
+    ]
+
+    answer = answer_weather_query("Is it sunny in Paris?", cities)
+    assert answer.matching_cities == []
+    assert answer.answer == "It's not sunny right now in: Paris (Cloudy, 18°C)."
+
+    answer = answer_weather_query("Is it raining in London?", cities)
+    assert answer.matching_cities == ["London"]
+
+    # Full names match by their first part
+    cities[1] = WeatherData(
+        city="Paris, France", weather_condition="Rain", temperature=9
+    )
+    answer = answer_weather_query("Is it raining in Paris?", cities)
+    assert answer.matching_cities == ["Paris, France"]
+
+    # A city that isn't a favorite is left to the model
+    assert answer_weather_query("Is it sunny in Berlin?", cities) is None
+
+
+@pytest.mark.parametrize(
+    "question, expected, description",
+    [
+        ("Which cities are at least 26 degrees?", ["Paris", "Madrid"], "at least 26°C"),
+        ("Where is it >= 26°C?", ["Paris", "Madrid"], "at least 26°C"),
+        ("Where is it above 26°C?", ["Madrid"], "above 26°C"),
+        ("Which cities are at most 12 degrees?", ["London", "Oslo"], "at most 12°C"),
+        ("Where is it <= 12°C?", ["London", "Oslo"], "at most 12°C"),
+        ("Where is it below 12°C?", ["Oslo"], "below 12°C"),
+    ],
+)
+def test_answer_weather_query_bounds(question, expected, description):
+    answer = answer_weather_query(question, CITIES)
+
+    assert answer.matching_cities == expected
+    assert answer.answer.startswith(f"It's {description} in: ")
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Should I take an umbrella?",
+        "Which cities are not raining?",
+        "Is it sunny or cloudy in Paris?",
+        "Will it rain tomorrow?",
+        "Tell me about the weather",
+    ],
+)
+def test_unrecognized_questions_fall_back(question):
+    assert parse_weather_query(question) is None
+    assert answer_weather_query(question, CITIES) is None
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # Other units than Celsius
+        "Where is it above 70°F?",
+        "Is it above 60 fahrenheit?",
+        "Which cities are below 50 F?",
+        # Other times than now
+        "Where will it rain?",
+        "Which cities were sunny this morning?",
+        "Is it going to snow in Oslo?",
+        "Where did it rain?",
+        # Measurements and other superlatives
+        "Which city has the highest wind speed?",
+        "Where is the humidity above 80%?",
+        "Which city is the windiest?",
+        "Where is it most sunny?",
+    ],
+)
+def test_questions_beyond_current_weather_fall_back(question):
+    assert parse_weather_query(question) is None
+    assert answer_weather_query(question, CITIES) is None
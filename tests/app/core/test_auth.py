@@ -0,0 +1,65 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from passlib.context import CryptContext
+from sqlmodel import Session
+
+from app import async_repository
+from app.core.auth import (
+    aget_password_hash,
+    averify_and_update_password,
+    pwd_context,
+)
+from app.repository import create_user
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_in_executor():
+    threads = []
+
+    def get_password_hash(password):
+        threads.append(threading.current_thread().name)
+        return pwd_context.hash(password)
+
+    with patch("app.core.auth.get_password_hash", get_password_hash):
+        hashed = await aget_password_hash("password")
+
+    assert threads[0].startswith("password-hash")
+    assert await averify_and_update_password("password", hashed) == (True, None)
+    assert await averify_and_update_password("wrong", hashed) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_rehashes_outdated_cost(db_session: Session):
+    """Test hashes with another bcrypt cost are replaced on login."""
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5)
+    create_user(
+        session=db_session,
+        email="test@example.com",
+        hashed_password=old_context.hash("password"),
+    )
+
+    user = await async_repository.authenticate(
+        session=db_session, email="test@example.com", password="password"
+    )
+
+    assert user is not None
+    assert pwd_context.identify(user.hashed_password) == "bcrypt"
+    assert user.hashed_password.startswith("$2b$04$")
+    assert pwd_context.verify("password", user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_wrong_password(db_session: Session):
+    create_user(
+        session=db_session,
+        email="test@example.com",
+        hashed_password=pwd_context.hash("password"),
+    )
+
+    user = await async_repository.authenticate(
+        session=db_session, email="test@example.com", password="wrong"
+    )
+
+    assert user is None
@@ -0,0 +1,122 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.cache import TTLCache
+
+
+def test_get_and_set():
+    cache = TTLCache(ttl=60, max_size=10)
+
+    assert cache.get("paris") is None
+    cache.set("paris", {"temperature_celsius": 20})
+
+    assert cache.get("paris") == {"temperature_celsius": 20}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entry_expires():
+    cache = TTLCache(ttl=60, max_size=10)
+
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("paris", "sunny")
+    with patch("app.core.cache.time.time", return_value=1059):
+        assert cache.get("paris") == "sunny"
+    with patch("app.core.cache.time.time", return_value=1060):
+        assert cache.get("paris") is None
+
+
+def test_lru_eviction():
+    cache = TTLCache(ttl=60, max_size=2)
+    cache.set("paris", 1)
+    cache.set("london", 2)
+
+    # Touch paris so that london becomes the least recently used entry
+    cache.get("paris")
+    cache.set("madrid", 3)
+
+    assert "paris" in cache
+    assert "london" not in cache
+    assert "madrid" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_coalesces_concurrent_misses():
+    cache = TTLCache(ttl=60, max_size=10)
+    fetch = AsyncMock(return_value="sunny")
+
+    async def slow_fetch():
+        await asyncio.sleep(0.01)
+        return await fetch()
+
+    results = await asyncio.gather(
+        *[cache.get_or_fetch("paris", slow_fetch) for _ in range(5)]
+    )
+
+    assert results == ["sunny"] * 5
+    fetch.assert_awaited_once()
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+
+    # Next call is served from the cache
+    assert await cache.get_or_fetch("paris", slow_fetch) == "sunny"
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_does_not_cache_errors():
+    cache = TTLCache(ttl=60, max_size=10)
+    fetch = AsyncMock(side_effect=[ValueError("boom"), "sunny"])
+
+    with pytest.raises(ValueError):
+        await cache.get_or_fetch("paris", fetch)
+
+    assert await cache.get_or_fetch("paris", fetch) == "sunny"
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_serves_stale_while_refreshing():
+    cache = TTLCache(ttl=60, max_size=10, stale_ttl=60)
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("paris", "sunny")
+
+    fetch = AsyncMock(return_value="rainy")
+    with patch("app.core.cache.time.time", return_value=1070):
+        # Expired but within the stale window: served immediately, refreshed behind
+        assert await cache.get_or_fetch("paris", fetch) == "sunny"
+        assert cache.is_refreshing("paris")
+        await cache.refresh("paris", fetch)  # Wait for the in-flight refresh
+        assert await cache.get_or_fetch("paris", fetch) == "rainy"
+
+    fetch.assert_awaited_once()
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_past_stale_window_is_a_miss():
+    cache = TTLCache(ttl=60, max_size=10, stale_ttl=60)
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("paris", "sunny")
+
+    fetch = AsyncMock(return_value="rainy")
+    with patch("app.core.cache.time.time", return_value=1120):
+        assert await cache.get_or_fetch("paris", fetch) == "rainy"
+    assert cache.stats()["misses"] == 1
+
+
+def test_evict_idle():
+    cache = TTLCache(ttl=600, max_size=10)
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("paris", "sunny")
+        cache.set("london", "rainy")
+    with patch("app.core.cache.time.time", return_value=1200):
+        cache.get("london")
+    with patch("app.core.cache.time.time", return_value=1300):
+        assert cache.evict_idle(max_idle=200) == 1
+        assert cache.get_entry("paris") is None
+        assert cache.get_entry("london") is not None
@@ -0,0 +1,88 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import (
+    CompressionMiddleware,
+    choose_encoding,
+    parse_accept_encoding,
+)
+
+BODY = "sunny " * 1000
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip;q=0.8, BR , identity;q=0, x;q=bad") == {
+        "gzip": 0.8,
+        "br": 1.0,
+        "identity": 0.0,
+        "x": 0.0,
+    }
+
+
+def test_choose_encoding():
+    available = ("br", "gzip")
+    assert choose_encoding("gzip, br", available) == "br"
+    assert choose_encoding("gzip, br;q=0.5", available) == "gzip"
+    assert choose_encoding("gzip;q=0, *", available) == "br"
+    assert choose_encoding("br;q=0, gzip;q=0", available) is None
+    assert choose_encoding("", available) is None
+    assert choose_encoding("br", ("gzip",)) is None
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse(BODY, headers={"Vary": "Origin"})
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("sunny")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield BODY
+            yield BODY
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_compresses_large_responses():
+    client = make_client()
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert response.text == BODY  # Decompressed by the client
+    raw = gzip.compress(BODY.encode(), compresslevel=6, mtime=0)
+    assert int(response.headers["content-length"]) == len(raw)
+
+
+def test_sends_small_and_streamed_responses_as_is():
+    client = make_client()
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in streamed.headers
+    assert streamed.text == BODY * 2
+
+
+def test_identity_when_not_accepted():
+    client = make_client()
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY
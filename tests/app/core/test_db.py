@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from app.core.db import (
+    create_async_db_engine,
+    create_db_engine,
+    engine_options,
+    get_sqlite_pragmas,
+)
+
+EXPECTED_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": 1,  # NORMAL
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+}
+
+
+def test_sqlite_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+
+    pragmas = get_sqlite_pragmas(engine)
+
+    assert EXPECTED_PRAGMAS.items() <= pragmas.items()
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 5
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas_async(tmp_path):
+    engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}")
+
+    async with engine.connect() as connection:
+        journal_mode = await connection.exec_driver_sql("PRAGMA journal_mode")
+        busy_timeout = await connection.exec_driver_sql("PRAGMA busy_timeout")
+        assert journal_mode.scalar() == "wal"
+        assert busy_timeout.scalar() == 5000
+    await engine.dispose()
+
+
+def test_engine_options_in_memory():
+    assert engine_options("sqlite://") == {}
+    assert engine_options("sqlite+aiosqlite:///:memory:") == {}
+    assert engine_options("sqlite:///db.sqlite3")["pool_size"] == 5
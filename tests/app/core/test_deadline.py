@@ -0,0 +1,126 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import deadline
+from app.core.deadline import DeadlineExceeded
+
+
+def flaky(failures: int, error: Exception = ConnectionError("Reset")):
+    """A call failing `failures` times before returning "ok"."""
+    return AsyncMock(side_effect=[error] * failures + ["ok"])
+
+
+@pytest.mark.asyncio
+async def test_no_deadline():
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    deadline.check()
+    assert deadline.timeout(5) == 5
+    assert deadline.timeout(None) is None
+
+
+@pytest.mark.asyncio
+async def test_start():
+    deadline.start(10)
+
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.timeout(5) == 5
+    assert deadline.timeout(20) <= 10
+    assert deadline.timeout(None) <= 10
+
+
+@pytest.mark.asyncio
+async def test_expired():
+    deadline.start(-1)
+
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+    # Never 0, which means no timeout for some clients
+    assert deadline.timeout(5) == 0.001
+
+
+@pytest.mark.asyncio
+async def test_deadline_errors():
+    deadline.start(0.01)
+    with pytest.raises(DeadlineExceeded):
+        with deadline.deadline_errors():
+            await asyncio.wait_for(asyncio.sleep(1), deadline.timeout(None))
+
+    # A timeout shorter than the deadline is not its fault
+    deadline.start(10)
+    with pytest.raises(asyncio.TimeoutError):
+        with deadline.deadline_errors():
+            await asyncio.wait_for(asyncio.sleep(1), 0.01)
+
+
+@pytest.mark.asyncio
+async def test_without_deadline():
+    deadline.start(-1)
+
+    async def work():
+        return deadline.remaining()
+
+    assert await deadline.without_deadline(work()) is None
+    assert deadline.expired()
+
+
+@pytest.mark.asyncio
+async def test_retry_backoff():
+    call = flaky(2)
+
+    with (
+        patch("app.core.deadline.random.uniform", side_effect=lambda a, b: b),
+        patch("app.core.deadline.asyncio.sleep", AsyncMock()) as sleep,
+    ):
+        result = await deadline.retry(
+            call, retries=3, base_delay=0.1, max_delay=0.15, is_retryable=lambda e: True
+        )
+
+    assert result == "ok"
+    assert call.await_count == 3
+    # Exponential, capped by max_delay
+    assert [c.args[0] for c in sleep.await_args_list] == [0.1, 0.15]
+
+
+@pytest.mark.asyncio
+async def test_retry_gives_up():
+    # Not retryable
+    call = flaky(1, ValueError("Bad request"))
+    with pytest.raises(ValueError):
+        await deadline.retry(
+            call, retries=3, base_delay=0, max_delay=0, is_retryable=lambda e: False
+        )
+    assert call.await_count == 1
+
+    # Out of retries
+    call = flaky(3)
+    with pytest.raises(ConnectionError):
+        await deadline.retry(
+            call, retries=2, base_delay=0, max_delay=0, is_retryable=lambda e: True
+        )
+    assert call.await_count == 3
+
+    # The deadline is not retried
+    call = flaky(1, DeadlineExceeded("Deadline exceeded"))
+    with pytest.raises(DeadlineExceeded):
+        await deadline.retry(
+            call, retries=2, base_delay=0, max_delay=0, is_retryable=lambda e: True
+        )
+    assert call.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_within_deadline():
+    deadline.start(0.05)
+    call = flaky(1)
+
+    # The retry could not start before the deadline
+    with patch("app.core.deadline.random.uniform", return_value=0.5):
+        with pytest.raises(ConnectionError):
+            await deadline.retry(
+                call, retries=2, base_delay=1, max_delay=1, is_retryable=lambda e: True
+            )
+    assert call.await_count == 1
@@ -0,0 +1,115 @@
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import (
+    MetricsRegistry,
+    Snapshot,
+    route_template,
+    track_upstream,
+    upstream_request_duration,
+)
+
+
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    in_flight = registry.gauge("in_flight", "In flight")
+
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    requests.labels('/b"\n').inc()
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 3.0',
+        r'requests_total{route="/b\"\n"} 1.0',
+        "# HELP in_flight In flight",
+        "# TYPE in_flight gauge",
+        "in_flight 1.0",
+    ]
+
+
+def test_render_histogram():
+    registry = MetricsRegistry()
+    duration = registry.histogram("duration_seconds", "Duration", buckets=(0.1, 1))
+
+    for value in (0.05, 0.1, 0.5, 3):
+        duration.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{le="0.1"} 2',
+        'duration_seconds_bucket{le="1.0"} 3',
+        'duration_seconds_bucket{le="+Inf"} 4',
+        "duration_seconds_sum 3.65",
+        "duration_seconds_count 4",
+    ]
+
+
+def test_labels_mismatch():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+
+    with pytest.raises(ValueError):
+        requests.labels()
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Requests")
+
+
+def test_collector():
+    registry = MetricsRegistry()
+    registry.add_collector(
+        lambda: [Snapshot("cache_entries", "gauge", "Entries", samples={(): 7})]
+    )
+
+    assert "cache_entries 7.0" in registry.render().splitlines()
+
+
+def test_track_upstream():
+    with track_upstream("test_ok"):
+        pass
+    with pytest.raises(RuntimeError):
+        with track_upstream("test_error"):
+            raise RuntimeError
+
+    assert sum(upstream_request_duration.labels("test_ok", "ok").counts) == 1
+    assert sum(upstream_request_duration.labels("test_error", "error").counts) == 1
+
+
+def test_route_template():
+    router = APIRouter(prefix="/cities")
+
+    @router.get("/{place_id}")
+    async def city(place_id: str):
+        return {}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/v1")
+
+    @app.get("/files/{path:path}")
+    async def file(path: str):
+        return {}
+
+    templates = []
+
+    async def capture(scope, receive, send):
+        await app(scope, receive, send)
+        templates.append(route_template(scope))
+
+    client = TestClient(capture)
+    # Parameter values equal to a literal segment, or containing "/"
+    client.get("/v1/cities/cities")
+    client.get("/v1/cities/v1")
+    client.get("/files/a/b")
+    client.get("/missing")
+
+    assert templates == [
+        "/v1/cities/{place_id}",
+        "/v1/cities/{place_id}",
+        "/files/{path:path}",
+        "unmatched",
+    ]
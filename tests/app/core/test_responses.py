@@ -0,0 +1,20 @@
+from app.core.responses import etag_matches, make_etag
+
+
+def test_make_etag():
+    etag = make_etag([["london-uk", 20]])
+
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag([["london-uk", 20]])
+    assert etag != make_etag([["london-uk", 21]])
+
+
+def test_etag_matches():
+    etag = 'W/"abc"'
+
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"xyz", "abc"', etag)  # Weak comparison
+    assert etag_matches("*", etag)
+    assert not etag_matches('"xyz"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
@@ -0,0 +1,81 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.tracing import (
+    Span,
+    Trace,
+    TracingMiddleware,
+    _current,
+    record_span,
+    slow_traces,
+    span,
+)
+
+
+def test_span_outside_request():
+    with span("noop"):
+        record_span("noop", 0, 1)
+
+    assert _current.get() is None
+
+
+def test_spans_nest():
+    trace = Trace("GET /", max_spans=10)
+    token = _current.set((trace, trace.root))
+    try:
+        with span("outer"):
+            with span("inner"):
+                pass
+            record_span("db_select", 1.0, 2.0)
+    finally:
+        _current.reset(token)
+
+    (outer,) = trace.root.children
+    assert outer.name == "outer"
+    assert [child.name for child in outer.children] == ["inner", "db_select"]
+    assert outer.end >= outer.children[0].end
+
+
+def test_max_spans():
+    trace = Trace("GET /", max_spans=2)
+    token = _current.set((trace, trace.root))
+    try:
+        for _ in range(3):
+            with span("call"):
+                pass
+    finally:
+        _current.reset(token)
+
+    assert (trace.spans, trace.dropped) == (2, 1)
+
+
+def test_server_timing_groups_spans():
+    trace = Trace("GET /", max_spans=10)
+    origin = trace.root.start
+    # Concurrent calls: the group lasts from the first start to the last end
+    for start, end in [(0, 0.2), (0, 0.2), (0.1, 0.3)]:
+        trace.add_span(trace.root, Span("weather_page", origin + start, origin + end))
+    trace.root.end = origin + 0.5
+
+    assert trace.server_timing() == 'weather_page;dur=300.0;desc="3x", total;dur=500.0'
+
+
+def test_middleware():
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, slow_threshold=0, max_spans=10)
+
+    @app.get("/slow")
+    async def slow():
+        with span("work"):
+            pass
+        return {}
+
+    slow_traces.clear()
+    response = TestClient(app).get("/slow")
+
+    assert response.headers["server-timing"].startswith("work;dur=")
+    (trace,) = slow_traces
+    assert trace["name"] == "GET /slow"
+    assert trace["status"] == 200
+    assert [span["name"] for span in trace["root"]["children"]] == ["work"]
+    slow_traces.clear()
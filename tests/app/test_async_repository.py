@@ -0,0 +1,88 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_repository
+from app.core.db import is_async_database_url, sync_database_url
+
+LONDON = {
+    "place_id": "london-uk",
+    "name": "London, UK",
+    "temperature": 12,
+    "weather_condition": "Light Rain",
+}
+
+
+@pytest_asyncio.fixture(name="async_db_session")
+async def async_db_session_fixture():
+    """Create a fresh async database session (aiosqlite) for a test."""
+    test_engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with test_engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(test_engine, expire_on_commit=False) as session:
+        yield session
+    await test_engine.dispose()
+
+
+def test_database_url_helpers():
+    assert is_async_database_url("sqlite+aiosqlite:///db.sqlite3")
+    assert not is_async_database_url("sqlite:///db.sqlite3")
+    assert sync_database_url("sqlite+aiosqlite:///db.sqlite3") == "sqlite:///db.sqlite3"
+
+
+@pytest.mark.asyncio
+async def test_users(async_db_session: AsyncSession):
+    user = await async_repository.create_user(
+        session=async_db_session, email="test@example.com", hashed_password="hashed"
+    )
+
+    assert await async_repository.get_user_by_id(session=async_db_session, id=user.id)
+    found = await async_repository.get_user_by_email(
+        session=async_db_session, email="test@example.com"
+    )
+    assert found.id == user.id
+
+    updated = await async_repository.update_user_weather_id_token(
+        session=async_db_session, user_id=user.id, weather_id_token="token"
+    )
+    assert updated.weather_id_token == "token"
+
+
+@pytest.mark.asyncio
+async def test_create_or_update_cities(async_db_session: AsyncSession):
+    [london] = await async_repository.create_or_update_cities(
+        session=async_db_session, cities_data=[LONDON]
+    )
+
+    # Unchanged, then updated
+    [unchanged] = await async_repository.create_or_update_cities(
+        session=async_db_session, cities_data=[LONDON]
+    )
+    [updated] = await async_repository.create_or_update_cities(
+        session=async_db_session, cities_data=[{**LONDON, "temperature": 14}]
+    )
+
+    assert unchanged.id == updated.id == london.id
+    assert unchanged.temperature == 12
+    assert updated.temperature == 14
+
+
+@pytest.mark.asyncio
+async def test_blocking_session_runs_in_thread(db_session: Session):
+    """A blocking session is supported too, its queries run in a worker thread."""
+    user = await async_repository.create_user(
+        session=db_session, email="test@example.com", hashed_password="hashed"
+    )
+
+    found = await async_repository.get_user_by_email(
+        session=db_session, email="test@example.com"
+    )
+    assert found.id == user.id
@@ -0,0 +1,150 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import City
+from app.repository import (
+    compact_weather_observations,
+    create_or_update_cities,
+    get_weather_observations,
+    save_weather_observations,
+)
+
+LONDON = {
+    "place_id": "london-uk",
+    "name": "London, UK",
+    "temperature": 12,
+    "weather_condition": "Light Rain",
+}
+PARIS = {
+    "place_id": "paris-fr",
+    "name": "Paris, France",
+    "temperature": 0,
+    "weather_condition": "Sunny",
+}
+
+
+def record_statements(session: Session) -> list[str]:
+    statements = []
+    event.listen(
+        session.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_create_or_update_cities_creates(db_session: Session):
+    cities = create_or_update_cities(session=db_session, cities_data=[LONDON, PARIS])
+
+    assert [city.place_id for city in cities] == ["london-uk", "paris-fr"]
+    assert cities[1].temperature == 0
+    assert len(db_session.exec(select(City)).all()) == 2
+
+
+def test_create_or_update_cities_updates(db_session: Session):
+    [london] = create_or_update_cities(session=db_session, cities_data=[LONDON])
+
+    [updated] = create_or_update_cities(
+        session=db_session, cities_data=[{**LONDON, "temperature": 14}]
+    )
+
+    assert updated.id == london.id
+    assert updated.temperature == 14
+    assert db_session.exec(select(City)).one().temperature == 14
+
+
+def test_create_or_update_cities_unchanged_and_chunked(db_session: Session):
+    create_or_update_cities(session=db_session, cities_data=[LONDON])
+    cities_data = [LONDON] + [
+        {**PARIS, "place_id": f"city-{i}", "name": f"City {i}"} for i in range(5)
+    ]
+    statements = record_statements(db_session)
+
+    cities = create_or_update_cities(
+        session=db_session, cities_data=cities_data, chunk_size=2
+    )
+
+    assert [city.place_id for city in cities] == [
+        city["place_id"] for city in cities_data
+    ]
+    assert cities[0].name == "London, UK"
+    # 3 upserts, and 1 select for the unchanged London
+    assert sum(s.startswith("INSERT") for s in statements) == 3
+    assert sum(s.startswith("SELECT") for s in statements) == 1
+
+
+def test_create_or_update_cities_missing_fields(db_session: Session):
+    with pytest.raises(ValueError):
+        create_or_update_cities(
+            session=db_session, cities_data=[{**LONDON, "place_id": None}]
+        )
+
+
+def observation(observed_at: int, temperature: int = 12, condition: str = "rain"):
+    return {
+        "place_id": "london-uk",
+        "observed_at": observed_at,
+        "temperature": temperature,
+        "weather_condition": condition,
+    }
+
+
+def test_save_weather_observations(db_session: Session):
+    stored = save_weather_observations(
+        session=db_session,
+        observations=[observation(1000), observation(2000, 14, "sunny")],
+    )
+    # Already stored observations are ignored
+    stored += save_weather_observations(
+        session=db_session, observations=[observation(2000, 14, "sunny")]
+    )
+
+    assert stored == 2
+    assert get_weather_observations(
+        session=db_session, place_id="london-uk", start=0, end=3000
+    ) == [
+        {"observed_at": 1000, "temperature": 12, "weather_condition": "rain"},
+        {"observed_at": 2000, "temperature": 14, "weather_condition": "sunny"},
+    ]
+
+
+def test_get_weather_observations_range_and_pages(db_session: Session):
+    save_weather_observations(
+        session=db_session, observations=[observation(t) for t in range(0, 1000, 100)]
+    )
+
+    page = get_weather_observations(
+        session=db_session, place_id="london-uk", start=200, end=800, limit=2
+    )
+    assert [o["observed_at"] for o in page] == [200, 300]
+    page = get_weather_observations(
+        session=db_session, place_id="london-uk", start=200, end=800, after=300
+    )
+    assert [o["observed_at"] for o in page] == [400, 500, 600, 700]
+
+
+def test_compact_weather_observations(db_session: Session):
+    # Every 10 minutes for 3 hours
+    save_weather_observations(
+        session=db_session,
+        observations=[observation(t) for t in range(0, 3 * 3600, 600)],
+    )
+
+    deleted = compact_weather_observations(
+        session=db_session,
+        now=4 * 3600,
+        raw_retention=2 * 3600,
+        interval=3600,
+        max_age=3 * 3600 + 1,
+    )
+
+    observed_at = [
+        o["observed_at"]
+        for o in get_weather_observations(
+            session=db_session, place_id="london-uk", start=0, end=4 * 3600
+        )
+    ]
+    # Older than max_age: deleted, older than raw_retention: one per hour
+    assert observed_at == [3600, 7200, 7800, 8400, 9000, 9600, 10200]
+    assert deleted == 18 - 7
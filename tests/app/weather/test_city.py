@@ -1,8 +1,33 @@
-from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
+import pytest_asyncio
+
+from app.core import deadline
+from app.core.config import settings
+from app.weather.city import (
+    cached_city_weathers,
+    get_city_info,
+    get_city_weather,
+    get_city_weathers,
+    get_hedged_city_weather,
+    iter_city_weathers,
+    search_city_infos,
+    successful_city_weathers,
+    weather_cache,
+    weather_page_latency,
+)
+from app.weather.exceptions import WeatherScraperRequestError
+from app.weather.http import http_client
+
+
+@pytest_asyncio.fixture
+async def close_http_client():
+    """Close the shared weather.com session on the loop of the test using it."""
+    yield
+    await http_client.close()
 
-from app.weather.city import get_city_info, get_city_weather, get_city_weathers
 
 # Sample test data
 MOCK_CITY_RESPONSE = {
@@ -24,6 +49,7 @@ MOCK_CITY_RESPONSE = {
 
 
 @pytest.mark.asyncio
+@pytest.mark.usefixtures("close_http_client")
 @patch("aiohttp.ClientSession.post")
 async def test_get_city_info(mock_post):
     # Mock the aiohttp response
@@ -40,53 +66,107 @@ async def test_get_city_info(mock_post):
     }
 
 
+def mock_location(name, place_id):
+    return {
+        "data": {
+            "location": {
+                "address": [name],
+                "latitude": ["1.0"],
+                "longitude": ["2.0"],
+                "placeId": [place_id],
+            }
+        }
+    }
+
+
 @pytest.mark.asyncio
-@patch("app.weather.city.AsyncHTMLSession")
-async def test_get_city_weather(mock_session):
-    # Create mock elements with text attributes
-    mock_temp_element = Mock()
-    mock_temp_element.text = "20°"
-    mock_weather_element = Mock()
-    mock_weather_element.text = "Sunny"
-
-    # Create mock HTML response with sync find method
-    mock_html = Mock()
-
-    def find_side_effect(selector, first=False):
-        if selector == "span[data-testid='TemperatureValue']" and first:
-            return mock_temp_element
-        elif selector == "div[data-testid='wxPhrase']" and first:
-            return mock_weather_element
-        return []
-
-    mock_html.find.side_effect = find_side_effect
-
-    # Create mock response with HTML attribute
-    mock_r = AsyncMock()
-    mock_r.html = mock_html
-
-    # Create an async mock for the get method that returns our mock response
-    mock_get = AsyncMock(return_value=mock_r)
-
-    # Create an async mock for the session instance
-    mock_session_instance = AsyncMock()
-    mock_session_instance.get = mock_get
-    mock_session_instance.close = AsyncMock()
-
-    # Make the session constructor return our mock instance
-    mock_session.return_value = mock_session_instance
-
-    result = await get_city_weather("london-uk")
+@pytest.mark.usefixtures("close_http_client")
+@patch("aiohttp.ClientSession.post")
+async def test_search_city_infos_batches_queries(mock_post):
+    mock_response = AsyncMock()
+    mock_response.raise_for_status = Mock()
+    mock_response.json.side_effect = [
+        {
+            "dal": {
+                "getSunV3LocationSearchUrlConfig": {
+                    "language:en-US;locationType:locale;query:London": mock_location(
+                        "London, UK", "london-uk"
+                    ),
+                    "language:en-US;locationType:locale;query:Atlantis": {
+                        "status": 404,
+                        "data": None,
+                    },
+                }
+            }
+        },
+        {
+            "dal": {
+                "getSunV3LocationSearchUrlConfig": {
+                    "language:en-US;locationType:locale;query:Paris": mock_location(
+                        "Paris, France", "paris-fr"
+                    ),
+                }
+            }
+        },
+    ]
+    mock_post.return_value.__aenter__.return_value = mock_response
+
+    result = await search_city_infos(["London", "Atlantis", "Paris"], batch_size=2)
+
+    # One request per chunk of 2 queries
+    assert mock_post.call_count == 2
+    assert len(mock_post.call_args_list[0].kwargs["json"]) == 2
+    assert result.found["London"]["placeID"] == "london-uk"
+    assert result.found["Paris"]["placeID"] == "paris-fr"
+    assert result.not_found == ["Atlantis"]
+    assert result.failed == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("close_http_client")
+@patch("aiohttp.ClientSession.post")
+async def test_search_city_infos_reports_failed_requests(mock_post):
+    mock_post.side_effect = Exception("Connection reset")
+
+    result = await search_city_infos(["London", "Paris"])
+
+    assert result.found == {}
+    assert set(result.failed) == {"London", "Paris"}
+
+
+MOCK_WEATHER_PAGE = """
+<html>
+  <body>
+    <span data-testid="TemperatureValue">20°</span>
+    <div data-testid="wxPhrase">Sunny</div>
+  </body>
+</html>
+"""
+
+
+@pytest.mark.asyncio
+@patch("app.weather.city.get_session")
+async def test_get_city_weather(mock_get_session):
+    # Mock the aiohttp response of the shared session
+    mock_response = AsyncMock()
+    mock_response.raise_for_status = Mock()
+    mock_response.text.return_value = MOCK_WEATHER_PAGE
+    mock_session = MagicMock()
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+    mock_get_session.return_value = mock_session
+
+    with patch("app.weather.city.time.time", return_value=1000.5):
+        result = await get_city_weather("london-uk")
     assert result == {
         "placeID": "london-uk",
         "temperature_celsius": 20,
         "weather_condition": "sunny",
+        "observed_at": 1000,
     }
 
-    # Verify the mocks were called correctly
-    mock_get.assert_called_once()
-    mock_session_instance.close.assert_called_once()
-    assert mock_html.find.call_count == 2  # Verify find was called twice
+    # Verify the page was requested once through the shared session
+    mock_session.get.assert_called_once()
+    assert "london-uk" in mock_session.get.call_args.args[0]
 
 
 @pytest.mark.asyncio
@@ -114,3 +194,149 @@ async def test_get_city_weathers(mock_get_city_weather):
     assert results[0]["weather_condition"] == "sunny"
     assert results[1]["temperature_celsius"] == 22
     assert results[1]["weather_condition"] == "cloudy"
+
+
+@pytest.mark.asyncio
+@patch("app.weather.city.get_city_weather")
+async def test_get_city_weathers_fetches_each_place_once(mock_get_city_weather):
+    mock_get_city_weather.return_value = {
+        "placeID": "london-uk",
+        "temperature_celsius": 20,
+        "weather_condition": "sunny",
+    }
+    city_entries = [
+        {"placeID": "london-uk", "name": "London, UK"},
+        {"placeID": "london-uk", "name": "London, UK"},
+    ]
+
+    await get_city_weathers(city_entries)
+    results = await get_city_weathers(city_entries)
+
+    assert [r["temperature_celsius"] for r in results] == [20, 20]
+    mock_get_city_weather.assert_called_once_with("london-uk")
+
+
+@pytest.mark.asyncio
+@patch("app.weather.city.get_city_weather")
+async def test_get_city_weathers_partial_results(mock_get_city_weather):
+    mock_get_city_weather.side_effect = [
+        {
+            "placeID": "london-uk",
+            "temperature_celsius": 20,
+            "weather_condition": "sunny",
+        },
+        WeatherScraperRequestError("Error fetching weather data for paris-fr"),
+    ]
+    city_entries = [
+        {"placeID": "london-uk", "name": "London, UK"},
+        {"placeID": "paris-fr", "name": "Paris, France"},
+    ]
+
+    results = await get_city_weathers(city_entries)
+
+    assert results[0]["status"] == "ok"
+    assert results[0]["temperature_celsius"] == 20
+    assert results[1]["status"] == "error"
+    assert "paris-fr" in results[1]["error"]
+    assert successful_city_weathers(results) == [results[0]]
+
+
+@pytest.mark.asyncio
+@patch("app.weather.city.get_city_weather")
+async def test_get_city_weathers_deadline(mock_get_city_weather):
+    release = asyncio.Event()
+
+    async def city_weather(place_id):
+        if place_id == "paris-fr":
+            await release.wait()
+        return {"placeID": place_id, "temperature_celsius": 20}
+
+    mock_get_city_weather.side_effect = city_weather
+    city_entries = [
+        {"placeID": "london-uk", "name": "London, UK"},
+        {"placeID": "paris-fr", "name": "Paris, France"},
+    ]
+
+    deadline.start(0.05)
+    results = await get_city_weathers(city_entries)
+
+    assert deadline.expired()
+    assert results[0]["status"] == "ok"
+    assert results[1] == {
+        "placeID": "paris-fr",
+        "name": "Paris, France",
+        "status": "error",
+        "error": "Deadline exceeded",
+    }
+
+    # The fetch shared through the cache goes on after the request gave up
+    release.set()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert weather_cache.get("paris-fr")["temperature_celsius"] == 20
+
+
+@pytest.mark.asyncio
+@patch("app.weather.city.get_city_weather")
+async def test_iter_city_weathers_deadline(mock_get_city_weather):
+    async def city_weather(place_id):
+        if place_id == "paris-fr":
+            await asyncio.sleep(1)
+        return {"placeID": place_id, "temperature_celsius": 20}
+
+    mock_get_city_weather.side_effect = city_weather
+    city_entries = [{"placeID": "paris-fr"}, {"placeID": "london-uk"}]
+
+    deadline.start(0.05)
+    results = [entry async for entry in iter_city_weathers(city_entries)]
+
+    assert [(r["placeID"], r["status"]) for r in results] == [
+        ("london-uk", "ok"),
+        ("paris-fr", "error"),
+    ]
+
+
+def test_cached_city_weathers():
+    weather = {"placeID": "london-uk", "temperature_celsius": 20, "observed_at": 1}
+    weather_cache.set("london-uk", weather)
+    entries = [{"placeID": "london-uk", "name": "London"}]
+
+    assert cached_city_weathers(entries) == [{**entries[0], **weather, "status": "ok"}]
+    assert entries == [{"placeID": "london-uk", "name": "London"}]  # Not updated
+    assert cached_city_weathers([*entries, {"placeID": "paris-fr"}]) is None
+    assert weather_cache.stats()["hits"] == 1
+
+
+def test_cached_city_weathers_entry_expiring(monkeypatch):
+    weather_cache.set("london-uk", {"placeID": "london-uk", "temperature_celsius": 20})
+    expires_at = weather_cache.get_entry("london-uk").expires_at
+    # The entry expires right after it is first read
+    times = iter([expires_at - 1])
+    monkeypatch.setattr("app.core.cache.time.time", lambda: next(times, expires_at))
+
+    result = cached_city_weathers([{"placeID": "london-uk"}])
+
+    assert result == [
+        {"placeID": "london-uk", "temperature_celsius": 20, "status": "ok"}
+    ]
+    assert weather_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_hedged_city_weather(monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "WEATHER_HEDGE_MIN_DELAY", 0)
+    for _ in range(20):
+        weather_page_latency.observe(0.01)
+    delays = [10, 0]
+
+    async def get_city_weather(place_id):
+        await asyncio.sleep(delays.pop(0))
+        return {"placeID": place_id}
+
+    with patch(
+        "app.weather.city.get_city_weather", side_effect=get_city_weather
+    ) as mock_get_city_weather:
+        assert await get_hedged_city_weather("london-uk") == {"placeID": "london-uk"}
+
+    assert mock_get_city_weather.call_count == 2
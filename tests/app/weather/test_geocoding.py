@@ -0,0 +1,82 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlmodel import Session
+
+from app.weather.city import CitySearchResult
+from app.weather.geocoding import (
+    normalize_city_query,
+    resolve_city_info,
+    resolve_city_infos,
+)
+
+LONDON_INFO = {
+    "name": "London, UK",
+    "coordinate": "51.5074,-0.1278",
+    "placeID": "london-uk",
+}
+
+
+def test_normalize_city_query():
+    assert normalize_city_query("  New   York ") == "new york"
+    assert normalize_city_query("LONDON") == normalize_city_query("london")
+
+
+@pytest.mark.asyncio
+@patch("app.weather.geocoding.search_city_infos", new_callable=AsyncMock)
+async def test_resolve_city_info_is_cached(mock_search, db_session: Session):
+    mock_search.return_value = CitySearchResult(found={"London": LONDON_INFO})
+
+    assert await resolve_city_info("London", session=db_session) == LONDON_INFO
+    assert await resolve_city_info(" london ", session=db_session) == LONDON_INFO
+
+    mock_search.assert_awaited_once_with(["London"])
+
+
+@pytest.mark.asyncio
+@patch("app.weather.geocoding.search_city_infos", new_callable=AsyncMock)
+async def test_resolve_city_info_negative_cache(mock_search, db_session: Session):
+    mock_search.return_value = CitySearchResult(not_found=["Atlantis"])
+
+    assert await resolve_city_info("Atlantis", session=db_session) is None
+    assert await resolve_city_info("Atlantis", session=db_session) is None
+
+    mock_search.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@patch("app.weather.geocoding.search_city_infos", new_callable=AsyncMock)
+async def test_resolve_city_info_request_errors_not_cached(
+    mock_search, db_session: Session
+):
+    mock_search.side_effect = [
+        CitySearchResult(failed={"London": "timeout"}),
+        CitySearchResult(found={"London": LONDON_INFO}),
+    ]
+
+    assert await resolve_city_info("London", session=db_session) is None
+    assert await resolve_city_info("London", session=db_session) == LONDON_INFO
+
+    assert mock_search.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("app.weather.geocoding.search_city_infos", new_callable=AsyncMock)
+async def test_resolve_city_infos_only_searches_missing_names(
+    mock_search, db_session: Session
+):
+    mock_search.return_value = CitySearchResult(found={"London": LONDON_INFO})
+    await resolve_city_infos(["London"], session=db_session)
+
+    mock_search.return_value = CitySearchResult(
+        found={"Paris": {**LONDON_INFO, "placeID": "paris-fr"}},
+        not_found=["Atlantis"],
+    )
+    result = await resolve_city_infos(
+        ["London", "Paris", "Atlantis"], session=db_session
+    )
+
+    mock_search.assert_awaited_with(["Paris", "Atlantis"])
+    assert result.found["London"] == LONDON_INFO
+    assert result.found["Paris"]["placeID"] == "paris-fr"
+    assert result.not_found == ["Atlantis"]
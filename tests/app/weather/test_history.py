@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import Session
+
+from app.repository import get_weather_observations, save_weather_observations
+from app.weather.history import ObservationRecorder
+
+WEATHER = {
+    "placeID": "london-uk",
+    "temperature_celsius": 12,
+    "weather_condition": "rain",
+    "observed_at": 10_000,
+}
+
+
+@pytest.fixture
+def recorder():
+    return ObservationRecorder(
+        raw_retention=3600, downsample_interval=600, max_age=7200, compact_interval=60
+    )
+
+
+@pytest.mark.asyncio
+async def test_record(recorder, db_session: Session):
+    with patch("app.weather.history.time.time", return_value=10_000):
+        assert await recorder.record([WEATHER], session=db_session) == 1
+        # The same observation, e.g. cached weather synced again, is stored once
+        assert await recorder.record([WEATHER], session=db_session) == 0
+
+    observations = get_weather_observations(
+        session=db_session, place_id="london-uk", start=0, end=20_000
+    )
+    assert observations == [
+        {"observed_at": 10_000, "temperature": 12, "weather_condition": "rain"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_compact(recorder, db_session: Session):
+    save_weather_observations(
+        session=db_session,
+        observations=[
+            {
+                "place_id": "paris-fr",
+                "observed_at": 1_000,
+                "temperature": 20,
+                "weather_condition": "sunny",
+            }
+        ],
+    )
+
+    with patch("app.weather.history.time.time", return_value=10_000):
+        await recorder.record([WEATHER], session=db_session)
+        # Recording doesn't compact
+        assert get_weather_observations(
+            session=db_session, place_id="paris-fr", start=0, end=20_000
+        )
+
+        await recorder.compact(session=db_session)
+
+    # Older than max_age
+    assert not get_weather_observations(
+        session=db_session, place_id="paris-fr", start=0, end=20_000
+    )
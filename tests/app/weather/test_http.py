@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import aiohttp
+import pytest
+
+from app.weather.http import WeatherHTTPClient
+
+
+@pytest.fixture
+def http_client():
+    return WeatherHTTPClient(
+        limit=10, limit_per_host=2, dns_cache_ttl=60, keepalive_timeout=5
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_session_is_shared(http_client):
+    session = http_client.get_session()
+
+    assert http_client.get_session() is session
+    assert session.connector.limit == 10
+    assert session.connector.limit_per_host == 2
+    # Cookies must never leak from one user to another through the shared session
+    assert isinstance(session.cookie_jar, aiohttp.DummyCookieJar)
+
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_get_session_recreated_after_close(http_client):
+    session = http_client.get_session()
+    await http_client.close()
+
+    assert session.closed
+    new_session = http_client.get_session()
+    assert new_session is not session
+    assert not new_session.closed
+
+    await http_client.close()
+
+
+def test_get_session_after_loop_closed(http_client, caplog):
+    async def get_session():
+        return http_client.get_session()
+
+    loop = asyncio.new_event_loop()
+    session = loop.run_until_complete(get_session())
+    loop.close()
+
+    async def replace_session():
+        new_session = http_client.get_session()
+        assert http_client.get_session() is new_session
+        await http_client.close()
+        return new_session
+
+    # The session of the closed loop can't be used anymore, a new one replaces it
+    assert asyncio.run(replace_session()) is not session
+    assert "Dropping the weather.com session" in caplog.text
+    session.detach()  # Never connected, nothing to release
+
+
+def test_get_session_closes_session_of_running_loop(http_client):
+    async def get_session():
+        return http_client.get_session()
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        session = asyncio.run_coroutine_threadsafe(get_session(), loop).result()
+
+        async def replace_session():
+            new_session = http_client.get_session()
+            # Closed on its own loop
+            for _ in range(100):
+                if session.closed:
+                    break
+                await asyncio.sleep(0.01)
+            await http_client.close()
+            return new_session
+
+        assert asyncio.run(replace_session()) is not session
+        assert session.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_stats(http_client):
+    stats = http_client.stats()
+
+    assert stats["limit"] == 10
+    assert stats["limit_per_host"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["waiting"] == 0
@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.weather.refresher import WeatherRefresher
+
+
+@pytest.fixture
+def cache():
+    return TTLCache(ttl=300, max_size=10, stale_ttl=300)
+
+
+@pytest.mark.asyncio
+async def test_refresh_once_refreshes_expiring_entries(cache):
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("london-uk", {"temperature_celsius": 20})
+    with patch("app.core.cache.time.time", return_value=1200):
+        cache.set("paris-fr", {"temperature_celsius": 22})
+
+    fetch = AsyncMock(return_value={"temperature_celsius": 18})
+    refresher = WeatherRefresher(
+        cache=cache, fetch=fetch, interval=30, refresh_ahead=60, max_idle=3600
+    )
+
+    with (
+        patch("app.core.cache.time.time", return_value=1250),
+        patch("app.weather.refresher.time.time", return_value=1250),
+    ):
+        # london-uk expires at 1300, paris-fr at 1500
+        assert refresher.refresh_once() == 1
+        await cache.refresh("london-uk", fetch)  # Wait for the in-flight refresh
+
+        fetch.assert_awaited_once_with("london-uk")
+        assert cache.get_entry("london-uk").value == {"temperature_celsius": 18}
+
+
+@pytest.mark.asyncio
+async def test_refresh_once_evicts_idle_places(cache):
+    with patch("app.core.cache.time.time", return_value=1000):
+        cache.set("london-uk", {"temperature_celsius": 20})
+
+    fetch = AsyncMock()
+    refresher = WeatherRefresher(
+        cache=cache, fetch=fetch, interval=30, refresh_ahead=60, max_idle=200
+    )
+
+    with (
+        patch("app.core.cache.time.time", return_value=1250),
+        patch("app.weather.refresher.time.time", return_value=1250),
+    ):
+        assert refresher.refresh_once() == 0
+
+    fetch.assert_not_awaited()
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_start_and_stop(cache):
+    refresher = WeatherRefresher(
+        cache=cache, fetch=AsyncMock(), interval=30, refresh_ahead=60, max_idle=200
+    )
+
+    refresher.start()
+    assert refresher.running
+    await refresher.stop()
+    assert not refresher.running
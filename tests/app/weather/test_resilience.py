@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import suppress
+from unittest.mock import patch
+
+import aiohttp
+import pytest
+
+from app.weather.exceptions import (
+    CircuitOpenError,
+    InvalidLoginCredentials,
+    WeatherScraperRequestError,
+)
+from app.weather.resilience import (
+    CircuitBreaker,
+    LatencyTracker,
+    hedged,
+    is_upstream_failure,
+)
+
+
+def make_breaker(**config) -> CircuitBreaker:
+    defaults = dict(
+        failure_rate=0.5,
+        min_calls=4,
+        window=4,
+        slow_call=10,
+        open_duration=30,
+        half_open_calls=2,
+    )
+    return CircuitBreaker("weather_page", **{**defaults, **config})
+
+
+def call(breaker: CircuitBreaker, error: Exception | None = None) -> None:
+    with suppress(Exception):
+        with breaker.guard():
+            if error is not None:
+                raise error
+
+
+def test_is_upstream_failure():
+    assert is_upstream_failure(asyncio.TimeoutError())
+    assert is_upstream_failure(WeatherScraperRequestError("Down", status=503))
+    assert is_upstream_failure(WeatherScraperRequestError("Throttled", status=429))
+    assert not is_upstream_failure(WeatherScraperRequestError("Expired", status=401))
+    assert not is_upstream_failure(InvalidLoginCredentials("Invalid"))
+    error = aiohttp.ClientResponseError(None, (), status=404)
+    assert not is_upstream_failure(error)
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = make_breaker()
+
+    call(breaker, ValueError("Down"))
+    call(breaker)
+    call(breaker, ValueError("Down"))
+    assert breaker.state == CircuitBreaker.CLOSED  # Not enough calls yet
+    call(breaker)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pass
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["opened"] == 1
+
+
+def test_breaker_ignores_client_errors():
+    breaker = make_breaker()
+
+    for _ in range(4):
+        call(breaker, WeatherScraperRequestError("Not found", status=404))
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_counts_slow_calls():
+    breaker = make_breaker(slow_call=0)
+
+    for _ in range(4):
+        call(breaker)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_half_open_probes():
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, ValueError("Down"))
+
+    with patch("app.weather.resilience.time.monotonic", return_value=1e9):
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        with breaker.guard():
+            # Only half_open_calls probes at a time
+            with breaker.guard():
+                with pytest.raises(CircuitOpenError):
+                    with breaker.guard():
+                        pass
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    assert breaker.stats()["recent_calls"] == 0
+
+
+def test_breaker_reopens_on_failed_probe():
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, ValueError("Down"))
+
+    with patch("app.weather.resilience.time.monotonic", return_value=1e9):
+        call(breaker, ValueError("Still down"))
+        assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.stats()["opened"] == 2
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(size=10, min_samples=3)
+    tracker.observe(1)
+    tracker.observe(3)
+    assert tracker.percentile(95) is None
+
+    tracker.observe(2)
+    assert tracker.percentile(50) == 2
+    assert tracker.percentile(95) == 3
+
+
+@pytest.mark.asyncio
+async def test_hedged_fast_call_is_not_hedged():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return "sunny"
+
+    assert await hedged(fetch, delay=1) == "sunny"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_slow_call():
+    delays = [10, 0]
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(delays.pop(0))
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "sunny"
+
+    assert await hedged(fetch, delay=0.01, operation="test") == "sunny"
+    await asyncio.sleep(0)
+    assert cancelled == [1]  # The slow first call was cancelled
+
+
+@pytest.mark.asyncio
+async def test_hedged_both_fail():
+    errors = [ValueError("first"), ValueError("second")]
+
+    async def fetch():
+        error = errors.pop(0)
+        await asyncio.sleep(0.02)
+        raise error
+
+    with pytest.raises(ValueError, match="first"):
+        await hedged(fetch, delay=0.01)
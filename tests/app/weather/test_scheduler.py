@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from app.weather.scheduler import FetchScheduler, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, burst=2)
+
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    elapsed = time.monotonic() - start
+
+    # 2 calls from the burst, then 2 calls at 100/s
+    assert elapsed >= 0.015
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_no_limit():
+    bucket = TokenBucket(rate=0, burst=1)
+    for _ in range(100):
+        assert await bucket.acquire() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_caps_concurrency_per_host():
+    scheduler = FetchScheduler(
+        max_concurrency=10, max_concurrency_per_host=2, rate=0, burst=1
+    )
+    running = 0
+    max_running = 0
+
+    async def fetch():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(
+        *[scheduler.run("weather.com", fetch) for _ in range(6)]
+    )
+
+    assert results == ["ok"] * 6
+    assert max_running == 2
+    assert scheduler.stats()["completed"] == 6
+    assert scheduler.stats()["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_counts_failures():
+    scheduler = FetchScheduler(
+        max_concurrency=10, max_concurrency_per_host=2, rate=0, burst=1
+    )
+
+    async def fetch():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await scheduler.run("weather.com", fetch)
+
+    assert scheduler.stats()["failed"] == 1
+    assert scheduler.stats()["running"] == 0
@@ -0,0 +1,39 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core import deadline
+from app.weather.scraper import WeatherScraper
+
+
+@pytest.mark.asyncio
+async def test_get_cached_user_favorite_cities_without_deadline():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_user_favorite_cities(self):
+        started.set()
+        await release.wait()
+        deadline.check()  # As the preferences request does
+        return [{"placeID": "london-uk"}]
+
+    async def impatient():
+        deadline.start(0.01)
+        return await WeatherScraper("token").get_cached_user_favorite_cities()
+
+    with patch.object(
+        WeatherScraper, "get_user_favorite_cities", get_user_favorite_cities
+    ):
+        # The fill is started by a request with a short deadline
+        first = asyncio.create_task(impatient())
+        await started.wait()
+        second = asyncio.create_task(
+            WeatherScraper("token").get_cached_user_favorite_cities()
+        )
+        await asyncio.sleep(0.05)
+        release.set()
+
+        # Shared by the other request, which doesn't fail because of it
+        assert await second == [{"placeID": "london-uk"}]
+        assert await first == [{"placeID": "london-uk"}]
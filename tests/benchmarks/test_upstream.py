@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+from app.core.config import settings
+from app.weather import city, scraper
+from app.weather.city import get_city_weather, search_city_infos
+from app.weather.http import http_client
+from app.weather.scraper import WeatherScraper
+from benchmarks.upstream import Behavior, FakeUpstream, place_id, place_weather
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    upstream = FakeUpstream(places=20, favorites=3)
+    url = await upstream.start()
+    with (
+        patch.object(city, "WEATHER_URL", url),
+        patch.object(city, "LOCATION_SEARCH_URL", f"{url}/api/v1/p/redux-dal"),
+        patch.object(scraper, "LOGIN_URL", f"{url}/login"),
+        patch.object(scraper, "PREFERENCE_URL", f"{url}/preference"),
+    ):
+        yield upstream
+    await http_client.close()
+    await upstream.stop()
+
+
+@pytest.mark.asyncio
+async def test_weather_client_against_upstream(upstream):
+    w = WeatherScraper()
+    assert await w.user_login("user@example.com", "password")
+
+    favorites = await w.get_user_favorite_cities()
+    assert len(favorites) == 3
+
+    weather = await get_city_weather(favorites[0]["placeID"])
+    temperature, condition = place_weather(favorites[0]["placeID"])
+    assert weather["temperature_celsius"] == temperature
+    assert weather["weather_condition"] == condition.lower()
+
+    result = await search_city_infos(["City 7", "Atlantis"])
+    assert result.found["City 7"]["placeID"] == place_id(7)
+    assert result.not_found == ["Atlantis"]
+
+    assert upstream.stats()["calls"] == {
+        "login": 1,
+        "preference_get": 1,
+        "weather_page": 1,
+        "location_search": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors(upstream):
+    upstream.weather = Behavior(error_rate=1)
+
+    with pytest.raises(Exception, match="503"):
+        await get_city_weather(place_id(0))
+    # Retried
+    assert upstream.stats()["errors"] == {"weather_page": 1 + settings.UPSTREAM_RETRIES}
@@ -13,11 +13,17 @@ os.environ.update(
         "ACCESS_TOKEN_EXPIRE_MIN": "30",
         "DATABASE_URL": "sqlite://",  # Use in-memory database for tests
         "PATH_API_V1": "/api/v1",
+        "BCRYPT_ROUNDS": "4",  # Fast hashing for tests
     }
 )
 
 from app.api.deps import get_db
+from app.chat.cache import llm_cache
+from app.core.auth import token_cache, user_cache
 from app.main import app
+from app.weather.city import weather_cache, weather_page_latency
+from app.weather.resilience import weather_breakers
+from app.weather.scraper import favorites_cache
 
 
 @pytest.fixture(name="db_session")
@@ -78,3 +84,16 @@ def setup_test_env():
     # Restore original environment
     os.environ.clear()
     os.environ.update(original_env)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Ensure in-memory caches don't leak state between tests."""
+    yield
+    weather_cache.clear()
+    favorites_cache.clear()
+    weather_breakers.clear()
+    weather_page_latency.clear()
+    llm_cache.clear()
+    token_cache.clear()
+    user_cache.clear()